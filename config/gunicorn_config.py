@@ -1,4 +1,10 @@
 # https://docs.gunicorn.org/en/stable/settings.html
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+
 bind = "0.0.0.0:8080"
 # Enable prints to be shown immediately
 accesslog = "-"  # Print access log to stdout
@@ -6,6 +12,94 @@ errorlog = "-"   # Print error log to stdout
 capture_output = True
 enable_stdio_inheritance = True
 
-workers = 2
-threads = 1
 timeout = 360
+
+# Concurrency profile, chosen with BOUNCEBAN_WORKER_PROFILE:
+#   sync     one request at a time per worker process
+#   gthread  a pool of threads per worker (default with BOUNCEBAN_EXECUTION=async)
+#   gevent   cooperative green threads; blocking socket calls yield, so one
+#            worker holds many requests that are waiting on BounceBan
+#
+# Without an explicit profile there are 2 worker processes, as there always
+# were; BOUNCEBAN_WORKERS or WEB_CONCURRENCY set the count directly. With a
+# profile, sizing follows the CPUs this process may run on (its affinity
+# mask, not the host's CPU count) and the expected share of each request
+# spent waiting on BounceBan (BOUNCEBAN_IO_WAIT, 0-0.99): a request that
+# waits 95% of the time needs about 1 / (1 - 0.95) = 20 requests in flight
+# to keep one CPU busy. BOUNCEBAN_THREADS and BOUNCEBAN_WORKER_CONNECTIONS
+# override the computed values.
+EXECUTION = os.environ.get("BOUNCEBAN_EXECUTION", "sync").lower()
+PROFILE_SET = bool(os.environ.get("BOUNCEBAN_WORKER_PROFILE"))
+PROFILE = os.environ.get("BOUNCEBAN_WORKER_PROFILE", "gthread" if EXECUTION == "async" else "sync").lower()
+try:
+    CPUS = len(os.sched_getaffinity(0))
+except AttributeError:
+    CPUS = multiprocessing.cpu_count()
+IO_WAIT = min(max(float(os.environ.get("BOUNCEBAN_IO_WAIT", "0.95")), 0.0), 0.99)
+IN_FLIGHT_PER_CPU = math.ceil(1 / (1 - IO_WAIT))
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _workers(computed):
+    default = computed if PROFILE_SET else 2
+    return _env_int("BOUNCEBAN_WORKERS", _env_int("WEB_CONCURRENCY", default))
+
+
+if PROFILE == "sync":
+    # Every request holds a whole process, so this is the memory-bound profile
+    worker_class = "sync"
+    workers = _workers(2 * CPUS + 1)
+    threads = 1
+elif PROFILE == "gthread":
+    worker_class = "gthread"
+    workers = _workers(CPUS)
+    if EXECUTION == "async":
+        # Threads only wait on the worker's event loop (src/bounceban/aio.py),
+        # so they are cheap to keep around
+        threads = _env_int("BOUNCEBAN_THREADS", _env_int("BOUNCEBAN_ASYNC_THREADS", 200))
+    else:
+        threads = _env_int("BOUNCEBAN_THREADS", IN_FLIGHT_PER_CPU)
+elif PROFILE == "gevent":
+    # Green threads cost a few KB each; the sync client becomes cooperative
+    # once gevent patches the socket module, so BOUNCEBAN_EXECUTION stays "sync"
+    worker_class = "gevent"
+    workers = _workers(CPUS)
+    worker_connections = _env_int("BOUNCEBAN_WORKER_CONNECTIONS", 50 * IN_FLIGHT_PER_CPU)
+else:
+    raise ValueError(f"Unknown BOUNCEBAN_WORKER_PROFILE: {PROFILE} (expected sync, gthread or gevent)")
+
+# Let every concurrent request keep its own pooled BounceBan connection
+# (read by src/bounceban/client.py in the workers)
+if PROFILE == "gthread":
+    os.environ.setdefault("BOUNCEBAN_POOL_SIZE", str(threads))
+elif PROFILE == "gevent":
+    os.environ.setdefault("BOUNCEBAN_POOL_SIZE", str(worker_connections))
+
+# Workers write their metrics to files here so /metrics can merge them
+# (src/bounceban/metrics.py). The directory is emptied when gunicorn starts
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "bounceban_metrics"))
+
+
+def on_starting(server):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+# Background job threads per worker process (src/bounceban/jobs.py), so at
+# most workers * job_threads jobs run at once
+job_threads = min(max(_env_int("BOUNCEBAN_JOB_WORKERS", 2), 0), 8)
+
+
+def post_worker_init(worker):
+    # Every worker drains the background job queue
+    from src.bounceban import jobs
+    jobs.start_workers(job_threads)
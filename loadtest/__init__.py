@@ -0,0 +1 @@
+"""Load-testing tools: a local BounceBan stand-in and a gunicorn profile benchmark."""
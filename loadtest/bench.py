@@ -0,0 +1,171 @@
+"""Benchmark every module's ``/execute`` route against the stand-in server.
+
+The Flask app from ``main.py`` is driven in-process through its test client,
+with BounceBan replaced by ``loadtest/stand_in.py``. For each module the
+report gives p50/p95/p99 latency, throughput, errors and the process RSS
+after the run. Run from the repository root:
+
+    python -m loadtest.bench --requests 200 --concurrency 20 --latency 0.05
+    python -m loadtest.bench --modules verify_bulk/v4 --task-size 100000 --json-out bench.json
+
+Caches are disabled unless ``--keep-cache`` is given, so every request
+reaches the stand-in. The per-key rate limit stays on, as in production;
+``--no-rate-limit`` turns it off to measure the connector alone.
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+API_CONNECTION = {"connection_data": {"value": {"api_key_bearer": "benchmark"}}}
+
+
+def _emails(count: int) -> str:
+    return "\n".join(f"user{i}@example.com" for i in range(count))
+
+
+def _form(**fields) -> dict:
+    return {"data": dict(fields, api_connection=API_CONNECTION)}
+
+
+# Module -> request body for one representative call
+SCENARIOS = {
+    # check/v1 reads the JSON body directly rather than through Request
+    "check/v1": {
+        "query": "someone@example.com",
+        "api_connection": {"connection_data": {"value": "benchmark"}},
+    },
+    "verify_single_email/v1": _form(email="someone@example.com"),
+    "verify_single_email/v2": _form(id="benchmark-verification"),
+    "verify_single_email/v3": _form(email="someone@example.com", max_wait_seconds=30),
+    "verify_single_email/v4": _form(emails=_emails(50), max_wait_seconds=30),
+    "verify_bulk/v1": _form(emails=_emails(10000), task_name="benchmark"),
+    "verify_bulk/v2": _form(id="benchmark-task"),
+    "verify_bulk/v3": _form(id="benchmark-task", emails=_emails(100)),
+    "verify_bulk/v4": _form(id="benchmark-task", limit=1000),
+    "verify_bulk/v5": _form(id="benchmark-task", confirm_delete=True),
+}
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed: float, errors: int) -> dict:
+    """Report for one run; ``latencies`` are in seconds."""
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(1000 * percentile(latencies, 0.50), 1),
+        "p95_ms": round(1000 * percentile(latencies, 0.95), 1),
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 1),
+    }
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # No /proc (macOS): fall back to the peak, reported in bytes there
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024), 1)
+
+
+def is_failure(response) -> bool:
+    if response.status_code >= 400:
+        return True
+    if response.mimetype != "application/json":
+        return False
+    payload = response.get_json(silent=True) or {}
+    return (payload.get("metadata") or {}).get("status") == "failed"
+
+
+def run_module(app, module: str, body: dict, total: int, concurrency: int) -> dict:
+    path = f"/{module}/execute"
+    local = threading.local()
+
+    def call(_):
+        test_client = getattr(local, "client", None)
+        if test_client is None:
+            test_client = local.client = app.test_client()
+        started = time.perf_counter()
+        response = test_client.post(path, json=body)
+        response.get_data()  # drain streamed bodies
+        return is_failure(response), time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+    report = summarize([latency for _, latency in results], elapsed, sum(1 for failed, _ in results if failed))
+    report["rss_mb"] = rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="calls per module")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upstream", help="URL of an already running stand-in (default: start one here)")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--task-size", type=int, default=10000)
+    parser.add_argument("--mx-records", type=int, default=1)
+    parser.add_argument("--message-bytes", type=int, default=0)
+    parser.add_argument("--keep-cache", action="store_true", help="leave the check/result caches on")
+    parser.add_argument("--no-rate-limit", action="store_true", help="turn the per-key rate limit off")
+    parser.add_argument("--json-out", help="also write the report to this file")
+    args = parser.parse_args()
+
+    upstream = None
+    upstream_url = args.upstream
+    if not upstream_url:
+        from loadtest.stand_in import make_server
+        upstream = make_server(
+            latency=args.latency, task_size=args.task_size, jitter=args.jitter,
+            error_rate=args.error_rate, mx_records=args.mx_records, message_bytes=args.message_bytes,
+        )
+        threading.Thread(target=upstream.serve_forever, daemon=True).start()
+        upstream_url = f"http://127.0.0.1:{upstream.server_port}"
+
+    # Settings are read at import time, so they go in before the app is loaded
+    os.environ["BOUNCEBAN_BASE_URL"] = upstream_url
+    if args.no_rate_limit:
+        os.environ["BOUNCEBAN_RATE_LIMIT"] = "0"
+    if not args.keep_cache:
+        os.environ["BOUNCEBAN_CHECK_CACHE_TTL"] = "0"
+        os.environ["BOUNCEBAN_RESULTS_TTL"] = "0"
+    from main import app
+
+    report = {"baseline_rss_mb": rss_mb(), "modules": {}}
+    for module in args.modules:
+        report["modules"][module] = run_module(app, module, SCENARIOS[module], args.requests, args.concurrency)
+        print(json.dumps({module: report["modules"][module]}), flush=True)
+
+    if upstream is not None:
+        upstream.shutdown()
+    print(json.dumps(report, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
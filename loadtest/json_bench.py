@@ -0,0 +1,75 @@
+"""Compare JSON engines on real-size BounceBan payloads.
+
+Payloads: a 500k-email bulk submission body (what ``verify_bulk/v1``
+sends) and a 10k-item dump page (what ``verify_bulk/v4`` receives). Every
+installed engine is timed encoding each payload and decoding it from bytes:
+the standard library, ``src/bounceban/jsonio.py`` (whatever engine it picked)
+and, when installed, ``orjson`` and ``ujson``.
+
+    python -m loadtest.json_bench --repeat 5
+"""
+import argparse
+import json
+import time
+
+from loadtest.stand_in import result_item
+from src.bounceban import jsonio
+
+
+def payloads() -> dict:
+    return {
+        "bulk_submission_500k": {
+            "name": "benchmark", "emails": [f"user{i}@example.com" for i in range(500000)],
+        },
+        "dump_page_10k": {
+            "items": [result_item(f"user{i}@example.com", mx_records=2) for i in range(10000)],
+        },
+    }
+
+
+def engines() -> dict:
+    found = {
+        "json": (lambda obj: json.dumps(obj).encode("utf-8"), json.loads),
+        f"jsonio ({jsonio.ENGINE})": (jsonio.dumps_bytes, jsonio.loads),
+    }
+    try:
+        import orjson
+        found["orjson"] = (orjson.dumps, orjson.loads)
+    except ImportError:
+        pass
+    try:
+        import ujson
+        found["ujson"] = (lambda obj: ujson.dumps(obj).encode("utf-8"), ujson.loads)
+    except ImportError:
+        pass
+    return found
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    report = {}
+    for payload_name, payload in payloads().items():
+        body = json.dumps(payload).encode("utf-8")
+        report[payload_name] = {"bytes": len(body)}
+        for engine_name, (encode, decode) in engines().items():
+            report[payload_name][engine_name] = {
+                "encode_ms": round(1000 * best_of(lambda: encode(payload), args.repeat), 1),
+                "decode_ms": round(1000 * best_of(lambda: decode(body), args.repeat), 1),
+            }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Throughput of each gunicorn concurrency profile against the stand-in server.
+
+For every profile a gunicorn server is started with ``config/gunicorn_config.py``
+and ``BOUNCEBAN_WORKER_PROFILE`` set, pointed at a local stand-in BounceBan
+(``loadtest/stand_in.py``), and sent ``--requests`` calls to one module with
+``--concurrency`` in flight (request bodies come from ``loadtest/bench.py``). Run from the repository root:
+
+    python -m loadtest.profiles --profiles sync gthread gevent --latency 0.2
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from loadtest.bench import SCENARIOS, summarize
+from loadtest.stand_in import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULE = "verify_single_email/v1"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start within {timeout}s")
+
+
+def start_gunicorn(profile: str, port: int, upstream: str, extra_env: dict) -> subprocess.Popen:
+    env = dict(os.environ, BOUNCEBAN_WORKER_PROFILE=profile, BOUNCEBAN_BASE_URL=upstream, **extra_env)
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "config/gunicorn_config.py",
+         "--bind", f"127.0.0.1:{port}", "--access-logfile", "", "main:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def drive(url: str, body: dict, total: int, concurrency: int) -> dict:
+    """Send ``total`` POSTs to ``url`` with ``concurrency`` in flight; return the timings."""
+    local = threading.local()
+
+    def call(_):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            ok = session.post(url, json=body, timeout=120).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+    return summarize([latency for _, latency in results], elapsed, sum(1 for ok, _ in results if not ok))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["sync", "gthread", "gevent"])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="stand-in delay per upstream call")
+    parser.add_argument("--module", default=DEFAULT_MODULE, choices=list(SCENARIOS), help="module to call")
+    parser.add_argument("--body", help="JSON file with the request body (default: the module's benchmark body)")
+    parser.add_argument("--env", nargs="*", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the connector, e.g. BOUNCEBAN_WORKERS=2")
+    parser.add_argument("--no-rate-limit", action="store_true", help="turn the per-key rate limit off")
+    args = parser.parse_args()
+
+    body = SCENARIOS[args.module]
+    if args.body:
+        with open(args.body) as f:
+            body = json.load(f)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    # Fresh results every time, so each request really reaches the stand-in
+    extra_env.setdefault("BOUNCEBAN_RESULTS_TTL", "0")
+    extra_env.setdefault("BOUNCEBAN_CHECK_CACHE_TTL", "0")
+    if args.no_rate_limit:
+        extra_env["BOUNCEBAN_RATE_LIMIT"] = "0"
+
+    upstream = make_server(latency=args.latency)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f"http://127.0.0.1:{upstream.server_port}"
+
+    report = {}
+    for profile in args.profiles:
+        port = free_port()
+        server = start_gunicorn(profile, port, upstream_url, extra_env)
+        try:
+            wait_for_port(port)
+            url = f"http://127.0.0.1:{port}/{args.module}/execute"
+            drive(url, body, min(args.concurrency, args.requests), args.concurrency)  # warm-up
+            report[profile] = drive(url, body, args.requests, args.concurrency)
+        except RuntimeError as e:
+            report[profile] = {"error": str(e)}
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        print(json.dumps({profile: report[profile]}), flush=True)
+
+    upstream.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
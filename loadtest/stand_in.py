@@ -0,0 +1,239 @@
+"""Local stand-in for the BounceBan API, for load tests and benchmarks.
+
+Answers every endpoint the modules call with a canned, well-formed response,
+so the connector can be driven hard without spending credits. Point the
+connector at it with ``BOUNCEBAN_BASE_URL``. Latency (overall or per
+endpoint, with jitter), the share of failed calls and the size of result
+payloads can all be set:
+
+    python -m loadtest.stand_in --port 9100 --latency 0.2 --jitter 0.05 \
+        --endpoint-latency /v1/verify/bulk/dump=0.5 --error-rate 0.02 \
+        --task-size 50000 --mx-records 3 --message-bytes 200
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def result_item(email: str, mx_records: int = 1, message_bytes: int = 0) -> dict:
+    domain = email.rsplit("@", 1)[-1]
+    return {
+        "email": email,
+        "status": "completed",
+        "result": "deliverable",
+        "result_code": "ok",
+        "score": 95,
+        "is_catchall": False,
+        "is_disposable": False,
+        "is_role": False,
+        "is_free": False,
+        "is_seg_protected": False,
+        "message": "x" * message_bytes,
+        "mx_records": [f"mx{i}.{domain}" for i in range(1, mx_records + 1)],
+        "smtp_provider": "stand-in",
+        "verify_at": "2024-01-01T00:00:00Z",
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set by make_server
+    latency = 0.0
+    jitter = 0.0
+    endpoint_latency = {}
+    error_rate = 0.0
+    task_size = 1000
+    mx_records = 1
+    message_bytes = 0
+    pending_polls = 0
+
+    def _item(self, email: str) -> dict:
+        return result_item(email, self.mx_records, self.message_bytes)
+
+    def _delay(self, path: str) -> float:
+        base = self.endpoint_latency.get(path, self.latency)
+        return max(0.0, base + random.uniform(-self.jitter, self.jitter))
+
+    def _fail(self):
+        # Throttling and server errors in equal parts, like a busy upstream
+        if random.random() < 0.5:
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            body = b'{"message": "Too many requests"}'
+        else:
+            self.send_response(503)
+            body = b'{"message": "Service unavailable"}'
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _poll_status(self, key: str) -> str:
+        # "processing" for the first pending_polls status calls of each id
+        if not self.pending_polls:
+            return None
+        with self.polls_lock:
+            count = self.polls.get(key, 0)
+            self.polls[key] = count + 1
+        return "processing" if count < self.pending_polls else None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self._read_body()
+        if not self.headers.get("Authorization"):
+            self._send(401, {"message": "Missing API key"})
+            return
+        delay = self._delay(url.path)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self._fail()
+            return
+
+        route = (method, url.path)
+        if route == ("GET", "/v1/check"):
+            self._send(200, {
+                "email": params.get("email"),
+                "domain": params.get("domain"),
+                "domain_type": "business",
+                "username_type": "personal",
+                "syntax_valid": True,
+                "credits_consumed": 0,
+                "credits_remaining": 100000,
+            })
+        elif route == ("GET", "/v1/verify/single"):
+            verification_id = uuid.uuid4().hex
+            item = dict(self._item(params.get("email", "")), id=verification_id)
+            if self._poll_status(verification_id):
+                item.update(status="processing", result=None)
+            self._send(200, item)
+        elif route == ("GET", "/v1/verify/single/status"):
+            verification_id = params.get("id")
+            item = dict(self._item("someone@example.com"), id=verification_id)
+            if self._poll_status(verification_id):
+                item.update(status="processing", result=None)
+            self._send(200, item)
+        elif route == ("POST", "/v1/verify/bulk"):
+            emails = json.loads(body or b"{}").get("emails", [])
+            self._send(200, {
+                "id": uuid.uuid4().hex,
+                "status": "processing",
+                "count_submitted": len(emails),
+                "count_duplicates_removed": 0,
+                "count_processing": len(emails),
+            })
+        elif route == ("GET", "/v1/verify/bulk/status"):
+            self._send(200, {
+                "id": params.get("id"),
+                "status": self._poll_status("bulk:" + str(params.get("id"))) or "finished",
+                "count_total": self.task_size,
+                "count_checked": self.task_size,
+                "count_deliverable": self.task_size,
+            })
+        elif route == ("POST", "/v1/verify/bulk/emails"):
+            emails = json.loads(body or b"{}").get("emails", [])
+            self._send(200, {
+                "status": "finished",
+                "result_ready": True,
+                "items": [self._item(email) for email in emails],
+            })
+        elif route == ("GET", "/v1/verify/bulk/dump"):
+            offset = int(params.get("offset", 0))
+            limit = int(params.get("limit", 1000))
+            end = min(offset + limit, self.task_size)
+            self._send(200, {
+                "items": [self._item(f"user{i}@example.com") for i in range(offset, end)],
+            })
+        elif route == ("POST", "/v1/verify/bulk/destroy"):
+            self._send(200, {"status": "success", "emails_deleted": self.task_size})
+        else:
+            self._send(404, {"message": f"No stand-in for {method} {url.path}"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                task_size: int = 1000, **options) -> ThreadingHTTPServer:
+    """Build a stand-in server; ``port=0`` picks a free port (see ``server_port``).
+
+    ``options`` sets any other ``StandInHandler`` control: ``jitter``,
+    ``endpoint_latency``, ``error_rate``, ``mx_records``, ``message_bytes``
+    and ``pending_polls``.
+    """
+    unknown = set(options) - {
+        "jitter", "endpoint_latency", "error_rate", "mx_records", "message_bytes", "pending_polls"
+    }
+    if unknown:
+        raise TypeError(f"Unknown stand-in options: {', '.join(sorted(unknown))}")
+    attributes = dict(options, latency=latency, task_size=task_size, polls={}, polls_lock=threading.Lock())
+    handler = type("Handler", (StandInHandler,), attributes)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- seconds on every delay")
+    parser.add_argument("--endpoint-latency", nargs="*", default=[], metavar="PATH=SECONDS",
+                        help="per-endpoint delay, e.g. /v1/verify/bulk/dump=0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered 429/503")
+    parser.add_argument("--task-size", type=int, default=1000, help="emails in every bulk task")
+    parser.add_argument("--mx-records", type=int, default=1, help="MX records in every result")
+    parser.add_argument("--message-bytes", type=int, default=0, help="padding in every result message")
+    parser.add_argument("--pending-polls", type=int, default=0,
+                        help="status calls answered 'processing' before a result is ready")
+    args = parser.parse_args()
+    endpoint_latency = {
+        path: float(seconds) for path, seconds in (item.split("=", 1) for item in args.endpoint_latency)
+    }
+    server = make_server(
+        args.host, args.port, args.latency, args.task_size,
+        jitter=args.jitter, endpoint_latency=endpoint_latency, error_rate=args.error_rate,
+        mx_records=args.mx_records, message_bytes=args.message_bytes, pending_polls=args.pending_polls,
+    )
+    print(f"BounceBan stand-in on http://{args.host}:{server.server_port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
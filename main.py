@@ -1,9 +1,11 @@
 from flask import Flask
 from workflows_cdk import Router
+from src.bounceban.metrics import instrument_app
 
 # Create Flask app
 app = Flask(__name__)
 router = Router(app)
+instrument_app(app)
 
 if __name__ == "__main__":
     router.run_app(app)
\ No newline at end of file
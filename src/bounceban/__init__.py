@@ -0,0 +1 @@
+"""Shared helpers used by the BounceBan modules in ``src/modules``."""
@@ -0,0 +1,130 @@
+"""Non-blocking BounceBan client for the async execution mode.
+
+With ``BOUNCEBAN_EXECUTION=async`` every worker runs one asyncio event loop
+in a background thread, with a single ``httpx.AsyncClient`` on it.
+``client.request`` hands each call to that loop and waits for the answer, so
+a request thread only parks on a future while the loop multiplexes every
+upstream socket. With gunicorn's ``threads`` raised to match (see
+``config/gunicorn_config.py``) one worker keeps hundreds of BounceBan calls
+in flight over a shared keep-alive pool.
+
+Responses come back as ``requests.Response`` objects and transport errors as
+``requests.exceptions``, so route handlers, retries and error messages are
+the same in both modes. Code that already runs on the loop can ``await``
+``request``/``get``/``post`` directly.
+
+Settings (environment variables):
+    BOUNCEBAN_EXECUTION         "async" to enable this mode (default "sync")
+    BOUNCEBAN_ASYNC_POOL_SIZE   max open connections on the loop (default 200)
+"""
+import asyncio
+import os
+import threading
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from src.bounceban import client
+
+ASYNC_POOL_SIZE = int(os.environ.get("BOUNCEBAN_ASYNC_POOL_SIZE", "200"))
+
+_lock = threading.Lock()
+_loop = None
+_loop_pid = None
+_client = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return this worker's event loop, starting its thread on first use.
+
+    Like the sync session, the loop is keyed on the process id so a worker
+    never inherits a loop (or its sockets) from the gunicorn master.
+    """
+    global _loop, _loop_pid, _client
+    pid = os.getpid()
+    if _loop is not None and _loop_pid == pid:
+        return _loop
+    with _lock:
+        if _loop is None or _loop_pid != pid:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="bounceban-aio", daemon=True)
+            thread.start()
+            _loop = loop
+            _loop_pid = pid
+            _client = None
+        return _loop
+
+
+def _get_client() -> httpx.AsyncClient:
+    # Only ever called on the loop thread, so no locking is needed
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=client.BASE_URL,
+            headers={
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip, deflate",
+            },
+            limits=httpx.Limits(
+                max_connections=ASYNC_POOL_SIZE, max_keepalive_connections=ASYNC_POOL_SIZE
+            ),
+        )
+    return _client
+
+
+def run(coro):
+    """Run ``coro`` on this worker's loop and block the calling thread until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+async def _iter_body(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _to_requests_response(response: httpx.Response) -> requests.Response:
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted._content = response.content
+    converted.headers = CaseInsensitiveDict(response.headers)
+    converted.url = str(response.url)
+    converted.reason = response.reason_phrase
+    converted.encoding = response.encoding
+    converted.elapsed = response.elapsed
+    return converted
+
+
+async def request(method: str, path: str, api_key: str, params: dict = None, json: dict = None,
+                  data=None, headers: dict = None, timeout: float = None) -> requests.Response:
+    """Async counterpart of ``client.request``."""
+    read_timeout = timeout if timeout is not None else client.endpoint_timeout(path)
+    content = data
+    if data is not None and not isinstance(data, (bytes, str)):
+        # Generator bodies are still streamed with chunked transfer encoding
+        content = _iter_body(data)
+    try:
+        response = await _get_client().request(
+            method,
+            path,
+            headers=client.request_headers(api_key, headers),
+            params=params,
+            json=json,
+            content=content,
+            timeout=httpx.Timeout(read_timeout, connect=client.CONNECT_TIMEOUT),
+        )
+    except httpx.ConnectTimeout as e:
+        raise requests.exceptions.ConnectTimeout(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.ReadTimeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    return _to_requests_response(response)
+
+
+async def get(path: str, api_key: str, params: dict = None, **kwargs) -> requests.Response:
+    return await request("GET", path, api_key, params=params, **kwargs)
+
+
+async def post(path: str, api_key: str, json: dict = None, **kwargs) -> requests.Response:
+    return await request("POST", path, api_key, json=json, **kwargs)
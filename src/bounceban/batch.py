@@ -0,0 +1,42 @@
+"""Helpers for modules that take a list of emails/domains in one step."""
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_lines(text: str, normalize=str.lower):
+    """Split a newline-separated textarea value into unique, normalized entries.
+
+    Returns ``(items, duplicates_removed)``. Order of first appearance is kept.
+    """
+    seen = set()
+    items = []
+    duplicates = 0
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        value = normalize(line) if normalize else line
+        if value in seen:
+            duplicates += 1
+            continue
+        seen.add(value)
+        items.append(value)
+    return items, duplicates
+
+
+def run_concurrently(fn, items, max_workers: int):
+    """Call ``fn(item)`` for every item with at most ``max_workers`` in flight.
+
+    Returns a list of ``(item, result, error)`` tuples in input order; an
+    exception raised by ``fn`` is returned as ``error`` instead of aborting
+    the whole batch.
+    """
+    def call(item):
+        try:
+            return item, fn(item), None
+        except Exception as e:
+            return item, None, e
+
+    if max_workers <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(call, items))
@@ -0,0 +1,258 @@
+"""Streaming helpers for bulk email submission.
+
+A 500k-line textarea is never turned into a Python list: it is scanned in
+blocks, each address is normalized and syntax-checked on the way, and the
+request body is produced by a generator so ``requests`` can send it with
+chunked transfer encoding. Internationalized domains are sent in their IDNA
+(``xn--``) form.
+"""
+import os
+import re
+from json.encoder import encode_basestring_ascii
+
+from src.bounceban import client, jsonio
+
+# BounceBan's limit for a single bulk task
+MAX_EMAILS_PER_TASK = 500000
+
+# Send bulk bodies with chunked transfer encoding; set to "false" to send a
+# pre-encoded body with a Content-Length instead.
+CHUNKED_UPLOAD = os.environ.get("BOUNCEBAN_BULK_CHUNKED", "true").lower() == "true"
+
+# Size of each piece handed to the socket
+BODY_CHUNK_BYTES = 64 * 1024
+
+# Pre-filter input is scanned in newline-aligned blocks of about this many
+# characters, so each regex pass runs in C over many lines at once while
+# memory stays bounded.
+BLOCK_CHARS = 1 << 20
+
+# Syntax check for the pre-filter; it only rejects clearly malformed
+# addresses and leaves the real verification to BounceBan. Domains are
+# matched in their ASCII form; see ``normalize_domain`` for the others.
+_LOCAL = r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+_DOMAIN = (
+    r"(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+"
+    r"(?:[A-Za-z]{2,63}|[Xx][Nn]--[A-Za-z0-9-]{1,59})"
+)
+EMAIL_PATTERN = re.compile(f"({_LOCAL})@({_DOMAIN})\\Z")
+LOCAL_PATTERN = re.compile(f"{_LOCAL}\\Z")
+DOMAIN_PATTERN = re.compile(f"{_DOMAIN}\\Z")
+EMAIL_LINE_PATTERN = re.compile(
+    f"^[ \\t\\r\\f\\v]*({_LOCAL})@({_DOMAIN})[ \\t\\r\\f\\v]*$", re.MULTILINE
+)
+BLANK_LINE_PATTERN = re.compile(r"^[ \t\r\f\v]*$", re.MULTILINE)
+
+
+def iter_blocks(text: str, size: int = BLOCK_CHARS):
+    """Yield consecutive slices of ``text`` of about ``size`` characters, cut at newlines."""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find("\n", start + size)
+        if end == -1:
+            end = length
+        yield text[start:end]
+        start = end + 1
+
+
+class PrefilterStats:
+    """Counts collected while emails are pre-filtered."""
+
+    # Invalid lines echoed back to the workflow, at most
+    MAX_INVALID_SAMPLES = 100
+
+    def __init__(self):
+        self.count_lines = 0
+        self.count_unique = 0
+        self.count_duplicates_removed = 0
+        self.count_invalid = 0
+        self.invalid_emails = []
+        self.emails = None
+
+    def reject(self, line: str):
+        self.count_invalid += 1
+        if len(self.invalid_emails) < self.MAX_INVALID_SAMPLES:
+            self.invalid_emails.append(line)
+
+
+def _is_valid_length(local: str, domain: str) -> bool:
+    return len(local) <= 64 and len(local) + len(domain) < 254
+
+
+def normalize_domain(domain: str):
+    """ASCII (IDNA) form of ``domain``, lowercased, or ``None`` if it is malformed."""
+    if not domain.isascii():
+        try:
+            domain = domain.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    if DOMAIN_PATTERN.match(domain) is None:
+        return None
+    return domain.lower()
+
+
+def normalize_email(email: str):
+    """Lowercase the domain of ``email`` and check its syntax.
+
+    Returns the normalized address, or ``None`` if it is clearly malformed.
+    The local part is left as typed since it may be case-sensitive; an
+    internationalized domain is converted to its IDNA form.
+    """
+    email = email.strip()
+    match = EMAIL_PATTERN.match(email)
+    if match is not None:
+        local, domain = match.group(1), match.group(2).lower()
+    else:
+        local, _, domain = email.rpartition("@")
+        if LOCAL_PATTERN.match(local) is None:
+            return None
+        domain = normalize_domain(domain)
+        if domain is None:
+            return None
+    if not _is_valid_length(local, domain):
+        return None
+    return local + "@" + domain
+
+
+def iter_unique_emails(text: str, stats: PrefilterStats = None):
+    """Yield each distinct, syntactically valid email in ``text`` once.
+
+    Emails come out normalized and in order of first appearance. Blocks in
+    which every line matches the ASCII pattern take the fast path; the
+    others are checked line by line with ``normalize_email``.
+    """
+    if stats is None:
+        stats = PrefilterStats()
+    seen = set()
+    for block in iter_blocks(text):
+        matches = EMAIL_LINE_PATTERN.findall(block)
+        lines = block.count("\n") + 1 - len(BLANK_LINE_PATTERN.findall(block))
+        stats.count_lines += lines
+        unique_before = len(seen)
+        if lines != len(matches):
+            # Slow path: invalid or internationalized lines in this block
+            valid = 0
+            for line in block.splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                email = normalize_email(line)
+                if email is None:
+                    stats.reject(line)
+                    continue
+                valid += 1
+                if email in seen:
+                    continue
+                seen.add(email)
+                yield email
+            unique = len(seen) - unique_before
+            stats.count_unique += unique
+            stats.count_duplicates_removed += valid - unique
+            continue
+
+        # Hot loop: counters are settled once per block rather than per email
+        too_long = 0
+        for local, domain in matches:
+            if len(local) > 64 or len(local) + len(domain) >= 254:
+                too_long += 1
+                stats.reject(local + "@" + domain)
+                continue
+            email = local + "@" + domain.lower()
+            if email in seen:
+                continue
+            seen.add(email)
+            yield email
+        unique = len(seen) - unique_before
+        stats.count_unique += unique
+        stats.count_duplicates_removed += len(matches) - too_long - unique
+
+
+def prefilter_emails(text: str, keep: bool = False) -> PrefilterStats:
+    """Run the pre-filter over ``text``.
+
+    With ``keep`` the distinct emails are kept, in order, as ``stats.emails``,
+    so a caller that submits them does not parse ``text`` a second time.
+    """
+    stats = PrefilterStats()
+    emails = iter_unique_emails(text, stats)
+    if keep:
+        stats.emails = list(emails)
+    else:
+        for _ in emails:
+            pass
+    return stats
+
+
+def iter_bulk_body(name: str, emails, url: str = None):
+    """Encode ``{"name": ..., "url": ..., "emails": [...]}`` incrementally as UTF-8 bytes.
+
+    ``url`` is the optional completion callback; it is left out when ``None``.
+    """
+    head = '{"name": ' + encode_basestring_ascii(name)
+    if url:
+        head += ', "url": ' + encode_basestring_ascii(url)
+    yield (head + ', "emails": [').encode("ascii")
+    buffer = []
+    size = 0
+    first = True
+    for email in emails:
+        piece = encode_basestring_ascii(email)
+        if first:
+            first = False
+        else:
+            piece = ", " + piece
+        buffer.append(piece)
+        size += len(piece)
+        if size >= BODY_CHUNK_BYTES:
+            yield "".join(buffer).encode("ascii")
+            buffer = []
+            size = 0
+    buffer.append("]}")
+    yield "".join(buffer).encode("ascii")
+
+
+def bulk_body(name: str, emails, url: str = None):
+    """Request body for a bulk submission, streamed unless chunked upload is off."""
+    body = iter_bulk_body(name, emails, url)
+    if CHUNKED_UPLOAD:
+        return body
+    return b"".join(body)
+
+
+def submit_bulk_task(api_key: str, task_name: str, emails, url: str = None) -> dict:
+    """Create one BounceBan bulk task, streaming ``emails`` into the request body.
+
+    BounceBan calls ``url``, when given, once the task is finished.
+    """
+    response = client.post("/v1/verify/bulk", api_key, data=bulk_body(task_name, emails, url))
+    response.raise_for_status()
+    return jsonio.response_json(response)
+
+
+def fetch_bulk_status(api_key: str, task_id: str) -> dict:
+    response = client.get("/v1/verify/bulk/status", api_key, params={"id": task_id})
+    response.raise_for_status()
+    return jsonio.response_json(response)
+
+
+def task_metadata_status(task_status: str) -> str:
+    """Module ``metadata.status`` for an upstream task status."""
+    if task_status in ["completed", "complete", "finished"]:
+        return "success"
+    elif task_status in ["processing", "running", "verifying", "waiting", "queued"]:
+        return "still processing"
+    elif task_status in ["failed", "error", "cancelled"]:
+        return "failed"
+    else:
+        return "still processing"
+
+
+def is_task_terminal(result: dict) -> bool:
+    return task_metadata_status((result.get("status") or "").lower()) != "still processing"
+
+
+def destroy_bulk_task(api_key: str, task_id: str) -> dict:
+    response = client.post("/v1/verify/bulk/destroy", api_key, json={"id": task_id})
+    response.raise_for_status()
+    return jsonio.response_json(response)
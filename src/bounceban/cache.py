@@ -0,0 +1,276 @@
+"""Bounded TTL/LRU caches for BounceBan responses.
+
+A ``TTLCache`` lives in the worker's memory. When ``BOUNCEBAN_CACHE_BACKEND``
+is set to ``sqlite`` a ``SQLiteCache`` file is put behind it, so all
+gunicorn workers on the host share hits.
+
+Settings (environment variables):
+    BOUNCEBAN_CACHE_BACKEND   "memory" (default) or "sqlite"
+    BOUNCEBAN_CACHE_PATH      SQLite file shared by the workers
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from src.bounceban import jsonio, metrics
+
+CACHE_BACKEND = os.environ.get("BOUNCEBAN_CACHE_BACKEND", "memory").lower()
+CACHE_PATH = os.environ.get(
+    "BOUNCEBAN_CACHE_PATH", os.path.join(tempfile.gettempdir(), "bounceban_cache.sqlite3")
+)
+
+_MISSING = object()
+
+
+def api_key_hash(api_key: str) -> str:
+    """Short, non-reversible tag for an API key, safe to use in cache keys."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class TTLCache:
+    """Thread-safe in-process cache with a size bound (LRU) and a TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCache:
+    """TTL/LRU cache stored in a SQLite file that several processes can share.
+
+    Values are stored as JSON. Each thread of each process opens its own
+    connection; the database runs in WAL mode so readers never block writers.
+    """
+
+    def __init__(self, path: str, namespace: str, maxsize: int, ttl: float):
+        self.path = path
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get_entry(self, key):
+        """Return ``(value, seconds_left)`` for a live entry, or ``None``."""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None or row[1] <= now:
+            self.misses += 1
+            return None
+        conn.execute(
+            "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key),
+        )
+        self.hits += 1
+        return jsonio.loads(row[0]), row[1] - now
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl: float = None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, jsonio.dumps(value), expires_at, now),
+        )
+        self._after_writes(1)
+
+    def set_many(self, items, ttl: float = None):
+        """Store ``(key, value)`` pairs in one transaction."""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        rows = [(self.namespace, key, jsonio.dumps(value), expires_at, now) for key, value in items]
+        if not rows:
+            return
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        self._after_writes(len(rows))
+
+    def _after_writes(self, count: int):
+        # Prune every few hundred writes rather than on each one
+        before = self._writes
+        self._writes += count
+        if before // 256 != self._writes // 256:
+            self.prune()
+
+    def delete(self, key):
+        self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+
+    def prune(self):
+        """Drop expired rows, then the least recently used ones above ``maxsize``."""
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, time.time()),
+        )
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache WHERE namespace = ?"
+            " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.maxsize),
+        )
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class TieredCache:
+    """In-memory ``TTLCache`` in front of an optional shared backend.
+
+    Lookups are counted in ``bounceban_cache_lookups_total`` under ``name``.
+    """
+
+    def __init__(self, memory: TTLCache, shared: SQLiteCache = None, name: str = "cache"):
+        self.memory = memory
+        self.shared = shared
+        self.name = name
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            metrics.record_cache_lookup(self.name, "hit_memory")
+            return value
+        if self.shared is not None:
+            try:
+                entry = self.shared.get_entry(key)
+            except sqlite3.Error:
+                # The shared tier is an optimisation; treat failures as a miss
+                entry = None
+            if entry is not None:
+                # Keep the shared entry's expiry rather than restarting the TTL
+                value, seconds_left = entry
+                self.memory.set(key, value, seconds_left)
+                metrics.record_cache_lookup(self.name, "hit_shared")
+                return value
+        metrics.record_cache_lookup(self.name, "miss")
+        return default
+
+    def set(self, key, value, ttl: float = None):
+        self.memory.set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except sqlite3.Error:
+                pass
+
+    def set_many(self, items, ttl: float = None):
+        items = list(items)
+        for key, value in items:
+            self.memory.set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set_many(items, ttl)
+            except sqlite3.Error:
+                pass
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def stats(self) -> dict:
+        stats = {"memory": self.memory.stats()}
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+
+def make_cache(namespace: str, maxsize: int, ttl: float) -> TieredCache:
+    """Build the cache for ``namespace`` according to ``BOUNCEBAN_CACHE_BACKEND``."""
+    shared = None
+    if CACHE_BACKEND == "sqlite":
+        shared = SQLiteCache(CACHE_PATH, namespace, maxsize=maxsize, ttl=ttl)
+    return TieredCache(TTLCache(maxsize, ttl), shared, name=namespace)
@@ -0,0 +1,71 @@
+"""``/v1/check`` calls and their cache, for the check module.
+
+Settings (environment variables):
+    BOUNCEBAN_CHECK_CACHE_TTL    seconds a check result is reused (default 3600)
+    BOUNCEBAN_CHECK_CACHE_SIZE   entries kept per worker (default 10000)
+"""
+import os
+import time
+
+from src.bounceban import client, jsonio
+from src.bounceban.cache import api_key_hash, make_cache
+
+# Check results only change when a domain's configuration does, so repeated
+# lookups of the same email/domain are served from here for a while.
+CHECK_CACHE_TTL = int(os.environ.get("BOUNCEBAN_CHECK_CACHE_TTL", "3600"))
+CHECK_CACHE_SIZE = int(os.environ.get("BOUNCEBAN_CHECK_CACHE_SIZE", "10000"))
+check_cache = make_cache("check", maxsize=CHECK_CACHE_SIZE, ttl=CHECK_CACHE_TTL)
+
+
+class BatchTimeUp(Exception):
+    """Raised for queries a batch had no time left to send upstream."""
+
+
+def normalize_query(query: str) -> str:
+    return query.strip().lower()
+
+
+def fetch_check(api_key: str, normalized_query: str, deadline: float = None):
+    """Return the /v1/check result for a normalized query and whether it came from the cache.
+
+    Past ``deadline`` (``time.monotonic()``) only cached results are returned;
+    a miss raises ``BatchTimeUp``.
+    """
+    cache_key = f"{api_key_hash(api_key)}:{normalized_query}"
+    result = check_cache.get(cache_key)
+    if result is not None:
+        return result, "hit"
+    if deadline is not None and time.monotonic() >= deadline:
+        raise BatchTimeUp(normalized_query)
+
+    # Correct parameter based on input
+    if "@" in normalized_query:
+        params = { "email": normalized_query }
+    else:
+        params = { "domain": normalized_query }
+
+    response = client.get("/v1/check", api_key, params=params)
+    response.raise_for_status()
+    result = jsonio.response_json(response)
+    check_cache.set(cache_key, result)
+    return result, "miss"
+
+
+def format_check(query: str, result: dict, cached: bool = False) -> dict:
+    check_data = {
+        "query": query,
+        "domain_type": result.get("domain_type"),
+        "username_type": result.get("username_type"),
+        "syntax_valid": result.get("syntax_valid"),
+        "credits_consumed": result.get("credits_consumed"),
+        "credits_remaining": result.get("credits_remaining"),
+        "cached": cached,
+        "raw": result  # Optional: include raw result for debugging
+    }
+    if cached:
+        # A cached answer cost nothing, and the balance it carried is stale;
+        # the raw body says so too instead of repeating the old call's credits
+        check_data["credits_consumed"] = 0
+        check_data["credits_remaining"] = None
+        check_data["raw"] = dict(result, credits_consumed=0, credits_remaining=None)
+    return check_data
@@ -0,0 +1,158 @@
+"""Pooled HTTP client for the BounceBan API.
+
+Every gunicorn worker keeps a single ``requests.Session`` with a keep-alive
+connection pool, so consecutive workflow steps reuse the same TCP/TLS
+connection to api.bounceban.com instead of opening a new one per call.
+
+Settings (environment variables):
+    BOUNCEBAN_BASE_URL          API root, e.g. a local stand-in server for
+                                load tests (default https://api.bounceban.com)
+    BOUNCEBAN_POOL_SIZE         max pooled connections per worker (default 10)
+    BOUNCEBAN_POOL_BLOCK        "true" to wait for a free connection instead of
+                                opening an extra, non-pooled one (default false)
+    BOUNCEBAN_CONNECT_TIMEOUT   connect timeout in seconds (default 5)
+    BOUNCEBAN_EXECUTION         "sync" (default) or "async", see ``aio.py``
+    BOUNCEBAN_TIMEOUT_<NAME>    read timeout for one endpoint, e.g.
+                                BOUNCEBAN_TIMEOUT_VERIFY_BULK_DUMP=120
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.bounceban import jsonio, metrics, resilience
+
+BASE_URL = os.environ.get("BOUNCEBAN_BASE_URL", "https://api.bounceban.com").rstrip("/")
+
+POOL_SIZE = int(os.environ.get("BOUNCEBAN_POOL_SIZE", "10"))
+POOL_BLOCK = os.environ.get("BOUNCEBAN_POOL_BLOCK", "false").lower() == "true"
+CONNECT_TIMEOUT = float(os.environ.get("BOUNCEBAN_CONNECT_TIMEOUT", "5"))
+EXECUTION_MODE = os.environ.get("BOUNCEBAN_EXECUTION", "sync").lower()
+
+# Default read timeouts (seconds) per endpoint
+DEFAULT_TIMEOUT = 30
+TIMEOUTS = {
+    "/v1/check": 30,
+    "/v1/verify/single": 30,
+    "/v1/verify/single/status": 30,
+    "/v1/verify/bulk": 60,
+    "/v1/verify/bulk/status": 30,
+    "/v1/verify/bulk/emails": 30,
+    "/v1/verify/bulk/dump": 60,
+    "/v1/verify/bulk/destroy": 30,
+}
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def endpoint_timeout(path: str) -> float:
+    """Read timeout for ``path``; ``BOUNCEBAN_TIMEOUT_<NAME>`` overrides the default."""
+    name = path.strip("/").split("/", 1)[-1].replace("/", "_").upper()
+    override = os.environ.get(f"BOUNCEBAN_TIMEOUT_{name}")
+    if override:
+        return float(override)
+    return TIMEOUTS.get(path, DEFAULT_TIMEOUT)
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=POOL_BLOCK)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return this worker's session, creating it on first use.
+
+    The session is keyed on the process id so a pool inherited through
+    ``fork`` is never shared between gunicorn workers.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+    with _lock:
+        if _session is None or _session_pid != pid:
+            _session = _build_session()
+            _session_pid = pid
+        return _session
+
+
+def request_headers(api_key: str, headers: dict = None) -> dict:
+    merged = {
+        # BounceBan expects the raw key, without a Bearer prefix
+        "Authorization": api_key,
+        "Content-Type": "application/json",
+    }
+    if headers:
+        merged.update(headers)
+    return merged
+
+
+def _send(method: str, path: str, api_key: str, params: dict = None, json: dict = None,
+          data=None, headers: dict = None, timeout: float = None) -> requests.Response:
+    started = time.perf_counter()
+    try:
+        if EXECUTION_MODE == "async":
+            from src.bounceban import aio
+            response = aio.run(aio.request(
+                method, path, api_key, params=params, json=json, data=data, headers=headers, timeout=timeout
+            ))
+        else:
+            read_timeout = timeout if timeout is not None else endpoint_timeout(path)
+            response = get_session().request(
+                method,
+                BASE_URL + path,
+                headers=request_headers(api_key, headers),
+                params=params,
+                json=json,
+                data=data,
+                timeout=(CONNECT_TIMEOUT, read_timeout),
+            )
+    except Exception as e:
+        metrics.observe_upstream(path, started, error=e)
+        raise
+    metrics.observe_upstream(path, started, response)
+    return response
+
+
+def request(method: str, path: str, api_key: str, params: dict = None, json: dict = None,
+            data=None, headers: dict = None, timeout: float = None, retries: int = None) -> requests.Response:
+    """Send a request to ``BASE_URL + path`` over the pooled session.
+
+    Calls go through the rate limit, retry and circuit-breaker rules in
+    ``src/bounceban/resilience.py``; ``retries`` overrides the number of
+    retries (0 for callers that retry on their own). In the async execution
+    mode each attempt is made on the worker's event loop instead (see
+    ``src/bounceban/aio.py``); the return value and exceptions are the same.
+    """
+    if json is not None:
+        data = jsonio.dumps_bytes(json)
+        json = None
+    replayable = data is None or isinstance(data, (bytes, str))
+    return resilience.call(
+        lambda: _send(method, path, api_key, params=params, json=json, data=data, headers=headers, timeout=timeout),
+        path,
+        api_key,
+        replayable=replayable,
+        retries=retries,
+    )
+
+
+def get(path: str, api_key: str, params: dict = None, **kwargs) -> requests.Response:
+    return request("GET", path, api_key, params=params, **kwargs)
+
+
+def post(path: str, api_key: str, json: dict = None, **kwargs) -> requests.Response:
+    return request("POST", path, api_key, json=json, **kwargs)
+
@@ -0,0 +1,279 @@
+"""Paging through ``/v1/verify/bulk/dump`` results.
+
+``iter_dump_pages`` walks every page of a task, fetching the next page in a
+background thread while the caller is still processing the current one, so
+at most two pages are held in memory at any time.
+
+``iter_dump_pages_parallel`` fetches several offset windows at once. Its
+concurrency grows while pages come back cleanly and is halved on 429/5xx
+responses; pages are still yielded in offset order.
+"""
+import csv
+import io
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from src.bounceban import client, jsonio, metrics
+from src.bounceban.resilience import retry_delay
+
+DUMP_PATH = "/v1/verify/bulk/dump"
+
+# Largest page BounceBan serves
+MAX_PAGE_SIZE = 10000
+
+# Retries per page after a 429/5xx/network error in the parallel pager, which
+# retries on its own so it can lower its concurrency at the same time
+PAGE_RETRIES = 5
+
+# (output field, upstream field) for every result row
+RESULT_FIELDS = (
+    ("email", "email"),
+    ("result", "result"),
+    ("result_code", "result_code"),
+    ("score", "score"),
+    ("is_catchall", "is_catchall"),
+    ("is_disposable", "is_disposable"),
+    ("is_role", "is_role"),
+    ("is_free", "is_free"),
+    ("is_seg_protected", "is_seg_protected"),
+    ("message", "message"),
+    ("mx_records", "mx_records"),
+    ("smtp_provider", "smtp_provider"),
+    ("verified_at", "verify_at"),  # Notice: it's 'verify_at' not 'verified_at'
+)
+RESULT_COLUMNS = [name for name, _ in RESULT_FIELDS]
+
+
+def format_result(item: dict) -> dict:
+    """Reshape one upstream dump item into the connector's result row."""
+    return {name: item.get(source) for name, source in RESULT_FIELDS}
+
+
+class ResultColumns:
+    """Dump results held as one list per output column.
+
+    Each upstream item is read once per column and no per-row dict is
+    built, so a 10,000-item page costs 13 lists instead of 10,000 dicts:
+    a fraction of the memory and CPU of ``format_result`` rows, and a
+    ``{column: [values]}`` dict serializes several times faster too.
+    """
+
+    __slots__ = ("columns", "count")
+
+    def __init__(self, items=()):
+        self.columns = {name: [] for name in RESULT_COLUMNS}
+        self.count = 0
+        if items:
+            self.extend(items)
+
+    def extend(self, items):
+        for name, source in RESULT_FIELDS:
+            self.columns[name].extend([item.get(source) for item in items])
+        self.count += len(items)
+
+    def to_dict(self) -> dict:
+        return self.columns
+
+
+def fetch_dump_page(api_key: str, task_id: str, offset: int, limit: int,
+                    filter_status: str = "all", retries: int = None) -> list:
+    params = {
+        "id": task_id,
+        "offset": offset,
+        "limit": limit
+    }
+    if filter_status and filter_status != "all":
+        params["filter"] = filter_status
+    response = client.get(DUMP_PATH, api_key, params=params, retries=retries)
+    response.raise_for_status()
+    return jsonio.response_json(response).get("items", [])
+
+
+def iter_dump_pages(api_key: str, task_id: str, offset: int = 0, limit: int = MAX_PAGE_SIZE,
+                    filter_status: str = "all"):
+    """Yield ``(offset, items)`` for every page from ``offset`` to the end of the task.
+
+    The next page is requested as soon as the current one arrives. A page
+    shorter than ``limit`` marks the end of the task.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch_dump_page, api_key, task_id, offset, limit, filter_status)
+        while future is not None:
+            items = future.result()
+            page_offset = offset
+            if len(items) < limit:
+                future = None
+            else:
+                offset += limit
+                future = executor.submit(fetch_dump_page, api_key, task_id, offset, limit, filter_status)
+            if items:
+                yield page_offset, items
+
+
+class AdaptiveLimit:
+    """Additive-increase/multiplicative-decrease concurrency limit."""
+
+    def __init__(self, initial: int, maximum: int):
+        self.maximum = max(1, maximum)
+        self.value = max(1, min(initial, self.maximum))
+        self._lock = threading.Lock()
+
+    def on_success(self):
+        with self._lock:
+            self.value = min(self.maximum, self.value + 1)
+
+    def on_throttle(self):
+        with self._lock:
+            self.value = max(1, self.value // 2)
+
+
+def iter_dump_pages_parallel(api_key: str, task_id: str, offset: int = 0, limit: int = MAX_PAGE_SIZE,
+                             filter_status: str = "all", max_concurrency: int = 4):
+    """Like ``iter_dump_pages`` but with up to ``max_concurrency`` pages in flight.
+
+    The task size is not known up front, so windows are requested
+    speculatively; once a short page marks the end, later windows are
+    dropped. Pages that are fetched early wait in memory until every page
+    before them has been yielded, which is bounded by the concurrency limit.
+    When a page cannot be fetched, the pages before it are still yielded and
+    its error is raised after them.
+    """
+    limit_control = AdaptiveLimit(initial=2, maximum=max_concurrency)
+
+    def fetch(page_offset, delay):
+        if delay:
+            time.sleep(delay)
+        return fetch_dump_page(api_key, task_id, page_offset, limit, filter_status, retries=0)
+
+    pending = {}  # future -> page offset
+    attempts = {}  # page offset -> retries so far
+    ready = {}  # page offset -> items, waiting for earlier pages
+    next_offset = offset  # next window to request
+    yield_offset = offset  # next window to hand to the caller
+    end_offset = None  # offset of the last page, once seen
+    failure = None  # (page offset, error) of a page that cannot be fetched
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+    try:
+        while True:
+            while (len(pending) + len(ready) < limit_control.value
+                   and (end_offset is None or next_offset <= end_offset)
+                   and (failure is None or next_offset < failure[0])):
+                pending[executor.submit(fetch, next_offset, 0)] = next_offset
+                next_offset += limit
+
+            # Every page before a failed one is handed out before its error
+            if failure is not None and yield_offset == failure[0]:
+                raise failure[1]
+            if not pending and yield_offset not in ready:
+                return
+
+            if pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_offset = pending.pop(future)
+                    if end_offset is not None and page_offset > end_offset:
+                        continue
+                    if failure is not None and page_offset > failure[0]:
+                        continue
+                    try:
+                        items = future.result()
+                    except Exception as e:
+                        attempt = attempts.get(page_offset, 0)
+                        delay = retry_delay(e, attempt)
+                        if delay is None or attempt >= PAGE_RETRIES:
+                            if failure is None or page_offset < failure[0]:
+                                failure = (page_offset, e)
+                            continue
+                        attempts[page_offset] = attempt + 1
+                        metrics.record_retry(DUMP_PATH, metrics.error_label(e))
+                        limit_control.on_throttle()
+                        pending[executor.submit(fetch, page_offset, delay)] = page_offset
+                        continue
+                    limit_control.on_success()
+                    if len(items) < limit and (end_offset is None or page_offset < end_offset):
+                        end_offset = page_offset
+                    ready[page_offset] = items
+
+            # Hand out every page that is now contiguous with what was yielded
+            while yield_offset in ready:
+                items = ready.pop(yield_offset)
+                page_offset = yield_offset
+                yield_offset += limit
+                if items:
+                    yield page_offset, items
+            if failure is not None and yield_offset == failure[0]:
+                raise failure[1]
+            if end_offset is not None and yield_offset > end_offset:
+                return
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_ndjson(pages):
+    """Encode result rows as newline-delimited JSON, one chunk per page."""
+    for _, items in pages:
+        yield b"".join([jsonio.dumps_bytes(format_result(item)) + b"\n" for item in items])
+
+
+def _csv_column(values: list) -> list:
+    # Nested values (e.g. mx_records) go into a cell as JSON
+    if any(isinstance(value, (list, dict)) for value in values):
+        return [jsonio.dumps(value) if isinstance(value, (list, dict)) else value for value in values]
+    return values
+
+
+def iter_csv(pages, header: bool = True):
+    """Encode result rows as CSV, one chunk per page, after a header line unless ``header`` is false."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(RESULT_COLUMNS)
+    for _, items in pages:
+        columns = ResultColumns(items).columns
+        writer.writerows(zip(*[_csv_column(values) for values in columns.values()]))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, requests.exceptions.Timeout):
+        return "Request timeout"
+    if isinstance(e, requests.exceptions.RequestException):
+        return f"API request failed: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+
+def iter_with_error_record(encode, pages, offset: int, limit: int, output_format: str = "ndjson"):
+    """``encode(pages)``, ending with an error record instead of raising when a page fails.
+
+    Once a streamed response has started, its status can no longer change,
+    so a failure has to be written into the body: a last
+    ``{"error": ..., "next_offset": ...}`` line for NDJSON, or a
+    ``# error: ...`` comment line for CSV. ``next_offset`` is the first page
+    that was not written, where a following request can resume.
+    """
+    next_offset = offset
+
+    def tracked():
+        nonlocal next_offset
+        for page in pages:
+            yield page
+            # The encoder only asks for the next page once this one is written
+            next_offset = page[0] + limit
+
+    try:
+        yield from encode(tracked())
+    except Exception as e:
+        error = describe_error(e)
+        print(f"Dump stream stopped at offset {next_offset}: {error}")
+        if output_format == "csv":
+            yield f"# error: {error}; next_offset={next_offset}\n".encode("utf-8")
+        else:
+            yield jsonio.dumps_bytes({"error": error, "next_offset": next_offset}) + b"\n"
@@ -0,0 +1,166 @@
+"""Writing the full result set of a bulk task to a compressed file.
+
+Pages are written as they arrive, so memory stays at a few pages whatever
+the task size. The file is written under a temporary name and renamed once
+complete, so a reader never sees a partial export. Formats:
+
+    ndjson    gzip-compressed NDJSON (.ndjson.gz), one result per line
+    csv       gzip-compressed CSV with a header line (.csv.gz)
+    parquet   columnar Parquet (.parquet), one row group per page; needs
+              the optional ``pyarrow`` package
+
+All three can be read incrementally: gzip line by line, Parquet row group by
+row group. Export names carry a random part so they cannot be guessed, and
+exports older than the retention window are removed when a new one is made.
+
+Settings (environment variables):
+    BOUNCEBAN_EXPORT_DIR   directory for export files (default: <tmp>/bounceban_exports)
+    BOUNCEBAN_EXPORT_TTL   seconds an export is kept (default 86400)
+"""
+import gzip
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+from src.bounceban.dump import RESULT_FIELDS, ResultColumns, iter_csv, iter_ndjson
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_DIR = os.environ.get("BOUNCEBAN_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "bounceban_exports"))
+EXPORT_TTL = int(os.environ.get("BOUNCEBAN_EXPORT_TTL", "86400"))
+
+# Format -> file extension
+EXPORT_FORMATS = {
+    "ndjson": ".ndjson.gz",
+    "csv": ".csv.gz",
+    "parquet": ".parquet",
+}
+
+EXPORT_ID_PATTERN = re.compile(r"\A[A-Za-z0-9_-]+-[0-9a-f]{32}\.(?:ndjson\.gz|csv\.gz|parquet)\Z")
+
+PARQUET_AVAILABLE = pyarrow is not None
+
+if PARQUET_AVAILABLE:
+    _LIST_OF_STRINGS = pyarrow.list_(pyarrow.string())
+    PARQUET_SCHEMA = pyarrow.schema([
+        (name, {
+            "score": pyarrow.float64(),
+            "is_catchall": pyarrow.bool_(),
+            "is_disposable": pyarrow.bool_(),
+            "is_role": pyarrow.bool_(),
+            "is_free": pyarrow.bool_(),
+            "is_seg_protected": pyarrow.bool_(),
+            "mx_records": _LIST_OF_STRINGS,
+        }.get(name, pyarrow.string()))
+        for name, _ in RESULT_FIELDS
+    ])
+
+
+def export_path(export_id: str):
+    """Path of the export called ``export_id``, or ``None`` if the name is not a valid export id."""
+    if not EXPORT_ID_PATTERN.match(export_id or ""):
+        return None
+    return os.path.join(EXPORT_DIR, export_id)
+
+
+def new_export_id(task_id: str, export_format: str) -> str:
+    """Unguessable name for a new export of ``task_id``."""
+    safe_task_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(task_id))[:64] or "task"
+    return f"{safe_task_id}-{uuid.uuid4().hex}{EXPORT_FORMATS[export_format]}"
+
+
+def prune_exports(now: float = None):
+    """Remove exports (and abandoned partial files) older than ``EXPORT_TTL``."""
+    now = time.time() if now is None else now
+    try:
+        names = os.listdir(EXPORT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class _PageCounter:
+    """Pass pages through while counting pages, rows and results."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.page_count = 0
+        self.rows = 0
+        self.results = Counter()
+
+    def __iter__(self):
+        for page in self.pages:
+            items = page[1]
+            self.page_count += 1
+            self.rows += len(items)
+            self.results.update(item.get("result") or "unknown" for item in items)
+            yield page
+
+
+def _write_gzip(path: str, chunks):
+    # Level 6 is gzip's default trade-off; the bodies are highly repetitive
+    with gzip.open(path, "wb", compresslevel=6) as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def _write_parquet(path: str, pages):
+    with pyarrow.parquet.ParquetWriter(path, PARQUET_SCHEMA, compression="zstd") as writer:
+        for _, items in pages:
+            table = pyarrow.Table.from_pydict(ResultColumns(items).to_dict(), schema=PARQUET_SCHEMA)
+            writer.write_table(table)
+
+
+def export_pages(pages, task_id: str, export_format: str) -> dict:
+    """Write every ``(offset, items)`` page to a new export file and describe it."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Export format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "parquet" and not PARQUET_AVAILABLE:
+        raise ValueError("Parquet export needs the pyarrow package")
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    prune_exports()
+    export_id = new_export_id(task_id, export_format)
+    path = os.path.join(EXPORT_DIR, export_id)
+    partial_path = path + ".part"
+
+    counter = _PageCounter(pages)
+    try:
+        if export_format == "parquet":
+            _write_parquet(partial_path, counter)
+        elif export_format == "csv":
+            _write_gzip(partial_path, iter_csv(counter))
+        else:
+            _write_gzip(partial_path, iter_ndjson(counter))
+        os.replace(partial_path, path)
+    except BaseException:
+        try:
+            os.remove(partial_path)
+        except OSError:
+            pass
+        raise
+
+    return {
+        "export_id": export_id,
+        "path": path,
+        "format": export_format,
+        "compression": "zstd" if export_format == "parquet" else "gzip",
+        "rows": counter.rows,
+        "pages": counter.page_count,
+        "bytes": os.path.getsize(path),
+        "result_counts": dict(counter.results),
+        "expires_at": int(time.time()) + EXPORT_TTL,
+    }
@@ -0,0 +1,330 @@
+"""Background jobs for bulk operations that outlive a request.
+
+A module hands long work (walking every dump page of a 500k-email task,
+waiting for a task to finish) to ``enqueue`` and answers with the job ID
+right away; the ``jobs/v1`` module reports the job's progress and result.
+
+Jobs are rows in a SQLite file, so they survive worker restarts and any
+worker can report on any job. Every worker process runs ``JOB_WORKERS``
+threads that claim queued jobs one at a time, so at most
+``workers * JOB_WORKERS`` jobs run at once. A per-process heartbeat marks
+the jobs it is running; a job whose heartbeat stops (its worker died) is put
+back in the queue by whichever worker notices, up to ``JOB_MAX_ATTEMPTS``
+runs.
+
+Handlers are registered with ``@handler(kind)`` and called as
+``fn(api_key, payload, report)``. ``report(progress)`` saves a progress dict
+and the return value becomes the job's result; an exception fails the job.
+A job needs its API key to run, so the key is stored with it in plain text:
+the file is created readable by its owner only, and a job is only shown to
+the key that created it. The payload may hold a whole email list, so it is
+only kept while the job can still run. Key and payload are cleared when the
+job finishes. A worker that dies mid-job cannot clear them, so those left on
+finished or abandoned jobs are also wiped when job threads start and on
+every heartbeat (``scrub_keys``). Put ``BOUNCEBAN_JOBS_PATH`` on a volume
+that only the connector can read.
+
+Settings (environment variables):
+    BOUNCEBAN_JOBS_PATH          SQLite file (default: <tmp>/bounceban_jobs.sqlite3)
+    BOUNCEBAN_JOB_WORKERS        threads per worker process running jobs (default 2, at most 8)
+    BOUNCEBAN_JOB_STALE_SECONDS  heartbeat age after which a running job is re-queued (default 120)
+    BOUNCEBAN_JOB_MAX_ATTEMPTS   runs before a job whose worker keeps dying fails (default 3)
+    BOUNCEBAN_JOB_TTL            seconds finished jobs are kept (default 7 days)
+"""
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+from src.bounceban import jsonio
+from src.bounceban.cache import api_key_hash
+
+JOBS_PATH = os.environ.get("BOUNCEBAN_JOBS_PATH", os.path.join(tempfile.gettempdir(), "bounceban_jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("BOUNCEBAN_JOB_WORKERS", "2"))
+MAX_JOB_WORKERS = 8
+JOB_STALE_SECONDS = float(os.environ.get("BOUNCEBAN_JOB_STALE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("BOUNCEBAN_JOB_MAX_ATTEMPTS", "3"))
+JOB_TTL = int(os.environ.get("BOUNCEBAN_JOB_TTL", str(7 * 24 * 3600)))
+
+# How often idle threads look for jobs queued by other processes
+POLL_INTERVAL = 1.0
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+_handlers = {}
+_local = threading.local()
+# Jobs this process is running; only these get heartbeats
+_running = set()
+_running_lock = threading.Lock()
+_wake = threading.Event()
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def handler(kind: str):
+    """Register ``fn(api_key, payload, report)`` as the handler for jobs of ``kind``."""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    if not os.path.exists(JOBS_PATH):
+        # Create the file owner-only before SQLite opens it: it holds API keys
+        os.close(os.open(JOBS_PATH, os.O_CREAT | os.O_WRONLY, 0o600))
+    conn = sqlite3.connect(JOBS_PATH, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " id TEXT PRIMARY KEY,"
+        " kind TEXT NOT NULL,"
+        " api_key TEXT NOT NULL,"
+        " api_key_hash TEXT NOT NULL,"
+        " payload TEXT NOT NULL,"
+        " status TEXT NOT NULL,"
+        " progress TEXT,"
+        " result TEXT,"
+        " error TEXT,"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " worker TEXT,"
+        " created_at REAL NOT NULL,"
+        " started_at REAL,"
+        " finished_at REAL,"
+        " heartbeat_at REAL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at)")
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def enqueue(kind: str, api_key: str, payload: dict) -> str:
+    """Queue a job of ``kind`` and return its ID."""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind {kind}")
+    job_id = uuid.uuid4().hex
+    _connection().execute(
+        "INSERT INTO jobs (id, kind, api_key, api_key_hash, payload, status, created_at)"
+        " VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+        (job_id, kind, api_key, api_key_hash(api_key), jsonio.dumps(payload), time.time()),
+    )
+    start_workers()
+    _wake.set()
+    return job_id
+
+
+def get_job(job_id: str, api_key: str):
+    """Public view of ``job_id``, or ``None`` if there is no such job for this API key."""
+    row = _connection().execute(
+        "SELECT id, kind, status, progress, result, error, attempts, created_at, started_at, finished_at"
+        " FROM jobs WHERE id = ? AND api_key_hash = ?",
+        (job_id, api_key_hash(api_key)),
+    ).fetchone()
+    if row is None:
+        return None
+    job_id, kind, status, progress, result, error, attempts, created_at, started_at, finished_at = row
+    return {
+        "job_id": job_id,
+        "kind": kind,
+        "status": status,
+        "progress": jsonio.loads(progress) if progress else None,
+        "result": jsonio.loads(result) if result else None,
+        "error": error,
+        "attempts": attempts,
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+    }
+
+
+def _recover_stale(conn: sqlite3.Connection, now: float):
+    # Jobs whose worker stopped sending heartbeats go back in the queue, or
+    # fail once they have used up their attempts
+    stale_before = now - JOB_STALE_SECONDS
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', worker = NULL"
+        " WHERE status = 'running' AND heartbeat_at < ? AND attempts < ?",
+        (stale_before, JOB_MAX_ATTEMPTS),
+    )
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', finished_at = ?, api_key = '', payload = '{}',"
+        " error = 'The worker running this job stopped ' || attempts || ' time(s)'"
+        " WHERE status = 'running' AND heartbeat_at < ?",
+        (now, stale_before),
+    )
+
+
+def claim():
+    """Take the oldest queued job this process can run; ``(id, kind, api_key, payload)`` or ``None``."""
+    if not _handlers:
+        return None
+    conn = _connection()
+    now = time.time()
+    kinds = list(_handlers)
+    with conn:
+        # IMMEDIATE takes the write lock up front, so two workers never
+        # claim the same row
+        conn.execute("BEGIN IMMEDIATE")
+        _recover_stale(conn, now)
+        row = conn.execute(
+            "SELECT id, kind, api_key, payload FROM jobs"
+            f" WHERE status = 'queued' AND kind IN ({', '.join('?' * len(kinds))})"
+            " ORDER BY created_at LIMIT 1",
+            kinds,
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+            " started_at = ?, heartbeat_at = ? WHERE id = ?",
+            (_worker_name(), now, now, row[0]),
+        )
+    return row[0], row[1], row[2], jsonio.loads(row[3])
+
+
+def _report(job_id: str, progress: dict):
+    _connection().execute(
+        "UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ? AND status = 'running'",
+        (jsonio.dumps(progress), time.time(), job_id),
+    )
+
+
+def _finish(job_id: str, result=None, error: str = None):
+    # Neither the API key nor the payload is needed once the job is over
+    _connection().execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, api_key = '', payload = '{}'"
+        " WHERE id = ? AND status = 'running' AND worker = ?",
+        ("failed" if error else "succeeded", None if error else jsonio.dumps(result), error,
+         time.time(), job_id, _worker_name()),
+    )
+
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, requests.exceptions.Timeout):
+        return "Request timeout"
+    if isinstance(e, requests.exceptions.RequestException):
+        return f"API request failed: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+
+def run_job(job_id: str, kind: str, api_key: str, payload: dict):
+    with _running_lock:
+        _running.add(job_id)
+    try:
+        try:
+            result = _handlers[kind](api_key, payload, lambda progress: _report(job_id, progress))
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e!r}")
+            _finish(job_id, error=describe_error(e))
+        else:
+            _finish(job_id, result=result)
+    except sqlite3.Error as e:
+        # The outcome could not be saved (locked or full database). Try to at
+        # least mark the job failed; if that fails too, its heartbeat stops
+        # below and stale recovery takes it over
+        print(f"Could not save the outcome of job {job_id}: {e!r}")
+        try:
+            _finish(job_id, error=f"Could not save the job outcome: {e}")
+        except sqlite3.Error:
+            pass
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+
+
+def prune_jobs(now: float = None):
+    """Drop finished jobs older than ``JOB_TTL``."""
+    now = time.time() if now is None else now
+    _connection().execute(
+        "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?", (now - JOB_TTL,)
+    )
+
+
+def scrub_keys(now: float = None):
+    """Wipe API keys and payloads no job will use again.
+
+    Finished jobs normally lose them in ``_finish``; this covers jobs whose
+    worker died first, and jobs still queued or running after ``JOB_TTL``,
+    which are failed.
+    """
+    now = time.time() if now is None else now
+    conn = _connection()
+    conn.execute(
+        "UPDATE jobs SET api_key = '', payload = '{}'"
+        " WHERE status IN ('succeeded', 'failed') AND (api_key != '' OR payload != '{}')"
+    )
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', api_key = '', payload = '{}', finished_at = ?,"
+        " error = 'The job was abandoned before it finished'"
+        " WHERE status IN ('queued', 'running') AND created_at < ?",
+        (now, now - JOB_TTL),
+    )
+
+
+def _work():
+    while True:
+        try:
+            job = claim()
+        except sqlite3.Error as e:
+            print(f"Could not claim a job: {e!r}")
+            job = None
+        if job is None:
+            _wake.wait(POLL_INTERVAL)
+            _wake.clear()
+            continue
+        try:
+            run_job(*job)
+        except Exception as e:
+            # Never let one job take the thread down with it
+            print(f"Job {job[0]} ({job[1]}) could not be run: {e!r}")
+
+
+def _heartbeat():
+    while True:
+        time.sleep(JOB_STALE_SECONDS / 4)
+        with _running_lock:
+            running = list(_running)
+        try:
+            if running:
+                _connection().execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND worker = ?"
+                    f" AND id IN ({', '.join('?' * len(running))})",
+                    [time.time(), _worker_name(), *running],
+                )
+            prune_jobs()
+            scrub_keys()
+        except sqlite3.Error as e:
+            print(f"Job heartbeat failed: {e!r}")
+
+
+def start_workers(count: int = None):
+    """Start ``count`` job threads in this process (default ``JOB_WORKERS``, at most
+    ``MAX_JOB_WORKERS``). Only the first call in a process starts any.
+    """
+    global _started_pid
+    count = min(JOB_WORKERS if count is None else count, MAX_JOB_WORKERS)
+    with _start_lock:
+        if _started_pid == os.getpid() or count < 1:
+            return
+        _started_pid = os.getpid()
+        try:
+            scrub_keys()
+        except sqlite3.Error as e:
+            print(f"Could not scrub job API keys: {e!r}")
+        for number in range(count):
+            threading.Thread(target=_work, name=f"bounceban-job-{number}", daemon=True).start()
+        threading.Thread(target=_heartbeat, name="bounceban-job-heartbeat", daemon=True).start()
@@ -0,0 +1,62 @@
+"""JSON encoding and decoding for BounceBan payloads.
+
+Uses ``orjson`` when it is installed and the standard library otherwise.
+Both engines produce the same text: compact separators and UTF-8 rather
+than ``\\u`` escapes. Decoding works on the raw response bytes, skipping
+the ``str`` copy that ``requests.Response.json()`` makes first.
+
+Settings (environment variables):
+    BOUNCEBAN_JSON_ENGINE   "auto" (default), "orjson" or "json"
+"""
+import json
+import os
+
+import requests
+
+JSON_ENGINE = os.environ.get("BOUNCEBAN_JSON_ENGINE", "auto").lower()
+
+orjson = None
+if JSON_ENGINE in ("auto", "orjson"):
+    try:
+        import orjson
+    except ImportError:
+        if JSON_ENGINE == "orjson":
+            raise
+
+if orjson is not None:
+    ENGINE = "orjson"
+
+    def loads(data):
+        """Decode ``data`` (bytes or str)."""
+        return orjson.loads(data)
+
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+else:
+    ENGINE = "json"
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def loads(data):
+        """Decode ``data`` (bytes or str)."""
+        return json.loads(data)
+
+    def dumps_bytes(obj) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+    def dumps(obj) -> str:
+        return _encoder.encode(obj)
+
+
+def response_json(response):
+    """Body of a ``requests.Response``, decoded straight from its bytes.
+
+    Raises ``requests.exceptions.JSONDecodeError`` for a malformed body, like
+    ``Response.json()``.
+    """
+    try:
+        return loads(response.content)
+    except ValueError as e:
+        raise requests.exceptions.JSONDecodeError(str(e), "", 0) from e
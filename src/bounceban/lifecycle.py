@@ -0,0 +1,331 @@
+"""Running a bulk verification from submission to cleanup in one module.
+
+``advance`` moves a run through its stages, as far as its time budget allows:
+
+    submit    stream the email list into a new BounceBan task
+    wait      poll the task status until BounceBan has finished it (answered
+              from the task index when callbacks are on, see ``task_index.py``)
+    export    walk every dump page into an export file (see ``export.py``)
+    cleanup   destroy the task, when the run asked for it
+    done
+
+Pages go from the dump pager (which fetches ahead) straight into the export
+file, so memory stays at a few pages whatever the task size. Each page is
+appended as its own gzip member; gzip readers see the members as one stream.
+
+Progress is saved to a checkpoint file after every stage and every exported
+page. A run that runs out of time or is interrupted is resumed by passing
+its ``run_id`` again: it picks up at the last completed page, after cutting
+the export file back to the size recorded with that page. Checkpoints are
+tied to the API key that started the run, and a run is worked on by one
+step at a time.
+
+Settings (environment variables):
+    BOUNCEBAN_CHECKPOINT_DIR   directory for checkpoints (default: <tmp>/bounceban_checkpoints)
+    BOUNCEBAN_CHECKPOINT_TTL   seconds a checkpoint is kept (default 7 days)
+"""
+import fcntl
+import gzip
+import os
+import re
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+import requests
+
+from src.bounceban import client, jsonio, task_index
+from src.bounceban.bulk import (
+    destroy_bulk_task, is_task_terminal, iter_unique_emails, submit_bulk_task, task_metadata_status
+)
+from src.bounceban.cache import api_key_hash
+from src.bounceban.dump import MAX_PAGE_SIZE, iter_csv, iter_dump_pages_parallel, iter_ndjson
+from src.bounceban.export import EXPORT_DIR, export_path, new_export_id, prune_exports
+from src.bounceban.polling import INITIAL_DELAY, poll_until
+from src.bounceban.resilience import CircuitOpenError
+from src.bounceban.results import result_store
+
+CHECKPOINT_DIR = os.environ.get(
+    "BOUNCEBAN_CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "bounceban_checkpoints")
+)
+CHECKPOINT_TTL = int(os.environ.get("BOUNCEBAN_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+
+# Export formats that can be appended to page by page
+LIFECYCLE_FORMATS = ("ndjson", "csv")
+
+# Dump pages fetched at once while exporting, never more than the pool holds
+EXPORT_CONCURRENCY = min(int(os.environ.get("BOUNCEBAN_DUMP_CONCURRENCY", "4")), client.POOL_SIZE)
+
+RUN_ID_PATTERN = re.compile(r"\A[0-9a-f]{32}\Z")
+
+
+class RunBusyError(Exception):
+    """Raised when another step is already working on the run."""
+
+
+def _checkpoint_path(run_id: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{run_id}.json")
+
+
+def prune_checkpoints(now: float = None):
+    """Remove checkpoints (and their lock files) older than ``CHECKPOINT_TTL``."""
+    now = time.time() if now is None else now
+    try:
+        names = os.listdir(CHECKPOINT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(CHECKPOINT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > CHECKPOINT_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def new_run(api_key: str, task_id: str = None, task_name: str = None, export_format: str = "ndjson",
+            filter_status: str = "all", destroy: bool = False) -> dict:
+    """Checkpoint state for a new run; starts at ``wait`` when ``task_id`` is an existing task."""
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    prune_checkpoints()
+    return {
+        "run_id": uuid.uuid4().hex,
+        "api_key_hash": api_key_hash(api_key),
+        "stage": "wait" if task_id else "submit",
+        "task_id": task_id,
+        "task_name": task_name,
+        "export_format": export_format,
+        "filter_status": filter_status,
+        "destroy": destroy,
+        "created_at": int(time.time()),
+        "polls": 0,
+        "poll_delay": INITIAL_DELAY,
+        "export_id": None,
+        "next_offset": 0,
+        "rows": 0,
+        "pages": 0,
+        "export_bytes": 0,
+        "result_counts": {},
+    }
+
+
+def load_run(run_id: str, api_key: str):
+    """Saved state of ``run_id``, or ``None`` if there is none for this API key."""
+    if not RUN_ID_PATTERN.match(run_id or ""):
+        return None
+    try:
+        with open(_checkpoint_path(run_id), "rb") as f:
+            state = jsonio.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if state.get("api_key_hash") != api_key_hash(api_key):
+        return None
+    return state
+
+
+def save_run(state: dict):
+    """Write the checkpoint under a temporary name and rename it into place."""
+    path = _checkpoint_path(state["run_id"])
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(jsonio.dumps_bytes(state))
+    os.replace(temporary, path)
+
+
+@contextmanager
+def run_lock(run_id: str):
+    """Hold the run for this step; raises ``RunBusyError`` if another step has it.
+
+    The lock is released by the kernel if the worker dies, so a crashed step
+    never blocks its run.
+    """
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    with open(os.path.join(CHECKPOINT_DIR, f"{run_id}.lock"), "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RunBusyError("Another step is already working on this run") from None
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _submit(api_key: str, state: dict, emails_raw: str, emails=None):
+    if state.get("submit_started_at"):
+        # An earlier step was cut off mid-submission; the task may exist and
+        # submitting again could bill the list twice
+        state["stage"] = "failed"
+        state["error"] = ("An earlier submission of this run was interrupted; check BounceBan for the task "
+                          "and start a new run with its task ID")
+        return
+    state["submit_started_at"] = int(time.time())
+    save_run(state)
+    url, nonce = task_index.new_callback(api_key)
+    try:
+        if emails is None:
+            emails = iter_unique_emails(emails_raw)
+        result = submit_bulk_task(api_key, state["task_name"], emails, url=url)
+    except (requests.exceptions.HTTPError, requests.exceptions.ConnectTimeout, CircuitOpenError):
+        # BounceBan refused or never saw the call, so no task was created
+        del state["submit_started_at"]
+        save_run(state)
+        raise
+    task_index.record_submission(api_key, result, nonce)
+    state["task_id"] = result.get("id")
+    state["count_submitted"] = result.get("count_submitted")
+    state["stage"] = "wait"
+
+
+def _wait(api_key: str, state: dict, deadline: float):
+    if time.monotonic() >= deadline:
+        return
+    result, polls, finished, next_delay = poll_until(
+        lambda: task_index.fetch_status(api_key, state["task_id"])[0],
+        is_task_terminal,
+        max_wait=deadline - time.monotonic(),
+        delay=state["poll_delay"],
+        name="verify_bulk/v6"
+    )
+    state["polls"] += polls
+    state["poll_delay"] = next_delay
+    state["task_status"] = (result.get("status") or "").lower()
+    if not finished:
+        return
+    if task_metadata_status(state["task_status"]) == "failed":
+        state["stage"] = "failed"
+        state["error"] = f"Bulk task ended with status {state['task_status']}"
+    else:
+        state["stage"] = "export"
+
+
+def _reset_export(state: dict):
+    state.update(next_offset=0, rows=0, pages=0, export_bytes=0, result_counts={})
+
+
+def _export(api_key: str, state: dict, deadline: float):
+    if time.monotonic() >= deadline:
+        return
+    if state["export_id"] is None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        prune_exports()
+        state["export_id"] = new_export_id(state["task_id"], state["export_format"])
+    partial_path = export_path(state["export_id"]) + ".part"
+
+    # Drop whatever was written after the last checkpointed page
+    if os.path.exists(partial_path):
+        with open(partial_path, "r+b") as f:
+            f.truncate(state["export_bytes"])
+    elif state["export_bytes"]:
+        _reset_export(state)
+
+    dump_pages = iter_dump_pages_parallel(
+        api_key, state["task_id"], state["next_offset"], MAX_PAGE_SIZE, state["filter_status"],
+        max_concurrency=EXPORT_CONCURRENCY
+    )
+    pages = result_store.record_pages(api_key, state["task_id"], dump_pages)
+    try:
+        for page in pages:
+            if state["export_format"] == "csv":
+                chunk = b"".join(iter_csv([page], header=state["pages"] == 0))
+            else:
+                chunk = b"".join(iter_ndjson([page]))
+            with open(partial_path, "ab") as f:
+                f.write(gzip.compress(chunk, compresslevel=6))
+                f.flush()
+                os.fsync(f.fileno())
+            page_offset, items = page
+            state["next_offset"] = page_offset + MAX_PAGE_SIZE
+            state["rows"] += len(items)
+            state["pages"] += 1
+            for item in items:
+                category = item.get("result") or "unknown"
+                state["result_counts"][category] = state["result_counts"].get(category, 0) + 1
+            state["export_bytes"] = os.path.getsize(partial_path)
+            save_run(state)
+            if time.monotonic() >= deadline:
+                return
+    finally:
+        pages.close()
+        dump_pages.close()
+
+    # Every page is in; a task without results still gets a readable file
+    if not os.path.exists(partial_path):
+        header = b"".join(iter_csv([])) if state["export_format"] == "csv" else b""
+        with open(partial_path, "wb") as f:
+            f.write(gzip.compress(header))
+    os.replace(partial_path, export_path(state["export_id"]))
+    state["export_bytes"] = os.path.getsize(export_path(state["export_id"]))
+    state["stage"] = "cleanup" if state["destroy"] else "done"
+
+
+def _cleanup(api_key: str, state: dict):
+    try:
+        destroy_bulk_task(api_key, state["task_id"])
+    except requests.exceptions.HTTPError as e:
+        # Already gone is as good as destroyed
+        if e.response is None or e.response.status_code != 404:
+            raise
+    state["destroyed"] = True
+    state["stage"] = "done"
+
+
+def advance(api_key: str, state: dict, deadline: float, emails_raw: str = None, emails: list = None) -> dict:
+    """Run ``state`` through as many stages as fit before ``deadline`` (``time.monotonic()``).
+
+    The submit stage sends ``emails`` when the caller already pre-filtered
+    them, and parses ``emails_raw`` otherwise.
+
+    The checkpoint is saved after every stage. Errors propagate with the
+    state saved at the last completed step, so the run can be resumed.
+    """
+    save_run(state)
+    while state["stage"] not in ("done", "failed") and time.monotonic() < deadline:
+        stage = state["stage"]
+        if stage == "submit":
+            _submit(api_key, state, emails_raw, emails)
+        elif stage == "wait":
+            _wait(api_key, state, deadline)
+        elif stage == "export":
+            _export(api_key, state, deadline)
+        elif stage == "cleanup":
+            _cleanup(api_key, state)
+        save_run(state)
+        if state["stage"] == stage and stage == "wait":
+            break
+    return state
+
+
+def describe_run(state: dict) -> dict:
+    """Public view of a run (no API key hash, and the export only once it is complete)."""
+    data = {
+        "run_id": state["run_id"],
+        "stage": state["stage"],
+        "task_id": state["task_id"],
+        "task_status": state.get("task_status"),
+        "polls": state["polls"],
+        "export_format": state["export_format"],
+        "rows_exported": state["rows"],
+        "pages_exported": state["pages"],
+        "result_counts": state["result_counts"],
+        "destroy": state["destroy"],
+        "destroyed": state.get("destroyed", False),
+    }
+    for field in ("count_submitted", "count_duplicates_removed", "count_invalid"):
+        if state.get(field) is not None:
+            data[field] = state[field]
+    if state.get("error"):
+        data["error"] = state["error"]
+    if state["stage"] in ("cleanup", "done") and state["export_id"]:
+        data["export"] = {
+            "export_id": state["export_id"],
+            "path": export_path(state["export_id"]),
+            "format": state["export_format"],
+            "compression": "gzip",
+            "rows": state["rows"],
+            "pages": state["pages"],
+            "bytes": state["export_bytes"],
+            "download_path": f"/verify_bulk/v4/export?export_id={state['export_id']}",
+        }
+    return data
@@ -0,0 +1,199 @@
+"""Prometheus metrics for module routes and BounceBan calls.
+
+``instrument_app`` hooks every ``/execute`` request of the Flask app and
+serves ``/metrics``. The outcome of a call is the ``metadata.status`` of
+its response, decoded from the serialized ``"metadata"`` object alone; the
+``data`` part of the body is never parsed. The BounceBan client records each upstream call with
+``observe_upstream``, and code that retries a call reports it with
+``record_retry``.
+
+Under gunicorn every worker writes its samples to files in
+``PROMETHEUS_MULTIPROC_DIR`` (set up in ``config/gunicorn_config.py``), and
+``/metrics`` merges the files of all workers, so whichever worker answers
+the scrape reports totals for the whole connector. Without that variable
+(e.g. the Flask dev server) the process's own registry is served.
+
+Metrics:
+    bounceban_execute_requests_total{module,outcome}   outcome is metadata.status
+    bounceban_execute_latency_seconds{module}
+    bounceban_execute_request_bytes{module}
+    bounceban_execute_response_bytes{module}
+    bounceban_upstream_requests_total{endpoint,status}
+    bounceban_upstream_latency_seconds{endpoint}
+    bounceban_upstream_response_bytes{endpoint}
+    bounceban_upstream_retries_total{endpoint,reason}
+    bounceban_poll_waits_total{module,outcome}         outcome is finished or timed_out
+    bounceban_polls_per_wait{module}
+    bounceban_poll_time_to_final_seconds{module}       finished waits only
+    bounceban_cache_lookups_total{cache,outcome}       outcome is hit_memory, hit_shared or miss
+"""
+import json
+import os
+import time
+
+from flask import Response as FlaskResponse, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+POLL_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1 << 20, 4 << 20, 16 << 20, 64 << 20)
+
+# A module body is {"data": ..., "metadata": {...}}; only the metadata object,
+# at most this many bytes of it, is decoded to read the status
+METADATA_KEY = b'"metadata"'
+MAX_METADATA_BYTES = 64 << 10
+_decoder = json.JSONDecoder()
+
+execute_requests = Counter(
+    "bounceban_execute_requests_total", "Module /execute calls by metadata.status", ["module", "outcome"]
+)
+execute_latency = Histogram(
+    "bounceban_execute_latency_seconds", "Time to answer a module /execute call", ["module"],
+    buckets=LATENCY_BUCKETS,
+)
+execute_request_bytes = Histogram(
+    "bounceban_execute_request_bytes", "Size of module /execute request bodies", ["module"],
+    buckets=SIZE_BUCKETS,
+)
+execute_response_bytes = Histogram(
+    "bounceban_execute_response_bytes", "Size of module /execute responses (not streamed)", ["module"],
+    buckets=SIZE_BUCKETS,
+)
+upstream_requests = Counter(
+    "bounceban_upstream_requests_total", "BounceBan API calls by HTTP status", ["endpoint", "status"]
+)
+upstream_latency = Histogram(
+    "bounceban_upstream_latency_seconds", "BounceBan API call duration", ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+upstream_response_bytes = Histogram(
+    "bounceban_upstream_response_bytes", "Size of BounceBan API responses", ["endpoint"],
+    buckets=SIZE_BUCKETS,
+)
+upstream_retries = Counter(
+    "bounceban_upstream_retries_total", "BounceBan API calls retried", ["endpoint", "reason"]
+)
+
+poll_waits = Counter(
+    "bounceban_poll_waits_total", "Server-side waits for a final result, by outcome", ["module", "outcome"]
+)
+polls_per_wait = Histogram(
+    "bounceban_polls_per_wait", "Status calls made by one server-side wait", ["module"],
+    buckets=POLL_BUCKETS,
+)
+poll_time_to_final = Histogram(
+    "bounceban_poll_time_to_final_seconds", "Time a server-side wait took to see a final result", ["module"],
+    buckets=LATENCY_BUCKETS,
+)
+cache_lookups = Counter(
+    "bounceban_cache_lookups_total", "Cache lookups by outcome", ["cache", "outcome"]
+)
+
+
+def error_label(error: Exception) -> str:
+    """HTTP status for an HTTP error, otherwise the exception class name."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        return str(response.status_code)
+    return type(error).__name__
+
+
+def observe_upstream(endpoint: str, started: float, response=None, error: Exception = None):
+    """Record one BounceBan call that began at ``time.perf_counter()`` value ``started``."""
+    upstream_latency.labels(endpoint).observe(time.perf_counter() - started)
+    if response is not None:
+        upstream_requests.labels(endpoint, str(response.status_code)).inc()
+        upstream_response_bytes.labels(endpoint).observe(len(response.content))
+    else:
+        upstream_requests.labels(endpoint, error_label(error) if error else "error").inc()
+
+
+def record_retry(endpoint: str, reason: str):
+    upstream_retries.labels(endpoint, reason).inc()
+
+
+def record_wait(module: str, polls: int, finished: bool, seconds: float):
+    """Record one server-side wait (see ``polling.poll_until``)."""
+    poll_waits.labels(module, "finished" if finished else "timed_out").inc()
+    polls_per_wait.labels(module).observe(polls)
+    if finished:
+        poll_time_to_final.labels(module).observe(seconds)
+
+
+def record_cache_lookup(cache: str, outcome: str):
+    cache_lookups.labels(cache, outcome).inc()
+
+
+def _module_name(path: str):
+    # "/verify_bulk/v4/execute" -> "verify_bulk/v4"
+    if not path.endswith("/execute"):
+        return None
+    return path[:-len("/execute")].strip("/") or None
+
+
+def _metadata_status(body: bytes):
+    """``metadata.status`` from a serialized module body, or ``None``."""
+    # The top-level object is either the last value before the closing brace
+    # or the first key after the opening one; nested "metadata" keys in the
+    # data are neither
+    last = body.rfind(METADATA_KEY)
+    first = body.find(METADATA_KEY)
+    for position, is_first in ((last, False), (first, True)):
+        if position < 0 or (is_first and body[:position].strip() != b"{"):
+            continue
+        start = body.find(b":", position + len(METADATA_KEY)) + 1
+        piece = body[start:start + MAX_METADATA_BYTES].decode("utf-8", "ignore").lstrip()
+        try:
+            metadata, end = _decoder.raw_decode(piece)
+        except ValueError:
+            continue
+        if not is_first and piece[end:].strip() != "}":
+            continue
+        if isinstance(metadata, dict) and "status" in metadata:
+            return str(metadata["status"] or "none")
+    return None
+
+
+def _outcome(response) -> str:
+    if response.is_streamed:
+        return "streamed" if response.status_code < 400 else "error"
+    status = _metadata_status(response.get_data()) if response.is_json else None
+    if status is not None:
+        return status
+    return "error" if response.status_code >= 400 else "none"
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    module = _module_name(request.path)
+    started = g.pop("metrics_started", None)
+    if module is None or started is None:
+        return response
+    # Streamed responses are timed up to the first byte
+    execute_latency.labels(module).observe(time.perf_counter() - started)
+    execute_requests.labels(module, _outcome(response)).inc()
+    execute_request_bytes.labels(module).observe(request.content_length or 0)
+    if not response.is_streamed:
+        execute_response_bytes.labels(module).observe(response.content_length or 0)
+    return response
+
+
+def metrics_view():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return FlaskResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def instrument_app(app):
+    """Time every ``/execute`` request of ``app`` and serve ``/metrics``."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
@@ -0,0 +1,82 @@
+"""Server-side polling with exponential backoff, for modules that can wait.
+
+Waits are capped well below gunicorn's ``timeout`` (360s). When the cap is
+reached the module hands back a continuation token, and the next workflow
+step passes it in to resume with the same backoff state.
+
+Settings (environment variables):
+    BOUNCEBAN_MAX_WAIT_SECONDS   upper bound for any wait (default 300)
+"""
+import base64
+import json
+import math
+import os
+import random
+import time
+
+from src.bounceban import metrics
+
+MAX_WAIT_SECONDS = int(os.environ.get("BOUNCEBAN_MAX_WAIT_SECONDS", "300"))
+
+INITIAL_DELAY = 1.0
+MAX_DELAY = 15.0
+MULTIPLIER = 2.0
+
+
+def poll_until(fetch, is_final, max_wait: float, delay: float = INITIAL_DELAY,
+               max_delay: float = MAX_DELAY, sleep_first: bool = False, name: str = None):
+    """Call ``fetch()`` until ``is_final(result)`` is true or ``max_wait`` seconds pass.
+
+    Sleeps between calls grow exponentially from ``delay`` up to
+    ``max_delay``, with jitter so parallel waiters spread out. The last
+    sleep is cut short so a final poll happens right at the deadline. With
+    ``sleep_first`` the loop starts with a sleep, for callers that have just
+    received a non-final answer. With ``name`` the wait is recorded in the
+    poll metrics under that module name.
+
+    Returns ``(result, polls, finished, next_delay)``.
+    """
+    started = time.monotonic()
+    deadline = started + min(max_wait, MAX_WAIT_SECONDS)
+    polls = 0
+    if sleep_first:
+        time.sleep(min(random.uniform(delay / 2, delay), max(0, deadline - time.monotonic())))
+        delay = min(max_delay, delay * MULTIPLIER)
+    while True:
+        result = fetch()
+        polls += 1
+        finished = is_final(result)
+        remaining = deadline - time.monotonic()
+        if finished or remaining <= 0:
+            if name:
+                metrics.record_wait(name, polls, finished, time.monotonic() - started)
+            return result, polls, finished, delay
+        time.sleep(min(random.uniform(delay / 2, delay), remaining))
+        delay = min(max_delay, delay * MULTIPLIER)
+
+
+def encode_continuation(state: dict) -> str:
+    """Opaque token a workflow passes back to resume a wait."""
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def decode_continuation(token: str) -> dict:
+    """Inverse of ``encode_continuation``; raises ``ValueError`` for a malformed token.
+
+    Tokens come back from the workflow, so ``delay`` is clamped to
+    ``INITIAL_DELAY``..``MAX_DELAY`` and ``polls`` must be a count.
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception as e:
+        raise ValueError("Invalid continuation token") from e
+    if not isinstance(state, dict):
+        raise ValueError("Invalid continuation token")
+    delay = state.get("delay", INITIAL_DELAY)
+    polls = state.get("polls", 0)
+    if (isinstance(delay, bool) or not isinstance(delay, (int, float)) or not math.isfinite(delay)
+            or isinstance(polls, bool) or not isinstance(polls, int) or polls < 0):
+        raise ValueError("Invalid continuation token")
+    state["delay"] = min(max(float(delay), INITIAL_DELAY), MAX_DELAY)
+    state["polls"] = polls
+    return state
@@ -0,0 +1,270 @@
+"""Retries, per-key rate limiting and a circuit breaker for BounceBan calls.
+
+``call`` wraps every request made by ``client.request``:
+
+* A token bucket per API key (per worker) spaces calls out, and a 429 pauses
+  that key's bucket for the ``Retry-After`` period so other requests on the
+  same key stop piling onto a throttled account.
+* Failed calls are retried with jittered exponential backoff, honouring
+  ``Retry-After``. A 429 or a connect timeout means BounceBan never acted
+  on the call, so those are retried for every endpoint; 5xx answers, read
+  timeouts and dropped connections are only retried on endpoints that are
+  safe to repeat (lookups, status, dump, delete), never on submissions that
+  spend credits or create tasks. Streamed bodies cannot be replayed and are
+  never retried.
+* A circuit breaker per API key (per worker) opens after consecutive
+  5xx/network failures and then rejects that key's calls at once with
+  ``CircuitOpenError`` until a trial call gets through, so worker slots are
+  not held for full timeouts while BounceBan is down. One key's failures
+  never pause the other keys.
+
+Settings (environment variables):
+    BOUNCEBAN_RETRIES             retries per call (default 3)
+    BOUNCEBAN_RETRY_BACKOFF       first backoff in seconds (default 0.5)
+    BOUNCEBAN_RETRY_BACKOFF_MAX   longest backoff in seconds (default 10)
+    BOUNCEBAN_RETRY_AFTER_MAX     longest Retry-After honoured; longer waits
+                                  fail instead (default 30)
+    BOUNCEBAN_RATE_LIMIT          calls per second per API key and worker,
+                                  0 to disable (default 10)
+    BOUNCEBAN_RATE_BURST          calls allowed back to back (default 20)
+    BOUNCEBAN_BREAKER_FAILURES    consecutive failures that open the circuit (default 5)
+    BOUNCEBAN_BREAKER_RESET       seconds before a trial call is let through (default 30)
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+
+import requests
+
+from src.bounceban import metrics
+from src.bounceban.cache import api_key_hash
+
+RETRIES = int(os.environ.get("BOUNCEBAN_RETRIES", "3"))
+BACKOFF_BASE = float(os.environ.get("BOUNCEBAN_RETRY_BACKOFF", "0.5"))
+BACKOFF_MAX = float(os.environ.get("BOUNCEBAN_RETRY_BACKOFF_MAX", "10"))
+RETRY_AFTER_MAX = float(os.environ.get("BOUNCEBAN_RETRY_AFTER_MAX", "30"))
+RATE_LIMIT = float(os.environ.get("BOUNCEBAN_RATE_LIMIT", "10"))
+RATE_BURST = int(os.environ.get("BOUNCEBAN_RATE_BURST", "20"))
+BREAKER_FAILURES = int(os.environ.get("BOUNCEBAN_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.environ.get("BOUNCEBAN_BREAKER_RESET", "30"))
+
+# Endpoints that can be repeated without side effects. /v1/verify/single and
+# /v1/verify/bulk start (and bill) a new verification on every call.
+IDEMPOTENT_PATHS = frozenset({
+    "/v1/check",
+    "/v1/verify/single/status",
+    "/v1/verify/bulk/status",
+    "/v1/verify/bulk/emails",
+    "/v1/verify/bulk/dump",
+    "/v1/verify/bulk/destroy",
+})
+
+RETRYABLE_STATUSES = frozenset({500, 502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling BounceBan while the circuit is open."""
+
+
+def retry_after_seconds(response):
+    """``Retry-After`` of ``response`` in seconds (delta or HTTP date), or ``None``."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff(attempt: int, base: float = BACKOFF_BASE, maximum: float = BACKOFF_MAX) -> float:
+    delay = min(maximum, base * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+
+def retry_delay(outcome, attempt: int, idempotent: bool = True):
+    """Seconds to wait before retrying, or ``None`` if ``outcome`` should not be retried.
+
+    ``outcome`` is a ``requests.Response`` or an exception raised by
+    ``requests`` (an ``HTTPError`` carries its response).
+    """
+    response = outcome if isinstance(outcome, requests.Response) else getattr(outcome, "response", None)
+    if response is not None:
+        status = response.status_code
+        if status != 429 and not (idempotent and status in RETRYABLE_STATUSES):
+            return None
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return retry_after if retry_after <= RETRY_AFTER_MAX else None
+        return backoff(attempt)
+    if isinstance(outcome, CircuitOpenError):
+        return None
+    if isinstance(outcome, requests.exceptions.ConnectTimeout) or (
+        idempotent and isinstance(outcome, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    ):
+        return backoff(attempt)
+    return None
+
+
+class TokenBucket:
+    """Token bucket that hands out waits instead of rejecting calls."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def rate_limiter(api_key: str):
+    """This worker's bucket for ``api_key``, or ``None`` when rate limiting is off."""
+    if RATE_LIMIT <= 0:
+        return None
+    key = api_key_hash(api_key or "")
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(RATE_LIMIT, RATE_BURST)
+        return bucket
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failures`` in a row -> half-open after ``reset`` seconds."""
+
+    def __init__(self, failures: int, reset: float):
+        self.failures = max(1, failures)
+        self.reset = reset
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless a call may go through now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset - time.monotonic()
+            if remaining > 0 or self.trial_running:
+                raise CircuitOpenError(
+                    f"BounceBan is unavailable; calls are paused for {max(remaining, 0):.0f}s after "
+                    f"{self.consecutive} consecutive failures"
+                )
+            # Half-open: this call is the trial
+            self.trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive += 1
+            if self.trial_running or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release(self):
+        """End a trial call that neither succeeded nor failed against BounceBan."""
+        with self._lock:
+            self.trial_running = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(api_key: str) -> CircuitBreaker:
+    """This worker's circuit breaker for ``api_key``."""
+    key = api_key_hash(api_key or "")
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+        return breaker
+
+
+def _is_outage(outcome) -> bool:
+    if isinstance(outcome, requests.Response):
+        return outcome.status_code >= 500
+    return isinstance(outcome, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def call(send, path: str, api_key: str, replayable: bool = True, retries: int = None) -> requests.Response:
+    """Run ``send()`` (one HTTP attempt) under the rate limit, retries and breaker.
+
+    Returns the last response, which may still be an error status for the
+    caller's ``raise_for_status``; raises the last exception otherwise.
+    """
+    retries = RETRIES if retries is None else retries
+    idempotent = path in IDEMPOTENT_PATHS
+    bucket = rate_limiter(api_key)
+    breaker = circuit_breaker(api_key)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            if bucket is not None:
+                bucket.acquire()
+            outcome = send()
+        except requests.exceptions.RequestException as e:
+            outcome = e
+        except BaseException:
+            breaker.release()
+            raise
+
+        if _is_outage(outcome):
+            breaker.record_failure()
+        elif isinstance(outcome, requests.Response):
+            breaker.record_success()
+        else:
+            breaker.release()
+
+        if isinstance(outcome, requests.Response) and outcome.status_code == 429 and bucket is not None:
+            bucket.pause(min(retry_after_seconds(outcome) or backoff(attempt), RETRY_AFTER_MAX))
+
+        failed = isinstance(outcome, Exception) or outcome.status_code == 429 or outcome.status_code >= 500
+        delay = retry_delay(outcome, attempt, idempotent) if failed and replayable and attempt < retries else None
+        if delay is None:
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        metrics.record_retry(path, metrics.error_label(outcome) if isinstance(outcome, Exception)
+                             else str(outcome.status_code))
+        if isinstance(outcome, requests.Response):
+            outcome.close()
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,185 @@
+"""Process-wide store of final verification results.
+
+Single and bulk modules look emails up here before calling BounceBan and
+record every final result they receive. Entries are kept for a freshness
+window and stored as plain tuples (one slot per field) rather than dicts,
+which keeps large stores compact; the least recently used entries are
+evicted first. With ``BOUNCEBAN_RESULTS_BACKEND=sqlite`` a SQLite file sits
+behind the in-memory store, so results survive worker restarts and are
+shared between workers.
+
+Entries are keyed by API key hash, scope and normalized email, so one account
+never sees results another account paid for. The scope is the bulk task the
+result came from, or "single" for ``/v1/verify/single`` results, which are
+only kept when they carry their verification id. A lookup only sees its own
+scope: a bulk task is never answered with another task's rows, and a single
+verification always comes back with the id it was verified under.
+
+Settings (environment variables):
+    BOUNCEBAN_RESULTS_TTL       freshness window in seconds (default 7 days)
+    BOUNCEBAN_RESULTS_SIZE      entries kept in memory per worker (default 100000)
+    BOUNCEBAN_RESULTS_BACKEND   "memory" (default) or "sqlite"
+    BOUNCEBAN_RESULTS_PATH      SQLite file for the sqlite backend
+"""
+import os
+import tempfile
+
+from src.bounceban.bulk import normalize_email
+from src.bounceban.cache import SQLiteCache, TieredCache, TTLCache, api_key_hash
+
+RESULTS_TTL = int(os.environ.get("BOUNCEBAN_RESULTS_TTL", str(7 * 24 * 3600)))
+RESULTS_SIZE = int(os.environ.get("BOUNCEBAN_RESULTS_SIZE", "100000"))
+RESULTS_BACKEND = os.environ.get("BOUNCEBAN_RESULTS_BACKEND", "memory").lower()
+RESULTS_PATH = os.environ.get(
+    "BOUNCEBAN_RESULTS_PATH", os.path.join(tempfile.gettempdir(), "bounceban_results.sqlite3")
+)
+
+# Upstream fields kept for every result, in tuple order
+RECORD_FIELDS = (
+    "id",
+    "email",
+    "result",
+    "result_code",
+    "score",
+    "is_catchall",
+    "is_disposable",
+    "is_role",
+    "is_free",
+    "is_seg_protected",
+    "message",
+    "mx_records",
+    "smtp_provider",
+    "verify_at",
+)
+
+# Upstream "status" values for a verification that is not finished yet
+PENDING_STATUSES = ("processing", "queued", "waiting", "verifying")
+
+
+def is_final_result(item: dict) -> bool:
+    return bool(item.get("result")) and item.get("status") not in PENDING_STATUSES
+
+
+class ResultStore:
+    """Freshness-bounded, LRU-evicted store of verification results."""
+
+    def __init__(self, cache: TieredCache):
+        self.cache = cache
+
+    @staticmethod
+    def _key(api_key: str, email: str, task_id: str = None):
+        email = normalize_email(email or "")
+        if not email:
+            return None
+        return f"{api_key_hash(api_key)}:{task_id or 'single'}:{email}"
+
+    def get(self, api_key: str, email: str, task_id: str = None):
+        """Cached result for ``email`` as an upstream-shaped dict, or ``None``.
+
+        Without ``task_id`` only single verification results are looked at.
+        """
+        key = self._key(api_key, email, task_id)
+        if key is None:
+            return None
+        record = self.cache.get(key)
+        if record is None:
+            return None
+        item = dict(zip(RECORD_FIELDS, record))
+        item["status"] = "completed"
+        if task_id:
+            # Dump rows carry no verification id of their own
+            if item["id"] is None:
+                del item["id"]
+            item["task_id"] = task_id
+        return item
+
+    def get_many(self, api_key: str, emails, task_id: str = None) -> dict:
+        """``{email: result}`` for every email in ``emails`` that has a fresh entry."""
+        found = {}
+        for email in emails:
+            item = self.get(api_key, email, task_id)
+            if item is not None:
+                found[email] = item
+        return found
+
+    def _entry(self, api_key: str, item: dict, email: str = None, task_id: str = None):
+        if not item or not is_final_result(item):
+            return None
+        # A single result nobody can trace back to its verification is not kept
+        if not task_id and not item.get("id"):
+            return None
+        key = self._key(api_key, email or item.get("email"), task_id)
+        if key is None:
+            return None
+        return key, tuple(item.get(field) for field in RECORD_FIELDS)
+
+    def put(self, api_key: str, item: dict, email: str = None, task_id: str = None):
+        """Record ``item`` if it is a final result. ``email`` overrides ``item["email"]``."""
+        entry = self._entry(api_key, item, email, task_id)
+        if entry is not None:
+            self.cache.set(*entry)
+
+    def put_many(self, api_key: str, items, task_id: str = None):
+        """Record every final result in ``items`` (one shared-backend transaction)."""
+        entries = (self._entry(api_key, item, task_id=task_id) for item in items)
+        self.cache.set_many(entry for entry in entries if entry is not None)
+
+    def record_pages(self, api_key: str, task_id: str, pages):
+        """Pass ``(offset, items)`` pages of ``task_id`` through, recording their results on the way."""
+        for page in pages:
+            self.put_many(api_key, page[1], task_id)
+            yield page
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+class ResultIndex:
+    """Results grouped by ``result`` category and by email domain, built in one pass.
+
+    The groups hold emails, not items, so a response can carry the items once
+    (or not at all) alongside any of the groupings. With ``categories`` only
+    items in those categories are kept; ``result_counts`` still covers all.
+    """
+
+    __slots__ = ("items", "by_result", "by_domain", "result_counts", "non_deliverable")
+
+    def __init__(self, items, categories=None):
+        self.items = []
+        self.by_result = {}
+        self.by_domain = {}
+        self.result_counts = {}
+        # Kept in item order, as the modules have always returned it
+        self.non_deliverable = []
+        for item in items:
+            category = item.get("result") or "unknown"
+            self.result_counts[category] = self.result_counts.get(category, 0) + 1
+            if categories and category not in categories:
+                continue
+            email = item.get("email") or ""
+            self.items.append(item)
+            group = self.by_result.get(category)
+            if group is None:
+                group = self.by_result[category] = []
+            group.append(email)
+            if category != "deliverable":
+                self.non_deliverable.append(email)
+            domain = email.rpartition("@")[2].lower()
+            group = self.by_domain.get(domain)
+            if group is None:
+                group = self.by_domain[domain] = []
+            group.append(email)
+
+    @property
+    def deliverable(self) -> list:
+        return self.by_result.get("deliverable", [])
+
+
+def _make_store() -> ResultStore:
+    shared = None
+    if RESULTS_BACKEND == "sqlite":
+        shared = SQLiteCache(RESULTS_PATH, "results", maxsize=RESULTS_SIZE * 10, ttl=RESULTS_TTL)
+    return ResultStore(TieredCache(TTLCache(RESULTS_SIZE, RESULTS_TTL), shared, name="results"))
+
+
+result_store = _make_store()
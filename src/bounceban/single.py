@@ -0,0 +1,132 @@
+"""Single email verification calls shared by the verify_single_email modules."""
+import time
+
+from src.bounceban import client, jsonio
+from src.bounceban.cache import api_key_hash
+from src.bounceban.inflight import InFlight
+from src.bounceban.polling import poll_until
+from src.bounceban.results import result_store
+
+# Concurrent verifications of the same email with the same API key share one
+# upstream submit/wait, whichever module they come from
+in_flight = InFlight()
+
+
+class WaitTimeUp(Exception):
+    """Raised for emails a list had no time left to submit."""
+
+
+def submit_single(api_key: str, email: str) -> dict:
+    """Start (or look up) the verification of ``email`` via ``/v1/verify/single``."""
+    response = client.get("/v1/verify/single", api_key, params={"email": email})
+    response.raise_for_status()
+    result = jsonio.response_json(response)
+    result_store.put(api_key, result, email)
+    return result
+
+
+def fetch_single_status(api_key: str, verification_id: str) -> dict:
+    """Current state of a verification via ``/v1/verify/single/status``."""
+    response = client.get("/v1/verify/single/status", api_key, params={"id": verification_id})
+    response.raise_for_status()
+    result = jsonio.response_json(response)
+    result.setdefault("id", verification_id)
+    result_store.put(api_key, result)
+    return result
+
+
+def is_final(result: dict) -> bool:
+    return result.get("status") != "processing"
+
+
+def format_single_result(verification_id: str, result: dict) -> dict:
+    # Extract verification result data
+    return {
+        "verification_id": verification_id,
+        "email": result.get("email"),
+        "status": result.get("status"),
+        "result": result.get("result"),
+        "result_code": result.get("result_code"),
+        "score": result.get("score"),
+        "is_catchall": result.get("is_catchall"),
+        "is_disposable": result.get("is_disposable"),
+        "is_role": result.get("is_role"),
+        "is_free": result.get("is_free"),
+        "is_seg_protected": result.get("is_seg_protected"),
+        "message": result.get("message"),
+        "details": result.get("details"),
+        "mx_records": result.get("mx_records"),
+        "smtp_provider": result.get("smtp_provider"),
+        "timestamp": result.get("timestamp"),
+        "completed_at": result.get("completed_at")
+    }
+
+
+def single_metadata_status(result: dict) -> str:
+    # Determine metadata status based on verification status
+    if result.get("status") == "completed":
+        # Map result to metadata status
+        if result.get("result") in ["deliverable", "valid"]:
+            return "success"
+        elif result.get("result") in ["undeliverable", "invalid"]:
+            return "failed"
+        elif result.get("result") in ["risky", "catchall", "unknown"]:
+            return "success"  # Still success but with warnings
+        else:
+            return "success"
+    elif result.get("status") == "processing":
+        return "still processing"
+    else:
+        return "failed"
+
+
+def verify_and_wait(api_key: str, email: str, max_wait_seconds: float, stats_name: str):
+    """Submit ``email`` and poll until its result is final or the wait runs out.
+
+    A fresh result from the result store is returned without calling
+    BounceBan. Returns ``(verification_id, result, polls, finished, cached)``.
+    The wait is recorded in the poll metrics under ``stats_name``.
+    """
+    cached = result_store.get(api_key, email)
+    if cached is not None:
+        return cached.get("id"), cached, 0, True, True
+
+    result = submit_single(api_key, email)
+    verification_id = result.get("id")
+    if is_final(result) or not verification_id or max_wait_seconds <= 0:
+        return verification_id, result, 0, is_final(result), False
+
+    # The submit call just said "processing", so start with a pause
+    result, polls, finished, _ = poll_until(
+        lambda: fetch_single_status(api_key, verification_id),
+        is_final,
+        max_wait=max_wait_seconds,
+        sleep_first=True,
+        name=stats_name
+    )
+    return verification_id, result, polls, finished, False
+
+
+def verify_shared(api_key: str, email: str, max_wait_seconds: float, stats_name: str):
+    """``verify_and_wait`` through the in-flight map; returns ``(outcome, shared)``."""
+    return in_flight.do(
+        (api_key_hash(api_key), email),
+        lambda: verify_and_wait(api_key, email, max_wait_seconds, stats_name)
+    )
+
+
+def verify_before(api_key: str, email: str, deadline: float, stats_name: str):
+    """``verify_shared`` with whatever is left until ``deadline`` (``time.monotonic()``).
+
+    Past the deadline only stored results are returned; anything else raises
+    ``WaitTimeUp`` without calling BounceBan. Returns the ``verify_and_wait``
+    outcome.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        cached = result_store.get(api_key, email)
+        if cached is None:
+            raise WaitTimeUp(email)
+        return cached.get("id"), cached, 0, True, True
+    outcome, _ = verify_shared(api_key, email, remaining, stats_name)
+    return outcome
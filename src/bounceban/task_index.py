@@ -0,0 +1,151 @@
+"""Local index of bulk task states, fed by BounceBan's completion callbacks.
+
+When ``BOUNCEBAN_CALLBACK_URL`` (this connector's public base URL) and
+``BOUNCEBAN_CALLBACK_SECRET`` are set, the modules that submit bulk tasks ask
+BounceBan to call ``/verify_bulk/v2/callback`` when a task finishes, and
+note the task here. ``fetch_status`` (used by ``verify_bulk/v2`` and the
+lifecycle's wait stage) then answers from the index:
+
+* a finished task is answered from the index, with no upstream call;
+* a task still waiting for its callback is answered with the last status
+  BounceBan gave, as long as that is less than ``TASK_INDEX_RECHECK``
+  seconds old; after that the status is polled again, so a lost callback
+  only delays the answer;
+* once the callback has arrived, the next check asks BounceBan for the
+  final status.
+
+Every answer is a status BounceBan returned; the callback only says when to
+ask again, so its payload is never served or trusted. The callback URL
+carries the API key hash, a nonce made for that one submission and an HMAC
+of both; the callback is accepted only for the task that was submitted with
+that nonce. Final states seen by polling are recorded too. The index is a
+SQLite file so a callback taken by one worker is seen by all of them.
+
+Settings (environment variables):
+    BOUNCEBAN_CALLBACK_URL          public base URL of this connector; callbacks are off without it
+    BOUNCEBAN_CALLBACK_SECRET       key for signing callback URLs; callbacks are off without it
+    BOUNCEBAN_TASK_INDEX_PATH       SQLite file (default: <tmp>/bounceban_tasks.sqlite3)
+    BOUNCEBAN_TASK_INDEX_TTL        seconds an entry is kept (default 7 days)
+    BOUNCEBAN_TASK_INDEX_RECHECK    seconds a pending task is answered locally before polling (default 300)
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from src.bounceban.bulk import fetch_bulk_status, is_task_terminal
+from src.bounceban.cache import SQLiteCache, api_key_hash
+
+CALLBACK_URL = os.environ.get("BOUNCEBAN_CALLBACK_URL", "").rstrip("/")
+CALLBACK_SECRET = os.environ.get("BOUNCEBAN_CALLBACK_SECRET", "")
+TASK_INDEX_PATH = os.environ.get(
+    "BOUNCEBAN_TASK_INDEX_PATH", os.path.join(tempfile.gettempdir(), "bounceban_tasks.sqlite3")
+)
+TASK_INDEX_TTL = int(os.environ.get("BOUNCEBAN_TASK_INDEX_TTL", str(7 * 24 * 3600)))
+TASK_INDEX_RECHECK = float(os.environ.get("BOUNCEBAN_TASK_INDEX_RECHECK", "300"))
+
+CALLBACK_PATH = "/verify_bulk/v2/callback"
+
+CALLBACKS_ENABLED = bool(CALLBACK_URL and CALLBACK_SECRET)
+
+_index = SQLiteCache(TASK_INDEX_PATH, "tasks", maxsize=1000000, ttl=TASK_INDEX_TTL)
+
+
+def _signature(key_hash: str, nonce: str) -> str:
+    message = f"{key_hash}:{nonce}".encode("utf-8")
+    return hmac.new(CALLBACK_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def new_callback(api_key: str):
+    """``(url, nonce)`` for one submission of ``api_key``, or ``(None, None)`` if callbacks are off.
+
+    The URL BounceBan should call when the task finishes; pass the nonce to
+    ``record_submission`` once the task has been created.
+    """
+    if not CALLBACKS_ENABLED:
+        return None, None
+    key_hash = api_key_hash(api_key)
+    nonce = secrets.token_hex(16)
+    query = urlencode({"key": key_hash, "nonce": nonce, "signature": _signature(key_hash, nonce)})
+    return f"{CALLBACK_URL}{CALLBACK_PATH}?{query}", nonce
+
+
+def verify_callback(key_hash: str, nonce: str, signature: str) -> bool:
+    if not CALLBACKS_ENABLED or not key_hash or not nonce or not signature:
+        return False
+    return hmac.compare_digest(_signature(key_hash, nonce), signature)
+
+
+def _key(key_hash: str, task_id: str) -> str:
+    return f"{key_hash}:{task_id}"
+
+
+def _get(key_hash: str, task_id: str):
+    try:
+        return _index.get(_key(key_hash, task_id))
+    except sqlite3.Error:
+        return None
+
+
+def _set(key_hash: str, task_id: str, entry: dict):
+    try:
+        _index.set(_key(key_hash, task_id), entry)
+    except sqlite3.Error as e:
+        # The index is an optimisation; polling still works without it
+        print(f"Could not record task {task_id} in the task index: {e!r}")
+
+
+def record_submission(api_key: str, result: dict, nonce: str):
+    """Note a task just submitted with the callback made with ``nonce`` (nothing is stored without one)."""
+    task_id = result.get("id")
+    if not nonce or not task_id:
+        return
+    key_hash = api_key_hash(api_key)
+    # A fast task's callback can arrive before this runs
+    early = _get(key_hash, f"early:{task_id}")
+    notified = bool(early and nonce in early.get("nonces", ()))
+    _set(key_hash, task_id, {"result": None, "nonce": nonce, "notified": notified, "checked_at": 0})
+
+
+def record_callback(key_hash: str, nonce: str, task_id: str) -> bool:
+    """Note that BounceBan reported ``task_id`` finished; ``False`` if the nonce is not that task's."""
+    entry = _get(key_hash, task_id)
+    if entry is None:
+        # Not submitted yet as far as the index knows: keep the nonce aside
+        # for record_submission to match, without touching the task's entry
+        early = _get(key_hash, f"early:{task_id}") or {"nonces": []}
+        early["nonces"] = (early["nonces"] + [nonce])[-4:]
+        _set(key_hash, f"early:{task_id}", early)
+        return True
+    if entry.get("nonce") != nonce:
+        return False
+    entry["notified"] = True
+    _set(key_hash, task_id, entry)
+    return True
+
+
+def fetch_status(api_key: str, task_id: str):
+    """Status of a task, from the index when it can answer and from BounceBan otherwise.
+
+    Returns ``(result, from_index)``; ``result`` is always a status BounceBan returned.
+    """
+    key_hash = api_key_hash(api_key)
+    entry = _get(key_hash, task_id)
+    if entry is not None and entry.get("result") is not None:
+        if is_task_terminal(entry["result"]):
+            return entry["result"], True
+        if (entry.get("nonce") and not entry.get("notified")
+                and time.time() - entry["checked_at"] < TASK_INDEX_RECHECK):
+            return entry["result"], True
+
+    result = fetch_bulk_status(api_key, task_id)
+    nonce = entry.get("nonce") if entry else None
+    if nonce or is_task_terminal(result):
+        # After a callback BounceBan may still say processing for a moment;
+        # the task then goes back to being re-checked every TASK_INDEX_RECHECK
+        _set(key_hash, task_id, {"result": result, "nonce": nonce, "notified": False, "checked_at": time.time()})
+    return result, False
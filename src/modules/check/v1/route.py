@@ -1,22 +1,108 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
 from main import router
+from src.bounceban.batch import parse_lines, run_concurrently
+from src.bounceban.check import BatchTimeUp, fetch_check, format_check, normalize_query
 import os
 import requests
+import time
+
+# Batch mode: upper bound on items per step and on parallel upstream calls.
+# Keep CHECK_CONCURRENCY at or below BOUNCEBAN_POOL_SIZE so every call reuses
+# a pooled connection.
+CHECK_BATCH_MAX = int(os.environ.get("BOUNCEBAN_CHECK_BATCH_MAX", "10000"))
+CHECK_CONCURRENCY = int(os.environ.get("BOUNCEBAN_CHECK_CONCURRENCY", "8"))
+
+# A batch stops starting upstream calls after this many seconds and returns
+# the queries it did not get to, so a step stays inside gunicorn's 360s
+# timeout whatever the per-key rate limit allows.
+CHECK_BATCH_SECONDS = float(os.environ.get("BOUNCEBAN_CHECK_BATCH_SECONDS", "300"))
+
 
 def extract_api_key(api_connection: dict) -> str:
     if not api_connection:
         return None
     return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
 
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, requests.exceptions.Timeout):
+        return "Request timeout"
+    if isinstance(e, requests.exceptions.RequestException):
+        return f"API request failed: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+
+def execute_batch(queries_raw: str, api_key: str):
+    queries, duplicates_removed = parse_lines(queries_raw, normalize=normalize_query)
+    if not queries:
+        return Response(
+            data={"error": "At least one email or domain is required."},
+            metadata={"status": "failed"}
+        )
+    if len(queries) > CHECK_BATCH_MAX:
+        return Response(
+            data={"error": f"Maximum {CHECK_BATCH_MAX} emails or domains allowed per batch"},
+            metadata={"status": "failed"}
+        )
+
+    deadline = time.monotonic() + CHECK_BATCH_SECONDS
+    outcomes = run_concurrently(
+        lambda query: fetch_check(api_key, query, deadline), queries, max_workers=CHECK_CONCURRENCY
+    )
+
+    results = []
+    count_success = 0
+    count_cached = 0
+    skipped = []
+    for query, outcome, error in outcomes:
+        if isinstance(error, BatchTimeUp):
+            skipped.append(query)
+            continue
+        if error is not None:
+            results.append({"query": query, "status": "failed", "error": describe_error(error)})
+            continue
+        result, cache_status = outcome
+        count_success += 1
+        if cache_status == "hit":
+            count_cached += 1
+        item = format_check(query, result, cached=cache_status == "hit")
+        item["status"] = "success"
+        results.append(item)
+
+    batch_data = {
+        "count_total": len(queries),
+        "count_success": count_success,
+        "count_failed": len(queries) - count_success - len(skipped),
+        "count_cached": count_cached,
+        "count_skipped": len(skipped),
+        "count_duplicates_removed": duplicates_removed,
+        "results": results
+    }
+    if skipped:
+        # Out of time: a following step can pass these back as its queries
+        batch_data["skipped_queries"] = "\n".join(skipped)
+    if not count_success:
+        metadata_status = "failed"
+    elif skipped:
+        metadata_status = "partial"
+    else:
+        metadata_status = "success"
+    return Response(
+        data=batch_data,
+        metadata={"status": metadata_status}
+    )
+
+
 @router.route("/execute", methods=["POST", "GET"])
 def execute():
     # Parse request JSON
     data = flask_request.get_json(force=True)
 
-    # Get the input to check (email or domain)
+    # Get the input to check (email or domain), or a newline-separated batch
     query = data.get("query")
-    if not query:
+    queries_raw = data.get("queries")
+    if not query and not queries_raw:
         return Response(
             data={"error": "Email or domain is required."},
             metadata={"status": "failed"}
@@ -37,49 +123,21 @@ def execute():
             metadata={"status": "failed"}
         )
 
-    # API endpoint and headers
-    url = "https://api.bounceban.com/v1/check"
-    headers = {
-        "Authorization": api_key,
-        "Content-Type": "application/json"
-    }
-
-    # Correct parameter based on input
-    if "@" in query:
-        params = { "email": query }
-    else:
-        params = { "domain": query }
+    if queries_raw:
+        return execute_batch(queries_raw, api_key)
 
-    print(f"Making request to BounceBan with params: {params}")  # Debugging
+    normalized_query = normalize_query(query)
 
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        response.raise_for_status()
-
-        result = response.json()
-        print(f"BounceBan API Response: {result}")  # Debugging
+        result, cache_status = fetch_check(api_key, normalized_query)
 
         # Format response payload
-        check_data = {
-            "query": query,
-            "domain_type": result.get("domain_type"),
-            "username_type": result.get("username_type"),
-            "syntax_valid": result.get("syntax_valid"),
-            "credits_consumed": result.get("credits_consumed"),
-            "credits_remaining": result.get("credits_remaining"),
-            "raw": result  # Optional: include raw result for debugging
-        }
-
-        return Response(data=check_data, metadata={"status": "success"})
-
-    except requests.exceptions.Timeout:
-        return Response(data={"error": "Request timeout"}, metadata={"status": "failed"})
+        check_data = format_check(query, result, cached=cache_status == "hit")
 
-    except requests.exceptions.RequestException as e:
-        return Response(data={"error": f"API request failed: {str(e)}"}, metadata={"status": "failed"})
+        return Response(data=check_data, metadata={"status": "success", "cache": cache_status})
 
     except Exception as e:
-        return Response(data={"error": f"Unexpected error: {str(e)}"}, metadata={"status": "failed"})
+        return Response(data={"error": describe_error(e)}, metadata={"status": "failed"})
 
 
 @router.route("/content", methods=["GET", "POST"])
@@ -0,0 +1,74 @@
+from workflows_cdk import Request, Response
+from flask import request as flask_request
+from main import router
+from src.bounceban import jobs
+from src.bounceban.polling import MAX_WAIT_SECONDS, poll_until
+
+# Default wait when wait_for_completion is set without max_wait_seconds
+DEFAULT_WAIT_SECONDS = min(120, MAX_WAIT_SECONDS)
+
+def extract_api_key(api_connection: dict) -> str:
+    if not api_connection:
+        return None
+    return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
+
+
+def job_metadata_status(job_status: str) -> str:
+    if job_status == "succeeded":
+        return "success"
+    elif job_status == "failed":
+        return "failed"
+    else:
+        return "still processing"
+
+
+@router.route("/execute", methods=["POST", "GET"])
+def execute():
+    request = Request(flask_request)
+    data = request.data
+
+    job_id = data.get("job_id")
+    if not job_id or not isinstance(job_id, str):
+        return Response(
+            data={"error": "Job ID is required"},
+            metadata={"status": "failed"}
+        )
+
+    # Optional: keep checking until the job finishes or the wait runs out
+    wait = bool(data.get("wait_for_completion", False))
+    max_wait_seconds = data.get("max_wait_seconds") or DEFAULT_WAIT_SECONDS
+    if not isinstance(max_wait_seconds, int) or max_wait_seconds < 1 or max_wait_seconds > MAX_WAIT_SECONDS:
+        return Response(
+            data={"error": f"Max wait seconds must be between 1 and {MAX_WAIT_SECONDS}"},
+            metadata={"status": "failed"}
+        )
+
+    # Get API key from connection or environment
+    dev_studio_api_key = extract_api_key(data.get("api_connection"))
+    if not dev_studio_api_key:
+        return Response(
+            data={"error": "API key is required"},
+            metadata={"status": "failed"}
+        )
+
+    # Jobs are local, so checking often costs no API calls
+    if wait:
+        job, _, _, _ = poll_until(
+            lambda: jobs.get_job(job_id, dev_studio_api_key),
+            lambda job: job is None or job_metadata_status(job["status"]) != "still processing",
+            max_wait=max_wait_seconds,
+            delay=1.0,
+            max_delay=5.0
+        )
+    else:
+        job = jobs.get_job(job_id, dev_studio_api_key)
+    if job is None:
+        return Response(
+            data={"error": "Job not found or expired"},
+            metadata={"status": "failed"}
+        )
+
+    return Response(
+        data=job,
+        metadata={"status": job_metadata_status(job["status"]), "job_status": job["status"]}
+    )
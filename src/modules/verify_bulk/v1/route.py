@@ -1,6 +1,9 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
 from main import router
+from src.bounceban import task_index
+from src.bounceban.bulk import MAX_EMAILS_PER_TASK, prefilter_emails, submit_bulk_task
+from itertools import islice
 import os
 import requests
 import json
@@ -9,29 +12,55 @@ def extract_api_key(api_connection: dict) -> str:
     if not api_connection:
         return None
     return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
+
+
 @router.route("/execute", methods=["POST", "GET"])
 def execute():
     request = Request(flask_request)
     data = request.data
     # data = flask_request.get_json(force=True)
-    # Get the list of emails to verify
+    # Get the list of emails to verify; it is only ever read lazily
     emails_raw = data.get("emails", "")
-    emails = [email.strip() for email in emails_raw.splitlines() if email.strip()]
-    # print(f"Received emails for bulk verification: {emails}")
-    if not emails:
+    if not isinstance(emails_raw, str):
+        return Response(
+            data={"error": "Emails must be provided as a newline-separated list"},
+            metadata={"status": "failed"}
+        )
+
+    # Normalize, drop duplicates and reject malformed addresses locally so
+    # they are neither billed nor queued by BounceBan. The kept emails are
+    # what gets submitted, so the list is only parsed once
+    prefilter = prefilter_emails(emails_raw, keep=True)
+    email_count = prefilter.count_unique
+    if not prefilter.count_lines:
         return Response(
             data={"error": "Emails list is required"},
             metadata={"status": "failed"}
         )
-    
-    # Validate email list
-    if not isinstance(emails, list):
+    if not email_count:
         return Response(
-            data={"error": "Emails must be provided as a list"},
+            data={
+                "error": "No valid email addresses found",
+                "count_invalid": prefilter.count_invalid,
+                "invalid_emails": prefilter.invalid_emails
+            },
             metadata={"status": "failed"}
         )
-    
-    if len(emails) > 500000:
+
+    # Optional: split the job into several BounceBan tasks of this size
+    # Left empty means one task; 0 is rejected like any other bad size
+    chunk_size = data.get("chunk_size")
+    chunked = chunk_size not in (None, "")
+    if not chunked:
+        chunk_size = MAX_EMAILS_PER_TASK
+    elif (not isinstance(chunk_size, int) or isinstance(chunk_size, bool)
+          or chunk_size < 1 or chunk_size > MAX_EMAILS_PER_TASK):
+        return Response(
+            data={"error": f"Chunk size must be between 1 and {MAX_EMAILS_PER_TASK}"},
+            metadata={"status": "failed"}
+        )
+
+    if not chunked and email_count > MAX_EMAILS_PER_TASK:
         return Response(
             data={"error": "Maximum 500,000 emails allowed per bulk task"},
             metadata={"status": "failed"}
@@ -54,62 +83,81 @@ def execute():
             data={"error": "API key is required"},
             metadata={"status": "failed"}
         )
-    
-    # BounceBan API endpoint for bulk email verification
-    url = "https://api.bounceban.com/v1/verify/bulk"
-    
-    # Headers for BounceBan API (using Authorization without Bearer prefix)
-    headers = {
-        "Authorization": dev_studio_api_key,
-        "Content-Type": "application/json"
-    }
-    
-    # Request body
-    payload = {
-        "name": task_name,
-        "emails": emails
-    }
-    
+
+    task_count = -(-email_count // chunk_size)
+    unique_emails = iter(prefilter.emails)
+    tasks = []
+
     try:
-        # Make POST request to BounceBan API
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        
-        result = response.json()
-        # print(f"Response from BounceBan API: {json.dumps(result, indent=2)}")
-        # Extract task creation data from response
-        task_data = {
-            "task_id": result.get("id"),
-            "task_name": task_name,
-            "status": result.get("status"),
-            "count_submitted": result.get("count_submitted", len(emails)),
-            "count_duplicates_removed": result.get("count_duplicates_removed", 0),
-            "count_processing": result.get("count_processing", len(emails)),
-            "message": result.get("message", "Bulk verification task created successfully")
-        }
-        
-        # Task creation is successful
-        return Response(
-            data=task_data,
-            metadata={"status": "success"}
-        )
+        for index in range(task_count):
+            name = task_name if task_count == 1 else f"{task_name} (part {index + 1}/{task_count})"
+            chunk_count = min(chunk_size, email_count - index * chunk_size)
+
+            # With callbacks on, BounceBan reports the finished task to verify_bulk/v2
+            callback_url, nonce = task_index.new_callback(dev_studio_api_key)
+            # Make POST request to BounceBan API; the body pulls the next chunk
+            # straight from the shared iterator
+            result = submit_bulk_task(
+                dev_studio_api_key, name, islice(unique_emails, chunk_size), url=callback_url
+            )
+            task_index.record_submission(dev_studio_api_key, result, nonce)
+            # print(f"Response from BounceBan API: {json.dumps(result, indent=2)}")
+            tasks.append({
+                "task_id": result.get("id"),
+                "task_name": name,
+                "status": result.get("status"),
+                "count_submitted": result.get("count_submitted", chunk_count),
+                "count_duplicates_removed": result.get("count_duplicates_removed", 0),
+                "count_processing": result.get("count_processing", chunk_count),
+                "message": result.get("message", "Bulk verification task created successfully")
+            })
         
-    except requests.exceptions.Timeout:
-        return Response(
-            data={"error": "Request timeout"},
-            metadata={"status": "failed"}
-        )
-    except requests.exceptions.RequestException as e:
-        return Response(
-            data={"error": f"API request failed: {str(e)}"},
-            metadata={"status": "failed"}
-        )
     except Exception as e:
+        if isinstance(e, requests.exceptions.Timeout):
+            error = "Request timeout"
+        elif isinstance(e, requests.exceptions.RequestException):
+            error = f"API request failed: {str(e)}"
+        else:
+            error = f"Unexpected error: {str(e)}"
+        if not tasks:
+            return Response(
+                data={"error": error},
+                metadata={"status": "failed"}
+            )
+        # Some tasks were already created; report them so they are not lost
         return Response(
-            data={"error": f"Unexpected error: {str(e)}"},
+            data={
+                "error": error,
+                "task_ids": [task["task_id"] for task in tasks],
+                "tasks": tasks,
+                "count_tasks_failed": task_count - len(tasks)
+            },
             metadata={"status": "failed"}
         )
 
+    # Extract task creation data from response
+    first = tasks[0]
+    task_data = {
+        "task_id": first["task_id"],
+        "task_name": task_name,
+        "status": first["status"],
+        "count_submitted": sum(task["count_submitted"] for task in tasks),
+        "count_duplicates_removed": prefilter.count_duplicates_removed + sum(task["count_duplicates_removed"] for task in tasks),
+        "count_invalid": prefilter.count_invalid,
+        "invalid_emails": prefilter.invalid_emails,
+        "count_processing": sum(task["count_processing"] for task in tasks),
+        # Each distinct task message once, in task order
+        "message": "; ".join(dict.fromkeys(task["message"] for task in tasks)),
+        "task_ids": [task["task_id"] for task in tasks],
+        "tasks": tasks
+    }
+    
+    # Task creation is successful
+    return Response(
+        data=task_data,
+        metadata={"status": "success"}
+    )
+
 
 # @router.route("/content", methods=["GET", "POST"])
 # def content():
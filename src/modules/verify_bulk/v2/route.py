@@ -1,14 +1,23 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
 from main import router
+from src.bounceban import jsonio, task_index
+from src.bounceban.bulk import is_task_terminal, task_metadata_status
+from src.bounceban.polling import (
+    INITIAL_DELAY, MAX_WAIT_SECONDS, decode_continuation, encode_continuation, poll_until
+)
 import os
 import requests
 
+# Default wait when wait_for_completion is set without max_wait_seconds
+DEFAULT_WAIT_SECONDS = min(120, MAX_WAIT_SECONDS)
+
 def extract_api_key(api_connection: dict) -> str:
     if not api_connection:
         return None
     return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
 
+
 @router.route("/execute", methods=["POST", "GET"])
 def execute():
     request = Request(flask_request)
@@ -22,6 +31,36 @@ def execute():
             data={"error": "Task ID is missing or appears invalid"},
             metadata={"status": "failed"}
         )
+
+    # Optional: keep polling until the task finishes or the wait runs out
+    wait = bool(data.get("wait_for_completion", False))
+    max_wait_seconds = data.get("max_wait_seconds") or DEFAULT_WAIT_SECONDS
+    if not isinstance(max_wait_seconds, int) or max_wait_seconds < 1 or max_wait_seconds > MAX_WAIT_SECONDS:
+        return Response(
+            data={"error": f"Max wait seconds must be between 1 and {MAX_WAIT_SECONDS}"},
+            metadata={"status": "failed"}
+        )
+
+    # A continuation token from a previous step resumes its wait
+    delay = INITIAL_DELAY
+    previous_polls = 0
+    if data.get("continuation_token"):
+        try:
+            state = decode_continuation(data["continuation_token"])
+        except ValueError as e:
+            return Response(
+                data={"error": str(e)},
+                metadata={"status": "failed"}
+            )
+        if state.get("id") != task_id:
+            return Response(
+                data={"error": "Continuation token belongs to a different task"},
+                metadata={"status": "failed"}
+            )
+        wait = True
+        delay = state["delay"]
+        previous_polls = state["polls"]
+
     # Get API key from connection or environment
     dev_studio_api_key = extract_api_key(data.get("api_connection"))
     if not dev_studio_api_key:
@@ -29,61 +68,49 @@ def execute():
             data={"error": "API key is required"},
             metadata={"status": "failed"}
         )
-    # BounceBan API endpoint for checking bulk task status
-    url = f"https://api.bounceban.com/v1/verify/bulk/status"
-
-    # print(f"Requesting status for task ID: {task_id} from URL: {url}")
-    # Headers for BounceBan API (using Authorization without Bearer prefix)
-    headers = {
-        "Authorization": dev_studio_api_key,
-        "Content-Type": "application/json"
-    }
-    
-    # Query parameters
-    payload = {
-        "id": task_id
-    }
     
+    # Answered from the task index when it holds the final status, or a recent
+    # one for a task whose callback has not arrived yet; BounceBan otherwise
+    answered_from = {"index": 0, "api": 0}
+
+    def fetch_status():
+        result, from_index = task_index.fetch_status(dev_studio_api_key, task_id)
+        answered_from["index" if from_index else "api"] += 1
+        return result
+
     try:
-        # Make GET request to BounceBan API
-        response = requests.get(url, headers=headers, params=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
+        if wait:
+            result, polls, finished, next_delay = poll_until(
+                fetch_status,
+                is_task_terminal,
+                max_wait=max_wait_seconds,
+                delay=delay,
+                name="verify_bulk/v2"
+            )
+        else:
+            result = fetch_status()
         # print(f"Response from BounceBan API: {result}")
-        # Extract status data from response
-        status_data = {
-            "task_id": task_id,
-            "task_name": result.get("name"),
-            "status": result.get("status"),
-            "count_total": result.get("count_total", 0),
-            "count_checked": result.get("count_checked", 0),
-            "count_remaining": result.get("count_remaining", 0),
-            "progress_percentage": result.get("progress_percentage", 0),
-            "verification_started_at": result.get("verification_started_at"),
-            "verification_ended_at": result.get("verification_ended_at"),
-            "estimated_time_remaining": result.get("estimated_time_remaining"),
-            "created_at": result.get("created_at"),
-            "updated_at": result.get("updated_at")
-        }
         
-        # Determine metadata status based on task status
         task_status = result.get("status", "").lower()
-        if task_status in ["completed", "complete", "finished"]:
-            metadata_status = "success"
-        elif task_status in ["processing", "running", "verifying", "waiting", "queued"]:
-            metadata_status = "still processing"
-        elif task_status in ["failed", "error", "cancelled"]:
-            metadata_status = "failed"
-        else:
-            metadata_status = "still processing"
+        metadata = {
+            "status": task_metadata_status(task_status),
+            "task_status": task_status,
+            "upstream_calls": answered_from["api"],
+            "index_hits": answered_from["index"]
+        }
+        if wait:
+            metadata["polls"] = previous_polls + polls
+            if not finished:
+                # Out of time: the next step can pick up where this one stopped
+                metadata["continuation_token"] = encode_continuation({
+                    "id": task_id,
+                    "delay": next_delay,
+                    "polls": previous_polls + polls
+                })
         
         return Response(
             data=result,
-            metadata={
-                "status": metadata_status,
-                "task_status": task_status
-            }
+            metadata=metadata
         )
         
     except requests.exceptions.Timeout:
@@ -102,6 +129,47 @@ def execute():
             metadata={"status": "failed"}
         )
 
+@router.route("/callback", methods=["POST"])
+def callback():
+    """Completion notification from BounceBan for a task submitted with a callback URL.
+
+    Only the task ID is read from the body: the next status check asks
+    BounceBan for the final status instead of trusting the notification.
+    """
+    key_hash = flask_request.args.get("key", "")
+    nonce = flask_request.args.get("nonce", "")
+    if not task_index.verify_callback(key_hash, nonce, flask_request.args.get("signature", "")):
+        return Response(
+            data={"error": "Invalid callback signature"},
+            metadata={"status": "failed"},
+            status_code=403
+        )
+
+    try:
+        payload = jsonio.loads(flask_request.get_data() or b"{}")
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict) and isinstance(payload.get("data"), dict):
+        payload = payload["data"]
+    task_id = (payload.get("id") or payload.get("task_id")) if isinstance(payload, dict) else None
+    if not task_id or not isinstance(task_id, str):
+        return Response(
+            data={"error": "Callback has no task ID"},
+            metadata={"status": "failed"},
+            status_code=400
+        )
+
+    if not task_index.record_callback(key_hash, nonce, task_id):
+        return Response(
+            data={"error": "Callback does not belong to this task"},
+            metadata={"status": "failed"},
+            status_code=403
+        )
+    return Response(
+        data={"received": True, "task_id": task_id},
+        metadata={"status": "success"}
+    )
+
 # @router.route("/content", methods=["GET", "POST"])
 # def content():
 #     """
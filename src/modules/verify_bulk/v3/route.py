@@ -1,25 +1,82 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
 from main import router
+from src.bounceban import client, jsonio
+from src.bounceban.batch import run_concurrently
+from src.bounceban.results import ResultIndex, result_store
 import os
 import requests
 import json
 
+# Result categories a workflow can narrow the response to
+RESULT_CATEGORIES = ["deliverable", "undeliverable", "risky", "unknown"]
+
+# Parts of the response a workflow can ask for; the first three are the default
+RESPONSE_SECTIONS = ["items", "deliverable_emails", "non_deliverable_emails", "by_result", "by_domain"]
+DEFAULT_SECTIONS = RESPONSE_SECTIONS[:3]
+
+# Emails are looked up in chunks of this size, this many chunks at a time, so
+# a long list never rides on one request that runs into the read timeout.
+# Keep BULK_EMAILS_CONCURRENCY at or below BOUNCEBAN_POOL_SIZE.
+BULK_EMAILS_CHUNK = int(os.environ.get("BOUNCEBAN_BULK_EMAILS_CHUNK", "1000"))
+BULK_EMAILS_CONCURRENCY = int(os.environ.get("BOUNCEBAN_BULK_EMAILS_CONCURRENCY", "4"))
+
 def extract_api_key(api_connection: dict) -> str:
     if not api_connection:
         return None
     return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
 
+def parse_choices(value, default: list) -> list:
+    """Read a list option given as a list or a comma/newline-separated string."""
+    if not value:
+        return default
+    if isinstance(value, str):
+        value = value.replace(",", "\n").splitlines()
+    return [str(choice).strip().lower() for choice in value if str(choice).strip()]
+
+def fetch_task_emails(api_key: str, task_id: str, emails: list) -> dict:
+    response = client.post("/v1/verify/bulk/emails", api_key, json={"id": task_id, "emails": emails})
+    response.raise_for_status()
+    return jsonio.response_json(response)
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, requests.exceptions.Timeout):
+        return "Request timeout"
+    if isinstance(e, requests.exceptions.RequestException):
+        return f"API request failed: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+def merge_results(results: list) -> dict:
+    """One task status for several chunk answers: processing while any chunk is."""
+    statuses = [result.get("status") for result in results]
+    return {
+        "status": "processing" if "processing" in statuses else statuses[0],
+        "result": results[0].get("result"),
+        "result_ready": all(result.get("result_ready", False) for result in results),
+    }
+
 @router.route("/execute", methods=["POST", "GET"])
 def execute():
     request = Request(flask_request)
     data = request.data
     # print(f"Request Data: {data}")
 
-    # Parse emails
+    # Parse, check and deduplicate emails in one pass
     emails_raw = data.get("emails", "")
-    emails = [email.strip() for email in emails_raw.splitlines() if email.strip()]
-    if not emails or not isinstance(emails, list) or not all(isinstance(e, str) and "@" in e for e in emails):
+    emails = []
+    seen = set()
+    valid = isinstance(emails_raw, str)
+    for line in emails_raw.splitlines() if valid else ():
+        email = line.strip()
+        if not email:
+            continue
+        if "@" not in email:
+            valid = False
+            break
+        if email.lower() not in seen:
+            seen.add(email.lower())
+            emails.append(email)
+    if not emails or not valid:
         return Response(
             data={"error": "A valid list of email addresses is required"},
             metadata={"status": "failed"}
@@ -48,6 +105,22 @@ def execute():
             metadata={"status": "failed"}
         )
 
+    # Optional narrowing of the response
+    categories = parse_choices(data.get("categories"), [])
+    unknown = [category for category in categories if category not in RESULT_CATEGORIES]
+    if unknown:
+        return Response(
+            data={"error": f"Categories must be among: {', '.join(RESULT_CATEGORIES)}"},
+            metadata={"status": "failed"}
+        )
+    sections = parse_choices(data.get("include"), DEFAULT_SECTIONS)
+    unknown = [section for section in sections if section not in RESPONSE_SECTIONS]
+    if unknown:
+        return Response(
+            data={"error": f"Include must be among: {', '.join(RESPONSE_SECTIONS)}"},
+            metadata={"status": "failed"}
+        )
+
     # API key
     dev_studio_api_key = extract_api_key(data.get("api_connection"))
     if not dev_studio_api_key:
@@ -56,28 +129,54 @@ def execute():
             metadata={"status": "failed"}
         )
 
-    # BounceBan API
-    url = "https://api.bounceban.com/v1/verify/bulk/emails"
-    headers = {
-        "Authorization": dev_studio_api_key,
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "id": task_id,
-        "emails": emails
-    }
+    # Emails with a fresh result from this task in the result store are not
+    # requested again
+    cached_items = result_store.get_many(dev_studio_api_key, emails, task_id)
+    missing = [email for email in emails if email not in cached_items]
 
     try:
-        # print(f"URL: {url}")
-        # print(f"Headers: {headers}")
-        # print(f"Payload: {json.dumps(payload)}")
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
+        # Look the rest up in chunks, several at a time. A failed chunk is
+        # reported on its own instead of failing the whole step
+        chunks = [missing[i:i + BULK_EMAILS_CHUNK] for i in range(0, len(missing), BULK_EMAILS_CHUNK)]
+        outcomes = run_concurrently(
+            lambda chunk: fetch_task_emails(dev_studio_api_key, task_id, chunk), chunks,
+            max_workers=BULK_EMAILS_CONCURRENCY
+        )
+        results = []
+        fetched_items = {}
+        failed_chunks = []
+        for number, (chunk, result, error) in enumerate(outcomes):
+            if error is not None:
+                failed_chunks.append({
+                    "chunk": number,
+                    "emails": chunk,
+                    "error": describe_error(error),
+                })
+                continue
+            results.append(result)
+            for item in result.get("items", []):
+                fetched_items.setdefault((item.get("email") or "").lower(), item)
 
-        result = response.json()
-        # print(f"API Response: {result}")
-        items = result.get("items", [])
-        email_count = len(items)
+        if failed_chunks and not results and not cached_items:
+            return Response(
+                data={
+                    "error": failed_chunks[0]["error"],
+                    "count_failed_chunks": len(failed_chunks),
+                    "failed_chunks": failed_chunks,
+                },
+                metadata={"status": "failed"}
+            )
+        if results:
+            result = merge_results(results)
+        else:
+            result = {"status": "finished", "result_ready": not failed_chunks}
+        result_store.put_many(dev_studio_api_key, fetched_items.values(), task_id)
+
+        # Group every result by category and domain in a single pass, in the
+        # order the emails were given and with one result per email
+        ordered = (cached_items.get(email) or fetched_items.get(email.lower()) for email in emails)
+        index = ResultIndex((item for item in ordered if item is not None), categories)
+        email_count = sum(index.result_counts.values())
 
         # Handle no matches
         if email_count == 0:
@@ -87,9 +186,12 @@ def execute():
                     "status": result.get("status"),
                     "message": "No matching emails found for this Task ID.",
                     "items": [],
-                    "email_count": 0
+                    "email_count": 0,
+                    "count_failed_chunks": len(failed_chunks),
+                    "failed_chunks": failed_chunks
                 },
-                metadata={"status": "no email match"}
+                # The emails of failed chunks may still match
+                metadata={"status": "partial" if failed_chunks else "no email match"}
             )
 
         # Success response
@@ -97,14 +199,36 @@ def execute():
             "task_id": task_id,
             "status": result.get("status"),
             "result": result.get("result"),
-            "items": items,
             "email_count": email_count,
-            "deliverable_emails": [item["email"] for item in items if item.get("result") == "deliverable"],
-            "non_deliverable_emails": [item["email"] for item in items if item.get("result") != "deliverable"]
+            "count_cached": len(cached_items),
+            "count_chunks": len(chunks),
+            "count_failed_chunks": len(failed_chunks),
+            "result_counts": index.result_counts,
         }
+        if failed_chunks:
+            # Emails of these chunks have no result here; the step can be
+            # rerun with just them
+            result_data["failed_chunks"] = failed_chunks
+        if categories:
+            result_data["categories"] = categories
+            result_data["returned_count"] = len(index.items)
+        sections = set(sections)
+        if "items" in sections:
+            result_data["items"] = index.items
+        if "deliverable_emails" in sections:
+            result_data["deliverable_emails"] = index.deliverable
+        if "non_deliverable_emails" in sections:
+            result_data["non_deliverable_emails"] = index.non_deliverable
+        if "by_result" in sections:
+            result_data["by_result"] = index.by_result
+        if "by_domain" in sections:
+            result_data["by_domain"] = index.by_domain
 
-        # Metadata status
-        if result.get("result_ready", False):
+        # Metadata status. Emails of failed chunks have no answer at all, so
+        # the step never reports plain success with some of them missing
+        if failed_chunks:
+            metadata_status = "partial"
+        elif result.get("result_ready", False):
             metadata_status = "success"
         elif result.get("status") == "processing":
             metadata_status = "still processing"
@@ -118,17 +242,6 @@ def execute():
             metadata={"status": metadata_status}
         )
 
-    except requests.exceptions.Timeout:
-        return Response(
-            data={"error": "Request timeout"},
-            metadata={"status": "failed"}
-        )
-    except requests.exceptions.RequestException as e:
-        # print(f"Full response: {e.response.text if e.response else 'No response'}")
-        return Response(
-            data={"error": f"API request failed: {str(e)}"},
-            metadata={"status": "failed"}
-        )
     except Exception as e:
         return Response(
             data={"error": f"Unexpected error: {str(e)}"},
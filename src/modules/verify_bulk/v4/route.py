@@ -1,14 +1,73 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
+from flask import Response as FlaskResponse, send_file, stream_with_context
 from main import router
+from src.bounceban import client, jobs
+from src.bounceban.dump import (
+    RESULT_COLUMNS, ResultColumns, fetch_dump_page, format_result, iter_csv, iter_dump_pages,
+    iter_dump_pages_parallel, iter_ndjson, iter_with_error_record
+)
+from src.bounceban.export import EXPORT_FORMATS, PARQUET_AVAILABLE, export_pages, export_path
+from src.bounceban.results import result_store
+from itertools import chain
 import os
 import requests
 
+# Output formats that walk every page of the task and stream the rows back
+STREAM_FORMATS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+}
+
+# Default number of dump pages fetched in parallel when streaming. Accepted up
+# to MAX_DUMP_CONCURRENCY but run at most BOUNCEBAN_POOL_SIZE at a time, so
+# every fetch reuses a pooled connection.
+DUMP_CONCURRENCY = int(os.environ.get("BOUNCEBAN_DUMP_CONCURRENCY", "4"))
+MAX_DUMP_CONCURRENCY = 16
+
 def extract_api_key(api_connection: dict) -> str:
     if not api_connection:
         return None
     return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
 
+def iter_task_pages(api_key: str, task_id: str, offset: int, limit: int, filter_status: str, max_concurrency: int):
+    """Every dump page from ``offset`` on, several fetched at once unless ``max_concurrency`` is 1."""
+    if max_concurrency > 1:
+        return iter_dump_pages_parallel(
+            api_key, task_id, offset, limit, filter_status, max_concurrency=max_concurrency
+        )
+    return iter_dump_pages(api_key, task_id, offset, limit, filter_status)
+
+@jobs.handler("verify_bulk/v4")
+def export_in_background(api_key: str, payload: dict, report) -> dict:
+    """Job version of output_format "export", for tasks too large for one request."""
+    progress = {"pages": 0, "rows": 0}
+
+    def counted(pages):
+        for page in pages:
+            yield page
+            progress["pages"] += 1
+            progress["rows"] += len(page[1])
+            report(progress)
+
+    # Jobs queued before the pool cap carry the value they were accepted with
+    max_concurrency = min(payload["max_concurrency"], client.POOL_SIZE)
+    pages = iter_task_pages(
+        api_key, payload["task_id"], payload["offset"], payload["limit"], payload["filter_status"],
+        max_concurrency
+    )
+    export = export_pages(
+        counted(result_store.record_pages(api_key, payload["task_id"], pages)), payload["task_id"], payload["export_format"]
+    )
+    export.update({
+        "task_id": payload["task_id"],
+        "offset": payload["offset"],
+        "filter_status": payload["filter_status"],
+        "max_concurrency": max_concurrency,
+        "download_path": f"/verify_bulk/v4/export?export_id={export['export_id']}",
+    })
+    return export
+
 @router.route("/execute", methods=["POST", "GET"])
 def execute():
     request = Request(flask_request)
@@ -26,6 +85,10 @@ def execute():
     offset = data.get("offset", 0)
     limit = data.get("limit", 1000)
     filter_status = data.get("filter_status", "all")
+    output_format = data.get("output_format", "json")
+    max_concurrency = data.get("max_concurrency") or DUMP_CONCURRENCY
+    export_format = data.get("export_format", "ndjson")
+    background = bool(data.get("background", False))
     
     # Validate pagination parameters
     if offset < 0:
@@ -48,6 +111,31 @@ def execute():
             metadata={"status": "failed"}
         )
     
+    if output_format not in ("json", "columns", "export") and output_format not in STREAM_FORMATS:
+        return Response(
+            data={"error": f"Output format must be one of: json, columns, export, {', '.join(STREAM_FORMATS)}"},
+            metadata={"status": "failed"}
+        )
+    
+    if output_format == "export":
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                data={"error": f"Export format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                metadata={"status": "failed"}
+            )
+        if export_format == "parquet" and not PARQUET_AVAILABLE:
+            return Response(
+                data={"error": "Parquet export is not available: the pyarrow package is not installed"},
+                metadata={"status": "failed"}
+            )
+    
+    if not isinstance(max_concurrency, int) or max_concurrency < 1 or max_concurrency > MAX_DUMP_CONCURRENCY:
+        return Response(
+            data={"error": f"Max concurrency must be between 1 and {MAX_DUMP_CONCURRENCY}"},
+            metadata={"status": "failed"}
+        )
+    max_concurrency = min(max_concurrency, client.POOL_SIZE)
+    
     # Get API key from connection or environment
     dev_studio_api_key = extract_api_key(data.get("api_connection"))
     if not dev_studio_api_key:
@@ -56,60 +144,81 @@ def execute():
             metadata={"status": "failed"}
         )
     
-    # BounceBan API endpoint for retrieving bulk results in JSON
-    url = "https://api.bounceban.com/v1/verify/bulk/dump"
-    
-    # Headers for BounceBan API (using Authorization without Bearer prefix)
-    headers = {
-        "Authorization": dev_studio_api_key,
-        "Content-Type": "application/json"
-    }
-    
-    # Query parameters
-    params = {
-        "id": task_id,
-        "offset": offset,
-        "limit": limit
-    }
-    
-    if filter_status != "all":
-        params["filter"] = filter_status
-    
     try:
+        if output_format == "export" and background:
+            # Run the export as a background job; jobs/v1 reports on it
+            job_id = jobs.enqueue("verify_bulk/v4", dev_studio_api_key, {
+                "task_id": task_id,
+                "offset": offset,
+                "limit": limit,
+                "filter_status": filter_status,
+                "export_format": export_format,
+                "max_concurrency": max_concurrency,
+            })
+            return Response(
+                data={
+                    "job_id": job_id, "job_status": "queued", "task_id": task_id, "max_concurrency": max_concurrency
+                },
+                metadata={"status": "still processing", "job_id": job_id}
+            )
+
+        if output_format in STREAM_FORMATS or output_format == "export":
+            # Walk every page from offset on. Pages are fetched ahead of the one
+            # being written out (several at once unless max_concurrency is 1),
+            # so memory stays at a few pages whatever the task size
+            pages = iter_task_pages(dev_studio_api_key, task_id, offset, limit, filter_status, max_concurrency)
+            # Fetch the first page up front so API errors still come back as a
+            # regular failed Response
+            first_page = next(pages, None)
+            if first_page is not None:
+                pages = chain([first_page], pages)
+            pages = result_store.record_pages(dev_studio_api_key, task_id, pages)
+            if output_format == "export":
+                # Write the rows to a file and hand back where it is instead of
+                # the rows themselves
+                export = export_pages(pages, task_id, export_format)
+                export.update({
+                    "task_id": task_id,
+                    "offset": offset,
+                    "filter_status": filter_status,
+                    "max_concurrency": max_concurrency,
+                    "download_path": f"/verify_bulk/v4/export?export_id={export['export_id']}",
+                })
+                return Response(
+                    data=export,
+                    metadata={"status": "success"}
+                )
+            # A page that fails after the headers went out ends the body with
+            # an error record and the offset to resume from
+            encode, mimetype = STREAM_FORMATS[output_format]
+            body = iter_with_error_record(encode, pages, offset, limit, output_format)
+            return FlaskResponse(
+                stream_with_context(body),
+                mimetype=mimetype,
+                headers={
+                    "Content-Disposition": f'attachment; filename="{task_id}.{output_format}"',
+                    "X-Max-Concurrency": str(max_concurrency)
+                }
+            )
+
         # Make GET request to BounceBan API
-        response = requests.get(url, headers=headers, params=params, timeout=60)
-        response.raise_for_status()
-        
-        result = response.json()
-        # print(f"API response: {result}")  # Debugging line to check API response structure
+        items = fetch_dump_page(dev_studio_api_key, task_id, offset, limit, filter_status)
+        result_store.put_many(dev_studio_api_key, items, task_id)
         # Extract results data from response
         results_data = {
             "task_id": task_id,
-            "total_results": len(result.get("items", [])),
-            "returned_results": len(result.get("items", [])),
+            "total_results": len(items),
+            "returned_results": len(items),
             "offset": offset,
             "limit": limit,
             "filter_status": "all",
-            "results": []
         }
-
-        for email_result in result.get("items", []):
-            processed_result = {
-                "email": email_result.get("email"),
-                "result": email_result.get("result"),
-                "result_code": email_result.get("result_code"),
-                "score": email_result.get("score"),
-                "is_catchall": email_result.get("is_catchall"),
-                "is_disposable": email_result.get("is_disposable"),
-                "is_role": email_result.get("is_role"),
-                "is_free": email_result.get("is_free"),
-                "is_seg_protected": email_result.get("is_seg_protected"),
-                "message": email_result.get("message"),
-                "mx_records": email_result.get("mx_records"),
-                "smtp_provider": email_result.get("smtp_provider"),
-                "verified_at": email_result.get("verify_at")  # Notice: it's 'verify_at' not 'verified_at'
-            }
-            results_data["results"].append(processed_result)
+        if output_format == "columns":
+            # One array per field instead of one object per email
+            results_data["columns"] = RESULT_COLUMNS
+            results_data["results"] = ResultColumns(items).to_dict()
+        else:
+            results_data["results"] = [format_result(email_result) for email_result in items]
 
         return Response(
             data=results_data,
@@ -132,6 +241,19 @@ def execute():
             metadata={"status": "failed"}
         )
 
+@router.route("/export", methods=["GET"])
+def download_export():
+    """Serve a file written by output_format "export". Range requests are
+    supported, so a downstream step can read a large export in pieces."""
+    path = export_path(flask_request.args.get("export_id"))
+    if path is None or not os.path.isfile(path):
+        return Response(
+            data={"error": "Export not found or expired"},
+            metadata={"status": "failed"},
+            status_code=404
+        )
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path), conditional=True)
+
 # @router.route("/content", methods=["GET", "POST"])
 # def content():
 #     """
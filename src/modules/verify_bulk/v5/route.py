@@ -1,6 +1,7 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
 from main import router
+from src.bounceban.bulk import destroy_bulk_task
 import os
 import requests
 
@@ -41,26 +42,9 @@ def execute():
             metadata={"status": "failed"}
         )
     
-    # BounceBan API endpoint for deleting bulk task
-    url = "https://api.bounceban.com/v1/verify/bulk/destroy"
-    
-    # Headers for BounceBan API (using Authorization without Bearer prefix)
-    headers = {
-        "Authorization": dev_studio_api_key,
-        "Content-Type": "application/json"
-    }
-    
-    # Request body
-    payload = {
-        "id": task_id
-    }
-    
     try:
         # Make POST request to BounceBan API
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = destroy_bulk_task(dev_studio_api_key, task_id)
         
         # Extract deletion result from response
         deletion_data = {
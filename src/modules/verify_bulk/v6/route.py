@@ -0,0 +1,212 @@
+from workflows_cdk import Request, Response
+from flask import request as flask_request
+from main import router
+from src.bounceban import jobs
+from src.bounceban.bulk import MAX_EMAILS_PER_TASK, prefilter_emails
+from src.bounceban.lifecycle import (
+    LIFECYCLE_FORMATS, RunBusyError, advance, describe_run, load_run, new_run, run_lock, save_run
+)
+from src.bounceban.polling import MAX_WAIT_SECONDS
+import requests
+import time
+
+# Default time one step spends on the run before handing back its run ID
+DEFAULT_WAIT_SECONDS = min(240, MAX_WAIT_SECONDS)
+
+def extract_api_key(api_connection: dict) -> str:
+    if not api_connection:
+        return None
+    return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
+
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, requests.exceptions.Timeout):
+        return "Request timeout"
+    if isinstance(e, requests.exceptions.RequestException):
+        return f"API request failed: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+
+@jobs.handler("verify_bulk/v6")
+def run_in_background(api_key: str, payload: dict, report) -> dict:
+    """Job version of the module: advance the run until it is done, with no time budget."""
+    run_id = payload["run_id"]
+    while True:
+        try:
+            with run_lock(run_id):
+                state = load_run(run_id, api_key)
+                if state is None:
+                    raise ValueError("Run not found or expired")
+                state = advance(api_key, state, time.monotonic() + MAX_WAIT_SECONDS, emails_raw=payload.get("emails"))
+        except RunBusyError:
+            # A foreground step is working on the run; let it finish its turn.
+            # Nothing was read, so there is nothing to report yet
+            time.sleep(5)
+            continue
+        report(describe_run(state))
+        if state["stage"] == "failed":
+            raise RuntimeError(state.get("error") or "Run failed")
+        if state["stage"] == "done":
+            return describe_run(state)
+
+
+def run_metadata_status(stage: str) -> str:
+    if stage == "done":
+        return "success"
+    elif stage == "failed":
+        return "failed"
+    else:
+        return "still processing"
+
+
+@router.route("/execute", methods=["POST", "GET"])
+def execute():
+    request = Request(flask_request)
+    data = request.data
+
+    run_id = data.get("run_id")
+    task_id = data.get("id")
+    emails_raw = data.get("emails", "")
+    if not isinstance(emails_raw, str):
+        return Response(
+            data={"error": "Emails must be provided as a newline-separated list"},
+            metadata={"status": "failed"}
+        )
+
+    max_wait_seconds = data.get("max_wait_seconds") or DEFAULT_WAIT_SECONDS
+    if not isinstance(max_wait_seconds, int) or max_wait_seconds < 1 or max_wait_seconds > MAX_WAIT_SECONDS:
+        return Response(
+            data={"error": f"Max wait seconds must be between 1 and {MAX_WAIT_SECONDS}"},
+            metadata={"status": "failed"}
+        )
+    deadline = time.monotonic() + max_wait_seconds
+
+    # Get API key from connection or environment
+    dev_studio_api_key = extract_api_key(data.get("api_connection"))
+    if not dev_studio_api_key:
+        return Response(
+            data={"error": "API key is required"},
+            metadata={"status": "failed"}
+        )
+
+    prefilter = None
+    if run_id:
+        # Resume a run started by an earlier step
+        state = load_run(run_id, dev_studio_api_key)
+        if state is None:
+            return Response(
+                data={"error": "Run not found or expired"},
+                metadata={"status": "failed"}
+            )
+        if state["stage"] == "submit" and not emails_raw.strip():
+            return Response(
+                data={"error": "This run has not submitted its emails yet; pass the email list again"},
+                metadata={"status": "failed"}
+            )
+    else:
+        export_format = data.get("export_format", "ndjson")
+        if export_format not in LIFECYCLE_FORMATS:
+            return Response(
+                data={"error": f"Export format must be one of: {', '.join(LIFECYCLE_FORMATS)}"},
+                metadata={"status": "failed"}
+            )
+        filter_status = data.get("filter_status", "all")
+        valid_filters = ["all", "deliverable", "undeliverable", "risky", "unknown"]
+        if filter_status not in valid_filters:
+            return Response(
+                data={"error": f"Filter status must be one of: {', '.join(valid_filters)}"},
+                metadata={"status": "failed"}
+            )
+
+        if not task_id:
+            # Same checks as the submit module, before anything is billed
+            prefilter = prefilter_emails(emails_raw, keep=True)
+            if not prefilter.count_lines:
+                return Response(
+                    data={"error": "Either an email list or a task ID is required"},
+                    metadata={"status": "failed"}
+                )
+            if not prefilter.count_unique:
+                return Response(
+                    data={
+                        "error": "No valid email addresses found",
+                        "count_invalid": prefilter.count_invalid,
+                        "invalid_emails": prefilter.invalid_emails
+                    },
+                    metadata={"status": "failed"}
+                )
+            if prefilter.count_unique > MAX_EMAILS_PER_TASK:
+                return Response(
+                    data={"error": "Maximum 500,000 emails allowed per bulk task"},
+                    metadata={"status": "failed"}
+                )
+
+        state = new_run(
+            dev_studio_api_key,
+            task_id=task_id,
+            task_name=data.get("task_name") or "Bulk Verification Task",
+            export_format=export_format,
+            filter_status=filter_status,
+            destroy=bool(data.get("destroy_task", False))
+        )
+        if prefilter is not None:
+            state["count_duplicates_removed"] = prefilter.count_duplicates_removed
+            state["count_invalid"] = prefilter.count_invalid
+
+    if data.get("background"):
+        # Hand the run to a background job; jobs/v1 reports on it. The run ID
+        # can still be passed to this module later to continue in the foreground
+        save_run(state)
+        job_id = jobs.enqueue("verify_bulk/v6", dev_studio_api_key, {
+            "run_id": state["run_id"],
+            "emails": emails_raw if state["stage"] == "submit" else None,
+        })
+        return Response(
+            data=dict(describe_run(state), job_id=job_id, job_status="queued"),
+            metadata={
+                "status": "still processing",
+                "run_id": state["run_id"],
+                "stage": state["stage"],
+                "job_id": job_id
+            }
+        )
+
+    try:
+        with run_lock(state["run_id"]):
+            if run_id:
+                # Re-read under the lock in case a concurrent step moved it on
+                # (or the checkpoint expired in between)
+                current = load_run(run_id, dev_studio_api_key)
+                if current is None:
+                    return Response(
+                        data={"error": "Run not found or expired"},
+                        metadata={"status": "failed"}
+                    )
+                state = current
+            # A new run submits the emails the pre-filter already kept
+            state = advance(
+                dev_studio_api_key, state, deadline, emails_raw=emails_raw,
+                emails=prefilter.emails if prefilter is not None else None
+            )
+    except RunBusyError as e:
+        return Response(
+            data={"error": str(e), "run_id": state["run_id"]},
+            metadata={"status": "still processing", "run_id": state["run_id"], "stage": state["stage"]}
+        )
+    except Exception as e:
+        # Progress up to the last completed step is kept; pass the run ID to resume
+        data = describe_run(state)
+        data["error"] = describe_error(e)
+        return Response(
+            data=data,
+            metadata={"status": "failed", "run_id": state["run_id"], "stage": state["stage"]}
+        )
+
+    return Response(
+        data=describe_run(state),
+        metadata={
+            "status": run_metadata_status(state["stage"]),
+            "run_id": state["run_id"],
+            "stage": state["stage"]
+        }
+    )
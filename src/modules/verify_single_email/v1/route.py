@@ -1,6 +1,8 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
 from main import router
+from src.bounceban.results import result_store
+from src.bounceban.single import submit_single
 import os
 import requests
 
@@ -31,26 +33,13 @@ def execute():
             metadata={"status": "failed"}
         )
     
-    # BounceBan API endpoint for single email verification
-    url = "https://api.bounceban.com/v1/verify/single"
-    
-    # Headers for BounceBan API (using Authorization without Bearer prefix)
-    headers = {
-        "Authorization": dev_studio_api_key,
-        "Content-Type": "application/json"
-    }
-    
-    # Query parameters
-    params = {
-        "email": email
-    }
-    
     try:
-        # Make GET request to BounceBan API
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
+        # A fresh earlier result makes the upstream call unnecessary
+        result = result_store.get(dev_studio_api_key, email)
+        cached = result is not None
+        if not cached:
+            # Make GET request to BounceBan API
+            result = submit_single(dev_studio_api_key, email)
         
         # Extract verification data from response
         verification_data = {
@@ -77,7 +66,7 @@ def execute():
         print(f"Verification data: {verification_data}")
         return Response(
             data=verification_data,
-            metadata={"status": metadata_status}
+            metadata={"status": metadata_status, "cached": cached}
         )
         
     except requests.exceptions.Timeout:
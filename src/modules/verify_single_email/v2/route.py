@@ -1,14 +1,20 @@
 from workflows_cdk import Request, Response
 from flask import request as flask_request
 from main import router
+from src.bounceban.polling import MAX_WAIT_SECONDS, poll_until
+from src.bounceban.single import fetch_single_status, format_single_result, is_final, single_metadata_status
 import os
 import requests
 
+# Default wait when wait_for_result is set without max_wait_seconds
+DEFAULT_WAIT_SECONDS = min(60, MAX_WAIT_SECONDS)
+
 def extract_api_key(api_connection: dict) -> str:
     if not api_connection:
         return None
     return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
 
+
 @router.route("/execute", methods=["POST", "GET"])
 def execute():
     request = Request(flask_request)
@@ -23,6 +29,17 @@ def execute():
             metadata={"status": "failed"}
         )
     print(f"Received verification ID: {verification_id}")
+
+    # Optional: poll until the result is final (catch-all and SEG-protected
+    # emails can take a while) instead of returning "still processing"
+    wait = bool(data.get("wait_for_result", False))
+    max_wait_seconds = data.get("max_wait_seconds") or DEFAULT_WAIT_SECONDS
+    if not isinstance(max_wait_seconds, int) or max_wait_seconds < 1 or max_wait_seconds > MAX_WAIT_SECONDS:
+        return Response(
+            data={"error": f"Max wait seconds must be between 1 and {MAX_WAIT_SECONDS}"},
+            metadata={"status": "failed"}
+        )
+
     # Get API key from connection or environment
     dev_studio_api_key = extract_api_key(data.get("api_connection"))
     if not dev_studio_api_key:
@@ -30,70 +47,29 @@ def execute():
             data={"error": "API key is required"},
             metadata={"status": "failed"}
         )
-    # BounceBan API endpoint for retrieving verification results
-    url = "https://api.bounceban.com/v1/verify/single/status"
-    
-    # Headers for BounceBan API (using Authorization without Bearer prefix)
-    headers = {
-        "Authorization": dev_studio_api_key,
-        "Content-Type": "application/json"
-    }
-    
-    # Query parameters
-    params = {
-        "id": verification_id
-    }
-    print(f"Making request to BounceBan API with params: {params}")
+    print(f"Making request to BounceBan API for verification ID: {verification_id}")
     try:
-        # Make GET request to BounceBan API
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
+        if wait:
+            result, polls, finished, _ = poll_until(
+                lambda: fetch_single_status(dev_studio_api_key, verification_id),
+                is_final,
+                max_wait=max_wait_seconds,
+                name="verify_single_email/v2"
+            )
+        else:
+            result = fetch_single_status(dev_studio_api_key, verification_id)
         print(f"API response: {result}")
-        # Extract verification result data
-        verification_result = {
-            "verification_id": verification_id,
-            "email": result.get("email"),
-            "status": result.get("status"),
-            "result": result.get("result"),
-            "result_code": result.get("result_code"),
-            "score": result.get("score"),
-            "is_catchall": result.get("is_catchall"),
-            "is_disposable": result.get("is_disposable"),
-            "is_role": result.get("is_role"),
-            "is_free": result.get("is_free"),
-            "is_seg_protected": result.get("is_seg_protected"),
-            "message": result.get("message"),
-            "details": result.get("details"),
-            "mx_records": result.get("mx_records"),
-            "smtp_provider": result.get("smtp_provider"),
-            "timestamp": result.get("timestamp"),
-            "completed_at": result.get("completed_at")
+
+        metadata = {
+            "status": single_metadata_status(result),
+            "verification_status": result.get("result", "unknown")
         }
-        
-        # Determine metadata status based on verification status
-        if result.get("status") == "completed":
-            # Map result to metadata status
-            if result.get("result") in ["deliverable", "valid"]:
-                metadata_status = "success"
-            elif result.get("result") in ["undeliverable", "invalid"]:
-                metadata_status = "failed"
-            elif result.get("result") in ["risky", "catchall", "unknown"]:
-                metadata_status = "success"  # Still success but with warnings
-            else:
-                metadata_status = "success"
-        elif result.get("status") == "processing":
-            metadata_status = "still processing"
-        else:
-            metadata_status = "failed"
+        if wait:
+            metadata["polls"] = polls
         
         return Response(
-            data=verification_result,
-            metadata={
-                "status": metadata_status,
-                "verification_status": result.get("result", "unknown")
-            }
+            data=format_single_result(verification_id, result),
+            metadata=metadata
         )
         
     except requests.exceptions.Timeout:
@@ -0,0 +1,80 @@
+from workflows_cdk import Request, Response
+from flask import request as flask_request
+from main import router
+from src.bounceban.bulk import normalize_email
+from src.bounceban.polling import MAX_WAIT_SECONDS
+from src.bounceban.single import format_single_result, single_metadata_status, verify_shared
+import requests
+
+# Default wait when max_wait_seconds is not set
+DEFAULT_WAIT_SECONDS = min(60, MAX_WAIT_SECONDS)
+
+def extract_api_key(api_connection: dict) -> str:
+    if not api_connection:
+        return None
+    return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
+
+
+@router.route("/execute", methods=["POST", "GET"])
+def execute():
+    request = Request(flask_request)
+    data = request.data
+    # Get the email to verify
+    email = normalize_email(data.get("email") or "")
+    if not email:
+        return Response(
+            data={"error": "A valid email address is required"},
+            metadata={"status": "failed"}
+        )
+
+    max_wait_seconds = data.get("max_wait_seconds") or DEFAULT_WAIT_SECONDS
+    if not isinstance(max_wait_seconds, int) or max_wait_seconds < 1 or max_wait_seconds > MAX_WAIT_SECONDS:
+        return Response(
+            data={"error": f"Max wait seconds must be between 1 and {MAX_WAIT_SECONDS}"},
+            metadata={"status": "failed"}
+        )
+
+    # Get API key from connection or environment
+    dev_studio_api_key = extract_api_key(data.get("api_connection"))
+    if not dev_studio_api_key:
+        return Response(
+            data={"error": "API key is required"},
+            metadata={"status": "failed"}
+        )
+
+    try:
+        # Concurrent requests for the same email and API key share one upstream call
+        (verification_id, result, polls, finished, cached), shared = verify_shared(
+            dev_studio_api_key, email, max_wait_seconds, "verify_single_email/v3"
+        )
+
+        verification_data = format_single_result(verification_id, result)
+        if not verification_data["email"]:
+            verification_data["email"] = email
+
+        return Response(
+            data=verification_data,
+            metadata={
+                "status": single_metadata_status(result),
+                "verification_status": result.get("result", "unknown"),
+                "polls": polls,
+                "cached": cached,
+                "shared_request": shared
+            }
+        )
+
+    except requests.exceptions.Timeout:
+        return Response(
+            data={"error": "Request timeout"},
+            metadata={"status": "failed"}
+        )
+    except requests.exceptions.RequestException as e:
+        return Response(
+            data={"error": f"API request failed: {str(e)}"},
+            metadata={"status": "failed"}
+        )
+    except Exception as e:
+        return Response(
+            data={"error": f"Unexpected error: {str(e)}"},
+            metadata={"status": "failed"}
+        )
@@ -0,0 +1,185 @@
+from workflows_cdk import Request, Response
+from flask import request as flask_request
+from main import router
+from src.bounceban import client, task_index
+from src.bounceban.batch import run_concurrently
+from src.bounceban.bulk import PrefilterStats, iter_unique_emails, submit_bulk_task
+from src.bounceban.polling import MAX_WAIT_SECONDS
+from src.bounceban.single import WaitTimeUp, format_single_result, single_metadata_status, verify_before
+import os
+import time
+import requests
+
+# Default wait for the whole list when max_wait_seconds is not set
+DEFAULT_WAIT_SECONDS = min(120, MAX_WAIT_SECONDS)
+
+# Parallel single verifications per step. Accepted up to MAX_CONCURRENCY but
+# run at most BOUNCEBAN_POOL_SIZE at a time, so every call reuses a pooled
+# connection instead of opening (and dropping) one outside the pool.
+DEFAULT_CONCURRENCY = int(os.environ.get("BOUNCEBAN_SINGLE_CONCURRENCY", "10"))
+MAX_CONCURRENCY = 50
+
+# Above this many emails a bulk task is cheaper than single verifications
+MAX_BULK_THRESHOLD = 500
+
+def extract_api_key(api_connection: dict) -> str:
+    if not api_connection:
+        return None
+    return api_connection.get("connection_data", {}).get("value", {}).get("api_key_bearer")
+
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, requests.exceptions.Timeout):
+        return "Request timeout"
+    if isinstance(e, requests.exceptions.RequestException):
+        return f"API request failed: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+
+def get_int(data: dict, field: str, default: int, maximum: int):
+    value = data.get(field) or default
+    if not isinstance(value, int) or value < 1 or value > maximum:
+        return None
+    return value
+
+
+@router.route("/execute", methods=["POST", "GET"])
+def execute():
+    request = Request(flask_request)
+    data = request.data
+    # Get the list of emails to verify
+    emails_raw = data.get("emails", "")
+    if not isinstance(emails_raw, str):
+        return Response(
+            data={"error": "Emails must be provided as a newline-separated list"},
+            metadata={"status": "failed"}
+        )
+    prefilter = PrefilterStats()
+    emails = list(iter_unique_emails(emails_raw, prefilter))
+    if not emails:
+        return Response(
+            data={
+                "error": "A valid list of email addresses is required",
+                "count_invalid": prefilter.count_invalid,
+                "invalid_emails": prefilter.invalid_emails
+            },
+            metadata={"status": "failed"}
+        )
+
+    max_wait_seconds = get_int(data, "max_wait_seconds", DEFAULT_WAIT_SECONDS, MAX_WAIT_SECONDS)
+    if max_wait_seconds is None:
+        return Response(
+            data={"error": f"Max wait seconds must be between 1 and {MAX_WAIT_SECONDS}"},
+            metadata={"status": "failed"}
+        )
+    max_concurrency = get_int(data, "max_concurrency", DEFAULT_CONCURRENCY, MAX_CONCURRENCY)
+    if max_concurrency is None:
+        return Response(
+            data={"error": f"Max concurrency must be between 1 and {MAX_CONCURRENCY}"},
+            metadata={"status": "failed"}
+        )
+    max_concurrency = min(max_concurrency, client.POOL_SIZE)
+    bulk_threshold = get_int(data, "bulk_threshold", MAX_BULK_THRESHOLD, MAX_BULK_THRESHOLD)
+    if bulk_threshold is None:
+        return Response(
+            data={"error": f"Bulk threshold must be between 1 and {MAX_BULK_THRESHOLD}"},
+            metadata={"status": "failed"}
+        )
+
+    # Get API key from connection or environment
+    dev_studio_api_key = extract_api_key(data.get("api_connection"))
+    if not dev_studio_api_key:
+        return Response(
+            data={"error": "API key is required"},
+            metadata={"status": "failed"}
+        )
+
+    counts = {
+        "count_total": len(emails),
+        "count_duplicates_removed": prefilter.count_duplicates_removed,
+        "count_invalid": prefilter.count_invalid,
+        "invalid_emails": prefilter.invalid_emails
+    }
+
+    if len(emails) > bulk_threshold:
+        # Too many for single verifications: hand the list to a bulk task
+        task_name = data.get("task_name") or "Bulk Verification Task"
+        callback_url, nonce = task_index.new_callback(dev_studio_api_key)
+        try:
+            result = submit_bulk_task(dev_studio_api_key, task_name, emails, url=callback_url)
+        except Exception as e:
+            return Response(
+                data={"error": describe_error(e)},
+                metadata={"status": "failed"}
+            )
+        task_index.record_submission(dev_studio_api_key, result, nonce)
+        return Response(
+            data={
+                "mode": "bulk",
+                "task_id": result.get("id"),
+                "task_name": task_name,
+                "status": result.get("status"),
+                **counts
+            },
+            metadata={"status": "success", "mode": "bulk"}
+        )
+
+    # One deadline for the whole list; emails that start late get what is
+    # left, and those that start after it are not submitted at all
+    deadline = time.monotonic() + max_wait_seconds
+    outcomes = run_concurrently(
+        lambda email: verify_before(dev_studio_api_key, email, deadline, "verify_single_email/v4"),
+        emails, max_workers=max_concurrency
+    )
+
+    results = []
+    count_final = 0
+    count_failed = 0
+    count_cached = 0
+    skipped = []
+    for email, outcome, error in outcomes:
+        if isinstance(error, WaitTimeUp):
+            skipped.append(email)
+            results.append({"email": email, "status": "skipped", "metadata_status": "skipped"})
+            continue
+        if error is not None:
+            count_failed += 1
+            results.append({"email": email, "error": describe_error(error), "metadata_status": "failed"})
+            continue
+        verification_id, result, _, finished, cached = outcome
+        if finished:
+            count_final += 1
+        if cached:
+            count_cached += 1
+        item = format_single_result(verification_id, result)
+        if not item["email"]:
+            item["email"] = email
+        item["metadata_status"] = single_metadata_status(result)
+        results.append(item)
+
+    count_pending = len(emails) - count_final - count_failed - len(skipped)
+    if count_failed == len(emails):
+        metadata_status = "failed"
+    elif count_pending or skipped:
+        metadata_status = "still processing"
+    else:
+        metadata_status = "success"
+
+    single_data = {
+        "mode": "single",
+        **counts,
+        "count_final": count_final,
+        "count_pending": count_pending,
+        "count_failed": count_failed,
+        "count_cached": count_cached,
+        "count_skipped": len(skipped),
+        "max_concurrency": max_concurrency,
+        "results": results
+    }
+    if skipped:
+        # Out of time: a following step can pass these back as its emails
+        single_data["skipped_emails"] = "\n".join(skipped)
+    return Response(
+        data=single_data,
+        metadata={"status": metadata_status, "mode": "single"}
+    )
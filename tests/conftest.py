@@ -0,0 +1,32 @@
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    """Start a stand-in BounceBan server (``make_server`` options) and point the client at it."""
+    from loadtest.stand_in import make_server
+    from src.bounceban import client, resilience
+
+    servers = []
+    # Tests share one API key; keep the rate limit out of their way
+    monkeypatch.setattr(resilience, "RATE_LIMIT", 0)
+
+    def start(**options):
+        server = make_server("127.0.0.1", 0, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(client, "BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,46 @@
+from src.bounceban import bulk
+from src.bounceban.bulk import PrefilterStats, iter_unique_emails, normalize_email
+
+
+def unique(text: str):
+    stats = PrefilterStats()
+    return list(iter_unique_emails(text, stats)), stats
+
+
+def test_duplicates_are_dropped_after_normalization():
+    emails, stats = unique("a@x.com\n  a@X.COM \n\nA@x.com\nb@x.com\na@x.com")
+    assert emails == ["a@x.com", "A@x.com", "b@x.com"]
+    assert (stats.count_lines, stats.count_unique, stats.count_duplicates_removed) == (5, 3, 2)
+
+
+def test_every_distinct_email_is_kept():
+    emails = [f"user{i}@example.com" for i in range(100000)]
+    assert unique("\n".join(emails + emails))[0] == emails
+
+
+def test_internationalized_domains_are_sent_as_idna():
+    assert normalize_email("Joe@Bücher.DE") == "Joe@xn--bcher-kva.de"
+    assert normalize_email("a@пример.рф") == "a@xn--e1afmkfd.xn--p1ai"
+    emails, stats = unique("joe@bücher.de\njoe@xn--bcher-kva.de\nb@x.com")
+    assert emails == ["joe@xn--bcher-kva.de", "b@x.com"]
+    assert stats.count_invalid == 0
+
+
+def test_malformed_lines_are_counted_and_sampled_in_order():
+    emails, stats = unique("a@x.com\nnope\nb@@x.com\nc@x.com\nü@x.com")
+    assert emails == ["a@x.com", "c@x.com"]
+    assert stats.count_invalid == 3
+    assert stats.invalid_emails == ["nope", "b@@x.com", "ü@x.com"]
+
+
+def test_order_holds_across_blocks(monkeypatch):
+    monkeypatch.setattr(bulk.iter_blocks, "__defaults__", (16,))
+    text = "\n".join(["a@x.com", "bad", "b@bücher.de", "a@x.com", "c@x.com"] * 3)
+    assert unique(text)[0] == ["a@x.com", "b@xn--bcher-kva.de", "c@x.com"]
+
+
+def test_prefilter_keeps_the_emails_it_counted():
+    stats = bulk.prefilter_emails("b@x.com\na@x.com\nb@x.com\nbad", keep=True)
+    assert stats.emails == ["b@x.com", "a@x.com"]
+    assert (stats.count_unique, stats.count_duplicates_removed, stats.count_invalid) == (2, 1, 1)
+    assert bulk.prefilter_emails("a@x.com").emails is None
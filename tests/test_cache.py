@@ -0,0 +1,71 @@
+import pytest
+
+from src.bounceban import cache, metrics
+from src.bounceban.cache import SQLiteCache, TieredCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    store = TTLCache(maxsize=10, ttl=5)
+    store.set("a", 1)
+    assert store.get("a") == 1
+    clock[0] += 5
+    assert store.get("a") is None
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    store = TTLCache(maxsize=2, ttl=60)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")  # "b" is now the oldest
+    store.set("c", 3)
+    assert store.get("b") is None
+    assert store.get("a") == 1 and store.get("c") == 3
+    assert store.stats()["evictions"] == 1
+
+
+def test_sqlite_cache_expires_and_prunes(tmp_path, clock):
+    store = SQLiteCache(str(tmp_path / "cache.sqlite3"), "test", maxsize=2, ttl=5)
+    store.set("a", {"value": 1})
+    assert store.get("a") == {"value": 1}
+    clock[0] += 1
+    store.set("b", 2)
+    clock[0] += 1
+    store.set("c", 3)
+    store.prune()
+    assert store.get("a") is None
+    clock[0] += 10
+    assert store.get("c") is None
+
+
+def test_tiered_cache_keeps_the_shared_expiry(tmp_path, clock):
+    shared = SQLiteCache(str(tmp_path / "cache.sqlite3"), "test", maxsize=10, ttl=10)
+    shared.set("a", "value")
+    clock[0] += 8
+    tiered = TieredCache(TTLCache(10, 10), shared)
+    assert tiered.get("a") == "value"
+    # Copied into memory with the 2 seconds the shared entry had left
+    clock[0] += 3
+    assert tiered.memory.get("a") is None
+
+
+def test_tiered_cache_counts_lookups(clock):
+    def count(outcome):
+        return metrics.REGISTRY.get_sample_value(
+            "bounceban_cache_lookups_total", {"cache": "test_counts", "outcome": outcome}
+        ) or 0.0
+
+    tiered = TieredCache(TTLCache(10, 10), name="test_counts")
+    tiered.get("a")
+    tiered.set("a", 1)
+    tiered.get("a")
+    assert count("miss") == 1
+    assert count("hit_memory") == 1
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from src.bounceban import check
+from src.bounceban.cache import TieredCache, TTLCache
+
+
+@pytest.fixture
+def checks(monkeypatch, stand_in):
+    monkeypatch.setattr(check, "check_cache", TieredCache(TTLCache(ttl=60, maxsize=100), name="check"))
+    stand_in()
+    return check
+
+
+def test_cache_hit_reports_no_credits(checks):
+    result, cache_status = checks.fetch_check("key", "a@example.com")
+    assert cache_status == "miss"
+    fresh = checks.format_check("a@example.com", result)
+    assert (fresh["credits_consumed"], fresh["credits_remaining"], fresh["cached"]) == (0, 100000, False)
+
+    result, cache_status = checks.fetch_check("key", "a@example.com")
+    assert cache_status == "hit"
+    hit = checks.format_check("a@example.com", result, cached=True)
+    assert (hit["credits_consumed"], hit["credits_remaining"], hit["cached"]) == (0, None, True)
+    assert (hit["raw"]["credits_consumed"], hit["raw"]["credits_remaining"]) == (0, None)
+    # The cached entry itself keeps what BounceBan said
+    assert checks.fetch_check("key", "a@example.com")[0]["credits_remaining"] == 100000
+
+
+def test_cache_is_per_api_key(checks):
+    checks.fetch_check("key", "example.com")
+    assert checks.fetch_check("other-key", "example.com")[1] == "miss"
+
+
+def test_past_the_deadline_only_hits_are_answered(checks):
+    checks.fetch_check("key", "a@example.com")
+    past = time.monotonic() - 1
+    assert checks.fetch_check("key", "a@example.com", past)[1] == "hit"
+    with pytest.raises(checks.BatchTimeUp):
+        checks.fetch_check("key", "b@example.com", past)
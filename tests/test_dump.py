@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from src.bounceban import dump, jsonio
+
+
+def fake_pages(monkeypatch, total: int, fail_at=None, delays=None):
+    """Serve ``total`` rows through ``fetch_dump_page``; ``fail_at`` offsets raise."""
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(api_key, task_id, offset, limit, filter_status="all", retries=None):
+        with lock:
+            calls.append(offset)
+        if delays:
+            time.sleep(delays.get(offset, 0))
+        if fail_at is not None and offset in fail_at:
+            raise requests.exceptions.ConnectionError(f"page {offset} failed")
+        return [{"email": f"user{i}@example.com", "result": "deliverable"}
+                for i in range(offset, min(offset + limit, total))]
+
+    monkeypatch.setattr(dump, "fetch_dump_page", fetch)
+    return calls
+
+
+def emails(pages):
+    return [item["email"] for _, items in pages for item in items]
+
+
+def test_sequential_pages_cover_the_task(monkeypatch):
+    fake_pages(monkeypatch, total=25)
+    pages = list(dump.iter_dump_pages("key", "task", 0, 10))
+    assert [offset for offset, _ in pages] == [0, 10, 20]
+    assert emails(pages) == [f"user{i}@example.com" for i in range(25)]
+
+
+def test_parallel_pages_are_yielded_in_offset_order(monkeypatch):
+    # Early pages answer last, so later pages arrive first
+    fake_pages(monkeypatch, total=55, delays={0: 0.05, 10: 0.03})
+    pages = list(dump.iter_dump_pages_parallel("key", "task", 0, 10, max_concurrency=4))
+    assert [offset for offset, _ in pages] == [0, 10, 20, 30, 40, 50]
+    assert emails(pages) == [f"user{i}@example.com" for i in range(55)]
+
+
+def test_parallel_pages_stop_at_a_failed_page(monkeypatch):
+    fake_pages(monkeypatch, total=50, fail_at={20})
+    monkeypatch.setattr(dump, "retry_delay", lambda error, attempt: None)
+    seen = []
+    with pytest.raises(requests.exceptions.ConnectionError):
+        for page in dump.iter_dump_pages_parallel("key", "task", 0, 10, max_concurrency=4):
+            seen.append(page[0])
+    # Nothing after the failed page is handed out
+    assert seen == [0, 10]
+
+
+def test_ndjson_stream_ends_with_an_error_record(monkeypatch):
+    fake_pages(monkeypatch, total=50, fail_at={20})
+    pages = dump.iter_dump_pages("key", "task", 0, 10)
+    lines = b"".join(dump.iter_with_error_record(dump.iter_ndjson, pages, 0, 10)).splitlines()
+    rows = [jsonio.loads(line) for line in lines]
+    assert [row["email"] for row in rows[:-1]] == [f"user{i}@example.com" for i in range(20)]
+    assert rows[-1]["next_offset"] == 20
+    assert "page 20 failed" in rows[-1]["error"]
+
+
+def test_csv_stream_ends_with_an_error_comment(monkeypatch):
+    fake_pages(monkeypatch, total=50, fail_at={10})
+    pages = dump.iter_dump_pages("key", "task", 0, 10)
+    lines = b"".join(dump.iter_with_error_record(dump.iter_csv, pages, 0, 10, "csv")).decode().splitlines()
+    assert lines[0].startswith("email,")
+    assert len(lines) == 1 + 10 + 1
+    assert lines[-1].startswith("# error: ") and lines[-1].endswith("next_offset=10")
+
+
+def test_complete_stream_has_no_error_record(monkeypatch):
+    fake_pages(monkeypatch, total=15)
+    pages = dump.iter_dump_pages("key", "task", 0, 10)
+    lines = b"".join(dump.iter_with_error_record(dump.iter_ndjson, pages, 0, 10)).splitlines()
+    assert len(lines) == 15
+    assert all("error" not in jsonio.loads(line) for line in lines)
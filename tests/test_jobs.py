@@ -0,0 +1,109 @@
+import sqlite3
+import time
+
+import pytest
+
+from src.bounceban import jobs
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_local", jobs.threading.local())
+    monkeypatch.setattr(jobs, "_handlers", {})
+    # Jobs are run by hand here, not by background threads
+    monkeypatch.setattr(jobs, "start_workers", lambda count=None: None)
+    return jobs
+
+
+def run_next(queue):
+    job = queue.claim()
+    assert job is not None
+    queue.run_job(*job)
+    return job[0]
+
+
+def test_job_result_and_key_cleared(queue):
+    @queue.handler("double")
+    def double(api_key, payload, report):
+        report({"step": 1})
+        return {"value": payload["value"] * 2}
+
+    job_id = queue.enqueue("double", "secret", {"value": 21})
+    run_next(queue)
+    job = queue.get_job(job_id, "secret")
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"value": 42}
+    assert queue.get_job(job_id, "someone-else") is None
+    rows = queue._connection().execute("SELECT api_key, payload FROM jobs").fetchall()
+    assert rows == [("", "{}")]
+
+
+def test_handler_error_fails_the_job(queue):
+    @queue.handler("broken")
+    def broken(api_key, payload, report):
+        raise RuntimeError("boom")
+
+    job_id = queue.enqueue("broken", "secret", {"emails": "a@x.com\nb@x.com"})
+    run_next(queue)
+    job = queue.get_job(job_id, "secret")
+    assert job["status"] == "failed"
+    assert "boom" in job["error"]
+    assert queue._connection().execute("SELECT payload FROM jobs").fetchall() == [("{}",)]
+
+
+def test_database_error_while_saving_does_not_escape(queue, monkeypatch):
+    @queue.handler("ok")
+    def ok(api_key, payload, report):
+        return {}
+
+    job_id = queue.enqueue("ok", "secret", {})
+    job = queue.claim()
+    real_finish = queue._finish
+    calls = []
+
+    def finish(job_id, result=None, error=None):
+        calls.append(error)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        real_finish(job_id, result, error)
+
+    monkeypatch.setattr(queue, "_finish", finish)
+    queue.run_job(*job)
+    assert queue.get_job(job_id, "secret")["status"] == "failed"
+    assert "database is locked" in queue.get_job(job_id, "secret")["error"]
+    assert not queue._running
+
+
+def test_stale_job_is_requeued_then_failed(queue, monkeypatch):
+    @queue.handler("slow")
+    def slow(api_key, payload, report):
+        return {}
+
+    monkeypatch.setattr(queue, "JOB_MAX_ATTEMPTS", 2)
+    job_id = queue.enqueue("slow", "secret", {})
+    assert queue.claim()[0] == job_id
+    # The worker "dies": no heartbeat, no finish
+    later = time.time() + queue.JOB_STALE_SECONDS + 1
+    monkeypatch.setattr(queue.time, "time", lambda: later)
+    assert queue.claim()[0] == job_id
+    later += queue.JOB_STALE_SECONDS + 1
+    assert queue.claim() is None
+    job = queue.get_job(job_id, "secret")
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+
+
+def test_scrub_keys_clears_leftovers(queue):
+    @queue.handler("noop")
+    def noop(api_key, payload, report):
+        return {}
+
+    finished = queue.enqueue("noop", "secret", {"emails": "a@x.com"})
+    abandoned = queue.enqueue("noop", "secret", {"emails": "b@x.com"})
+    conn = queue._connection()
+    conn.execute("UPDATE jobs SET status = 'succeeded' WHERE id = ?", (finished,))
+    conn.execute("UPDATE jobs SET created_at = 0 WHERE id = ?", (abandoned,))
+    queue.scrub_keys()
+    assert conn.execute("SELECT api_key, payload FROM jobs WHERE api_key != '' OR payload != '{}'").fetchall() == []
+    assert queue.get_job(abandoned, "secret")["status"] == "failed"
@@ -0,0 +1,106 @@
+import gzip
+import os
+import time
+
+import pytest
+
+from src.bounceban import export, jsonio, lifecycle, task_index
+
+
+@pytest.fixture
+def runs(tmp_path, monkeypatch, stand_in):
+    monkeypatch.setattr(lifecycle, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(lifecycle, "EXPORT_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(task_index, "CALLBACKS_ENABLED", False)
+    monkeypatch.setattr(lifecycle.time, "sleep", lambda seconds: None)
+    stand_in(task_size=25000)
+    return lifecycle
+
+
+def exported_emails(state: dict) -> list:
+    with gzip.open(export.export_path(state["export_id"])) as f:
+        return [jsonio.loads(line)["email"] for line in f]
+
+
+def far_deadline() -> float:
+    return time.monotonic() + 60
+
+
+def test_run_goes_from_submit_to_done(runs):
+    state = runs.new_run("key", task_name="test", destroy=True)
+    state = runs.advance("key", state, far_deadline(), emails_raw="a@example.com\nb@example.com")
+    assert state["stage"] == "done"
+    assert state["destroyed"] is True
+    assert state["rows"] == 25000 and state["pages"] == 3
+    assert exported_emails(state) == [f"user{i}@example.com" for i in range(25000)]
+
+
+def test_interrupted_export_resumes_at_the_last_saved_page(runs, monkeypatch):
+    state = runs.new_run("key", task_id="task")
+    real_save = runs.save_run
+
+    def crash_after_first_page(state):
+        real_save(state)
+        if state["pages"] == 1:
+            raise RuntimeError("worker died")
+
+    monkeypatch.setattr(runs, "save_run", crash_after_first_page)
+    with pytest.raises(RuntimeError):
+        runs.advance("key", state, far_deadline())
+    monkeypatch.setattr(runs, "save_run", real_save)
+
+    state = runs.load_run(state["run_id"], "key")
+    assert (state["stage"], state["pages"], state["next_offset"]) == ("export", 1, 10000)
+    # Bytes written after the checkpoint are cut off on resume
+    with open(export.export_path(state["export_id"]) + ".part", "ab") as f:
+        f.write(b"half a page")
+
+    state = runs.advance("key", state, far_deadline())
+    assert state["stage"] == "done"
+    assert exported_emails(state) == [f"user{i}@example.com" for i in range(25000)]
+
+
+def test_step_out_of_time_leaves_a_resumable_run(runs):
+    state = runs.new_run("key", task_id="task")
+    state = runs.advance("key", state, time.monotonic())
+    assert state["stage"] == "wait"
+    state = runs.advance("key", runs.load_run(state["run_id"], "key"), far_deadline())
+    assert state["stage"] == "done"
+
+
+def test_interrupted_submission_is_not_sent_again(runs):
+    state = runs.new_run("key", task_name="test")
+    state["submit_started_at"] = int(time.time())
+    state = runs.advance("key", state, far_deadline(), emails_raw="a@example.com")
+    assert state["stage"] == "failed"
+    assert state["task_id"] is None
+
+
+def test_runs_are_tied_to_their_api_key(runs):
+    state = runs.new_run("key", task_id="task")
+    runs.save_run(state)
+    assert runs.load_run(state["run_id"], "key")["run_id"] == state["run_id"]
+    assert runs.load_run(state["run_id"], "other-key") is None
+    assert runs.load_run("../etc/passwd", "key") is None
+    os.remove(os.path.join(runs.CHECKPOINT_DIR, f"{state['run_id']}.json"))
+    assert runs.load_run(state["run_id"], "key") is None
+
+
+def test_run_lock_is_exclusive(runs):
+    with runs.run_lock("a" * 32):
+        with pytest.raises(runs.RunBusyError):
+            with runs.run_lock("a" * 32):
+                pass
+
+
+def test_nothing_is_fetched_after_the_deadline(runs, monkeypatch):
+    calls = []
+    monkeypatch.setattr(runs.task_index, "fetch_status", lambda *args: calls.append(args))
+    monkeypatch.setattr(runs, "iter_dump_pages_parallel", lambda *args, **kwargs: calls.append(args))
+    state = runs.new_run("key", task_id="task")
+    runs._wait("key", state, time.monotonic() - 1)
+    state["stage"] = "export"
+    runs._export("key", state, time.monotonic() - 1)
+    assert calls == []
+    assert (state["polls"], state["pages"], state["export_id"]) == (0, 0, None)
@@ -0,0 +1,46 @@
+import json
+
+from flask import Flask, Response as FlaskResponse
+from prometheus_client import REGISTRY
+
+from src.bounceban import metrics
+
+
+class ModuleResponse(FlaskResponse):
+    def __init__(self, data=None, metadata=None):
+        super().__init__(json.dumps({"data": data, "metadata": metadata or {}}), mimetype="application/json")
+
+
+def calls(module: str, outcome: str) -> float:
+    labels = {"module": module, "outcome": outcome}
+    return REGISTRY.get_sample_value("bounceban_execute_requests_total", labels) or 0
+
+
+def test_outcome_is_the_metadata_status_of_the_response():
+    app = Flask(__name__)
+    metrics.instrument_app(app)
+
+    @app.route("/test_module/v1/execute", methods=["POST"])
+    def execute():
+        items = [{"email": f"user{i}@example.com", "metadata": {"status": "nested"}} for i in range(1000)]
+        return ModuleResponse(data={"items": items}, metadata={"status": "partial"})
+
+    @app.route("/test_module/v2/execute", methods=["POST"])
+    def stream():
+        return FlaskResponse(iter([b"{}"]), mimetype="application/x-ndjson")
+
+    before = calls("test_module/v1", "partial"), calls("test_module/v2", "streamed")
+    client = app.test_client()
+    client.post("/test_module/v1/execute")
+    client.post("/test_module/v2/execute")
+    assert calls("test_module/v1", "partial") == before[0] + 1
+    assert calls("test_module/v2", "streamed") == before[1] + 1
+
+
+def test_metadata_status_is_found_before_or_after_the_data():
+    data = {"items": [{"metadata": {"status": "nested"}}] * 3}
+    for body in ({"data": data, "metadata": {"status": "success"}},
+                 {"metadata": {"status": "success"}, "data": data}):
+        assert metrics._metadata_status(json.dumps(body).encode()) == "success"
+    assert metrics._metadata_status(b'{"data": {"email": "\\"metadata\\": x"}}') is None
+    assert metrics._metadata_status(b"not json") is None
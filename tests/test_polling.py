@@ -0,0 +1,57 @@
+import pytest
+
+from src.bounceban import metrics, polling
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(polling.time, "sleep", lambda seconds: None)
+
+
+def sample(name: str, labels: dict) -> float:
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_poll_until_stops_at_a_final_result_and_records_the_wait():
+    answers = iter(["processing", "processing", "done"])
+    before = sample("bounceban_poll_waits_total", {"module": "test/finished", "outcome": "finished"})
+    result, polls, finished, _ = polling.poll_until(
+        lambda: next(answers), lambda answer: answer == "done", max_wait=60, name="test/finished"
+    )
+    assert (result, polls, finished) == ("done", 3, True)
+    assert sample("bounceban_poll_waits_total", {"module": "test/finished", "outcome": "finished"}) == before + 1
+    assert sample("bounceban_polls_per_wait_sum", {"module": "test/finished"}) >= 3
+    assert sample("bounceban_poll_time_to_final_seconds_count", {"module": "test/finished"}) >= 1
+
+
+def test_poll_until_gives_up_at_the_deadline():
+    result, polls, finished, _ = polling.poll_until(
+        lambda: "processing", lambda answer: False, max_wait=0, name="test/timed_out"
+    )
+    assert (result, polls, finished) == ("processing", 1, False)
+    assert sample("bounceban_poll_waits_total", {"module": "test/timed_out", "outcome": "timed_out"}) == 1
+    assert sample("bounceban_poll_time_to_final_seconds_count", {"module": "test/timed_out"}) == 0
+
+
+def test_continuation_round_trip():
+    token = polling.encode_continuation({"id": "task", "delay": 4.0})
+    assert polling.decode_continuation(token) == {"id": "task", "delay": 4.0, "polls": 0}
+    with pytest.raises(ValueError):
+        polling.decode_continuation("not a token")
+
+
+@pytest.mark.parametrize("state", [
+    {"id": "task", "delay": "x"},
+    {"id": "task", "polls": None},
+    {"id": "task", "polls": -1},
+    {"id": "task", "delay": True},
+])
+def test_tampered_continuation_is_rejected(state):
+    with pytest.raises(ValueError, match="Invalid continuation token"):
+        polling.decode_continuation(polling.encode_continuation(state))
+
+
+def test_continuation_delay_is_clamped():
+    for delay, expected in ((-5, polling.INITIAL_DELAY), (1e9, polling.MAX_DELAY), (4, 4.0)):
+        token = polling.encode_continuation({"id": "task", "delay": delay, "polls": 3})
+        assert polling.decode_continuation(token) == {"id": "task", "delay": expected, "polls": 3}
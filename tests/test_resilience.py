@@ -0,0 +1,116 @@
+import io
+
+import pytest
+import requests
+
+from src.bounceban import resilience
+from src.bounceban.resilience import CircuitBreaker, CircuitOpenError, TokenBucket
+
+
+def make_response(status: int, headers: dict = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response.raw = io.BytesIO(b"")
+    return response
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilience, "_buckets", {})
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience.time, "sleep", lambda seconds: None)
+
+
+def test_token_bucket_allows_burst_then_spaces_calls():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_token_bucket_pause_delays_every_call():
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.pause(2)
+    assert bucket.reserve() == pytest.approx(2, abs=0.05)
+
+
+def test_rate_limiter_is_per_key_and_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(resilience, "RATE_LIMIT", 10)
+    assert resilience.rate_limiter("a") is resilience.rate_limiter("a")
+    assert resilience.rate_limiter("a") is not resilience.rate_limiter("b")
+    monkeypatch.setattr(resilience, "RATE_LIMIT", 0)
+    assert resilience.rate_limiter("a") is None
+
+
+def test_breaker_opens_after_failures_and_lets_one_trial_through(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failures=2, reset=30)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] += 31
+    breaker.before_call()
+    # Only one trial at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_circuit(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failures=1, reset=10)
+    breaker.record_failure()
+    now[0] += 11
+    breaker.before_call()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_retry_delay_rules():
+    assert resilience.retry_delay(make_response(429, {"Retry-After": "2"}), 0, idempotent=False) == 2
+    assert resilience.retry_delay(make_response(429, {"Retry-After": "3600"}), 0) is None
+    assert resilience.retry_delay(make_response(503), 0, idempotent=False) is None
+    assert resilience.retry_delay(make_response(503), 0, idempotent=True) is not None
+    assert resilience.retry_delay(make_response(400), 0) is None
+    assert resilience.retry_delay(requests.exceptions.ConnectTimeout(), 0, idempotent=False) is not None
+    assert resilience.retry_delay(requests.exceptions.ReadTimeout(), 0, idempotent=False) is None
+    assert resilience.retry_delay(CircuitOpenError(), 0) is None
+
+
+def test_call_retries_idempotent_paths_only():
+    answers = []
+
+    def send():
+        answers.append(1)
+        return make_response(503)
+
+    assert resilience.call(send, "/v1/check", "key", retries=2).status_code == 503
+    assert len(answers) == 3
+
+    answers.clear()
+    assert resilience.call(send, "/v1/verify/bulk", "key", retries=2).status_code == 503
+    assert len(answers) == 1
+
+
+def test_open_circuit_of_one_key_does_not_block_another(monkeypatch):
+    monkeypatch.setattr(resilience, "BREAKER_FAILURES", 2)
+
+    def down():
+        raise requests.exceptions.ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            resilience.call(down, "/v1/verify/bulk", "bad-key", retries=0)
+    with pytest.raises(CircuitOpenError):
+        resilience.call(down, "/v1/verify/bulk", "bad-key", retries=0)
+
+    assert resilience.call(lambda: make_response(200), "/v1/check", "good-key").status_code == 200
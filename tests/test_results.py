@@ -0,0 +1,38 @@
+from src.bounceban.cache import TieredCache, TTLCache
+from src.bounceban.results import ResultStore
+
+
+def make_store() -> ResultStore:
+    return ResultStore(TieredCache(TTLCache(ttl=60, maxsize=100), name="results"))
+
+
+def final(email: str, **fields) -> dict:
+    return dict({"email": email, "result": "deliverable", "status": "completed"}, **fields)
+
+
+def test_single_results_keep_their_verification_id():
+    store = make_store()
+    store.put("key", final("a@Example.com", id="v-1"))
+    assert store.get("key", "a@example.com")["id"] == "v-1"
+    assert store.get("other-key", "a@example.com") is None
+
+
+def test_single_results_without_an_id_are_not_kept():
+    store = make_store()
+    store.put("key", final("a@example.com"))
+    assert store.get("key", "a@example.com") is None
+
+
+def test_bulk_results_are_only_served_to_their_task():
+    store = make_store()
+    pages = store.record_pages("key", "task-1", iter([(0, [final("a@example.com")])]))
+    assert list(pages) == [(0, [final("a@example.com")])]
+    assert store.get_many("key", ["a@example.com"], "task-1")["a@example.com"]["task_id"] == "task-1"
+    assert store.get_many("key", ["a@example.com"], "task-2") == {}
+    assert store.get("key", "a@example.com") is None
+
+
+def test_pending_results_are_not_kept():
+    store = make_store()
+    store.put_many("key", [final("a@example.com", status="processing")], "task-1")
+    assert store.get("key", "a@example.com", "task-1") is None
@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from src.bounceban import single
+from src.bounceban.cache import TieredCache, TTLCache
+from src.bounceban.results import ResultStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = ResultStore(TieredCache(TTLCache(ttl=60, maxsize=100), name="results"))
+    monkeypatch.setattr(single, "result_store", store)
+    return store
+
+
+def test_nothing_is_submitted_after_the_deadline(store, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(single, "verify_shared", lambda *args: submitted.append(args))
+    store.put("key", {"id": "v-1", "email": "a@x.com", "result": "deliverable", "status": "completed"})
+    deadline = time.monotonic() - 1
+
+    verification_id, result, polls, finished, cached = single.verify_before("key", "a@x.com", deadline, "test")
+    assert (verification_id, result["result"], polls, finished, cached) == ("v-1", "deliverable", 0, True, True)
+    with pytest.raises(single.WaitTimeUp):
+        single.verify_before("key", "b@x.com", deadline, "test")
+    assert submitted == []
+
+
+def test_time_left_is_passed_to_the_wait(store, monkeypatch):
+    waits = []
+
+    def verify_shared(api_key, email, max_wait_seconds, stats_name):
+        waits.append(max_wait_seconds)
+        return ("v-2", {"status": "processing"}, 1, False, False), False
+
+    monkeypatch.setattr(single, "verify_shared", verify_shared)
+    outcome = single.verify_before("key", "b@x.com", time.monotonic() + 30, "test")
+    assert outcome[0] == "v-2"
+    assert 29 < waits[0] <= 30
@@ -0,0 +1,110 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from src.bounceban import task_index
+from src.bounceban.cache import SQLiteCache, api_key_hash
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_index, "CALLBACK_URL", "https://connector.example")
+    monkeypatch.setattr(task_index, "CALLBACK_SECRET", "secret")
+    monkeypatch.setattr(task_index, "CALLBACKS_ENABLED", True)
+    monkeypatch.setattr(task_index, "_index", SQLiteCache(str(tmp_path / "tasks.sqlite3"), "tasks", 1000, 3600))
+    return task_index
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Statuses BounceBan will answer, in order; records every call."""
+    answers = {"statuses": ["processing"], "calls": 0}
+
+    def fetch(api_key, task_id):
+        answers["calls"] += 1
+        status = answers["statuses"].pop(0) if len(answers["statuses"]) > 1 else answers["statuses"][0]
+        return {"id": task_id, "status": status, "count_total": 2}
+
+    monkeypatch.setattr(task_index, "fetch_bulk_status", fetch)
+    return answers
+
+
+def callback_params(url: str) -> dict:
+    return {name: values[0] for name, values in parse_qs(urlsplit(url).query).items()}
+
+
+def test_callbacks_are_off_without_settings(monkeypatch):
+    monkeypatch.setattr(task_index, "CALLBACKS_ENABLED", False)
+    assert task_index.new_callback("key") == (None, None)
+    assert not task_index.verify_callback("hash", "nonce", "signature")
+
+
+def test_signature_covers_key_and_nonce(index):
+    url, nonce = index.new_callback("key")
+    params = callback_params(url)
+    assert url.startswith("https://connector.example/verify_bulk/v2/callback?")
+    assert params["key"] == api_key_hash("key") and params["nonce"] == nonce
+    assert index.verify_callback(params["key"], nonce, params["signature"])
+    assert not index.verify_callback(params["key"], "other-nonce", params["signature"])
+    assert not index.verify_callback(api_key_hash("other-key"), nonce, params["signature"])
+    assert not index.verify_callback(params["key"], nonce, "0" * 64)
+
+
+def test_callback_is_only_accepted_for_its_own_task(index, upstream):
+    _, nonce = index.new_callback("key")
+    _, other_nonce = index.new_callback("key")
+    index.record_submission("key", {"id": "task-1"}, nonce)
+    index.record_submission("key", {"id": "task-2"}, other_nonce)
+    assert not index.record_callback(api_key_hash("key"), nonce, "task-2")
+    assert index.record_callback(api_key_hash("key"), nonce, "task-1")
+
+
+def test_pending_task_is_answered_locally_until_the_callback(index, upstream):
+    _, nonce = index.new_callback("key")
+    index.record_submission("key", {"id": "task"}, nonce)
+
+    result, from_index = index.fetch_status("key", "task")
+    assert (result["status"], from_index, upstream["calls"]) == ("processing", False, 1)
+    result, from_index = index.fetch_status("key", "task")
+    assert (result["status"], from_index, upstream["calls"]) == ("processing", True, 1)
+
+    upstream["statuses"] = ["finished"]
+    index.record_callback(api_key_hash("key"), nonce, "task")
+    result, from_index = index.fetch_status("key", "task")
+    # The final status and its fields come from BounceBan, not the callback
+    assert result == {"id": "task", "status": "finished", "count_total": 2}
+    assert (from_index, upstream["calls"]) == (False, 2)
+    result, from_index = index.fetch_status("key", "task")
+    assert (result["status"], from_index, upstream["calls"]) == ("finished", True, 2)
+
+
+def test_pending_task_is_polled_again_after_the_recheck_interval(index, upstream, monkeypatch):
+    monkeypatch.setattr(index, "TASK_INDEX_RECHECK", 0)
+    _, nonce = index.new_callback("key")
+    index.record_submission("key", {"id": "task"}, nonce)
+    index.fetch_status("key", "task")
+    index.fetch_status("key", "task")
+    assert upstream["calls"] == 2
+
+
+def test_callback_before_submission_is_kept_for_its_nonce(index, upstream):
+    _, nonce = index.new_callback("key")
+    assert index.record_callback(api_key_hash("key"), nonce, "task")
+    index.record_submission("key", {"id": "task"}, nonce)
+    assert index._get(api_key_hash("key"), "task")["notified"] is True
+
+    # A stray early callback for a task submitted without one changes nothing
+    index.record_callback(api_key_hash("key"), "stray", "plain-task")
+    index.fetch_status("key", "plain-task")
+    index.fetch_status("key", "plain-task")
+    assert upstream["calls"] == 2
+
+
+def test_tasks_without_callbacks_only_keep_final_states(index, upstream):
+    index.fetch_status("key", "task")
+    index.fetch_status("key", "task")
+    assert upstream["calls"] == 2
+    upstream["statuses"] = ["finished"]
+    index.fetch_status("key", "task")
+    assert index.fetch_status("key", "task") == ({"id": "task", "status": "finished", "count_total": 2}, True)
+    assert upstream["calls"] == 3